@@ -0,0 +1,316 @@
+import argparse
+import csv
+
+import numpy as np
+
+from catalogs import load_catalog
+from session_codec import decode_json
+
+
+# ============================================================================
+# ANALISI DEL CAMBIAMENTO DI OPINIONE (OFFLINE)
+# ============================================================================
+# Le righe salvate da streamlit_app.py contengono le opinioni come dict JSON
+# indicizzati per titolo della norma. Qui le carichiamo una sola volta in un
+# array partecipante × norma × momento e calcoliamo tutto in modo vettoriale.
+
+# Colonne della riga salvata in streamlit_app.py (fase 9)
+COL_PROLIFIC_ID = 0
+COL_PROMPT_KEY = 1
+COL_NORM_KEY = 2
+OPINION_COLUMNS = {
+    "initial": 3,
+    "final": 5,
+    "others": 6,
+    "others_final": 7,
+}
+TIMEPOINTS = list(OPINION_COLUMNS)
+INITIAL, FINAL, OTHERS, OTHERS_FINAL = range(len(TIMEPOINTS))
+
+
+def load_rows_from_csv(path, header=True):
+    """Righe da un export CSV del foglio risultati."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(f))
+    return rows[1:] if header else rows
+
+
+def load_rows_from_sheet(sheet, header=True):
+    """Righe dal foglio Google (una sola chiamata get_all_values)."""
+    rows = sheet.get_all_values()
+    return rows[1:] if header else rows
+
+
+def _parse_opinions(cell):
+    # Compatto, compresso ("z:") o JSON delle righe storiche
+    opinions = decode_json(cell, default={})
+    return opinions if isinstance(opinions, dict) else {}
+
+
+class SessionArrays:
+    """
+    Sessioni caricate in array NumPy tipizzati.
+
+    Attributes:
+        prolific_ids (np.ndarray): Prolific ID, shape (P,)
+        prompt_idx (np.ndarray): Indice del prompt assegnato, shape (P,)
+        norm_idx (np.ndarray): Indice della norma di trattamento, shape (P,)
+        opinions (np.ndarray): float32, shape (P, norme, momenti); NaN dove
+            la norma non è stata mostrata al partecipante
+        prompt_keys (list): Chiavi dei prompt, nell'ordine degli indici
+        norm_keys (list): Chiavi delle norme, nell'ordine degli indici
+    """
+
+    def __init__(self, prolific_ids, prompt_idx, norm_idx, opinions, prompt_keys, norm_keys):
+        self.prolific_ids = prolific_ids
+        self.prompt_idx = prompt_idx
+        self.norm_idx = norm_idx
+        self.opinions = opinions
+        self.prompt_keys = prompt_keys
+        self.norm_keys = norm_keys
+
+    def __len__(self):
+        return len(self.prolific_ids)
+
+    @property
+    def condition_idx(self):
+        """Indice piatto della condizione (prompt, norma)."""
+        return self.prompt_idx * len(self.norm_keys) + self.norm_idx
+
+    def condition_key(self, flat_idx):
+        p, n = divmod(int(flat_idx), len(self.norm_keys))
+        return self.prompt_keys[p], self.norm_keys[n]
+
+
+def build_arrays(rows, prompts, norms):
+    """
+    Converte le righe del foglio in SessionArrays.
+
+    Le righe con prompt o norma sconosciuti vengono scartate.
+
+    Args:
+        rows (list): Righe del foglio (senza intestazione)
+        prompts (dict): Catalogo prompts.json
+        norms (dict): Catalogo norms.json
+
+    Returns:
+        SessionArrays: Dati pronti per l'analisi
+    """
+    prompt_keys = list(prompts)
+    norm_keys = list(norms)
+    prompt_pos = {k: i for i, k in enumerate(prompt_keys)}
+    norm_pos = {k: i for i, k in enumerate(norm_keys)}
+    title_pos = {norms[k]["title"]: i for i, k in enumerate(norm_keys)}
+
+    valid = [
+        r for r in rows
+        if len(r) > max(OPINION_COLUMNS.values())
+        and r[COL_PROMPT_KEY] in prompt_pos and r[COL_NORM_KEY] in norm_pos
+    ]
+
+    opinions = np.full((len(valid), len(norm_keys), len(TIMEPOINTS)), np.nan, dtype=np.float32)
+    for i, row in enumerate(valid):
+        for t, col in enumerate(OPINION_COLUMNS.values()):
+            for title, value in _parse_opinions(row[col]).items():
+                j = title_pos.get(title)
+                if j is not None:
+                    opinions[i, j, t] = value
+
+    return SessionArrays(
+        prolific_ids=np.array([r[COL_PROLIFIC_ID] for r in valid], dtype=object),
+        prompt_idx=np.array([prompt_pos[r[COL_PROMPT_KEY]] for r in valid], dtype=np.int32),
+        norm_idx=np.array([norm_pos[r[COL_NORM_KEY]] for r in valid], dtype=np.int32),
+        opinions=opinions,
+        prompt_keys=prompt_keys,
+        norm_keys=norm_keys,
+    )
+
+
+# ============================================================================
+# DELTA PER CONDIZIONE
+# ============================================================================
+def participant_deltas(arrays):
+    """
+    Variazioni di opinione per partecipante.
+
+    Returns:
+        dict: Array shape (P,) con:
+            - "treatment": finale - iniziale sulla norma discussa
+            - "others_treatment": stima degli altri, finale - iniziale
+            - "control": media finale - iniziale sulle norme non discusse
+    """
+    rows = np.arange(len(arrays))
+    ops = arrays.opinions
+    treatment = ops[rows, arrays.norm_idx, FINAL] - ops[rows, arrays.norm_idx, INITIAL]
+    others = ops[rows, arrays.norm_idx, OTHERS_FINAL] - ops[rows, arrays.norm_idx, OTHERS]
+
+    all_deltas = ops[:, :, FINAL] - ops[:, :, INITIAL]
+    all_deltas[rows, arrays.norm_idx] = np.nan
+    with np.errstate(invalid="ignore"):
+        counts = np.sum(~np.isnan(all_deltas), axis=1)
+        control = np.where(counts > 0, np.nansum(all_deltas, axis=1) / np.maximum(counts, 1), np.nan)
+
+    return {"treatment": treatment, "others_treatment": others, "control": control}
+
+
+def grouped_mean(values, groups, n_groups):
+    """Media e numerosità per gruppo, ignorando i NaN."""
+    mask = ~np.isnan(values)
+    counts = np.bincount(groups[mask], minlength=n_groups)
+    sums = np.bincount(groups[mask], weights=values[mask], minlength=n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+    return means, counts
+
+
+def bootstrap_ci(values, groups, n_groups, n_boot=2000, alpha=0.05, seed=0):
+    """
+    Intervallo di confidenza bootstrap (percentile) della media per gruppo.
+
+    Per ogni gruppo i ricampionamenti sono estratti in un'unica matrice
+    (n_boot × n) e mediati in blocco.
+
+    Returns:
+        np.ndarray: shape (n_groups, 2) con estremi inferiore e superiore
+    """
+    rng = np.random.default_rng(seed)
+    ci = np.full((n_groups, 2), np.nan)
+    mask = ~np.isnan(values)
+    for g in range(n_groups):
+        sample = values[mask & (groups == g)]
+        if len(sample) < 2:
+            continue
+        idx = rng.integers(0, len(sample), size=(n_boot, len(sample)))
+        means = sample[idx].mean(axis=1)
+        ci[g] = np.quantile(means, [alpha / 2, 1 - alpha / 2])
+    return ci
+
+
+def condition_summary(arrays, n_boot=2000, alpha=0.05, seed=0):
+    """
+    Delta medi per condizione (prompt_key, norm_key) con IC bootstrap.
+
+    Returns:
+        list: Un dict per condizione con n, medie e IC per ciascuna metrica
+    """
+    n_groups = len(arrays.prompt_keys) * len(arrays.norm_keys)
+    groups = arrays.condition_idx
+    deltas = participant_deltas(arrays)
+
+    stats = {}
+    for name, values in deltas.items():
+        means, counts = grouped_mean(values, groups, n_groups)
+        stats[name] = (means, counts, bootstrap_ci(values, groups, n_groups, n_boot, alpha, seed))
+
+    summary = []
+    for g in range(n_groups):
+        prompt_key, norm_key = arrays.condition_key(g)
+        entry = {"prompt_key": prompt_key, "norm_key": norm_key}
+        for name, (means, counts, ci) in stats.items():
+            entry[f"{name}_n"] = int(counts[g])
+            entry[f"{name}_mean"] = float(means[g])
+            entry[f"{name}_ci_low"] = float(ci[g, 0])
+            entry[f"{name}_ci_high"] = float(ci[g, 1])
+        summary.append(entry)
+    return summary
+
+
+# ============================================================================
+# MODALITÀ INCREMENTALE
+# ============================================================================
+class IncrementalAggregates:
+    """
+    Aggregati per condizione aggiornati man mano che arrivano nuove righe.
+
+    Tiene solo somme e somme dei quadrati per condizione, quindi il costo di
+    un aggiornamento dipende dalle righe nuove e non dal totale. `rows_seen`
+    funge da watermark: passando tutte le righe del foglio vengono elaborate
+    solo quelle successive.
+    """
+
+    METRICS = ("treatment", "others_treatment", "control")
+
+    def __init__(self, prompts, norms):
+        self.prompts = prompts
+        self.norms = norms
+        n_groups = len(prompts) * len(norms)
+        self.rows_seen = 0
+        self.count = np.zeros((len(self.METRICS), n_groups), dtype=np.int64)
+        self.total = np.zeros((len(self.METRICS), n_groups), dtype=np.float64)
+        self.total_sq = np.zeros((len(self.METRICS), n_groups), dtype=np.float64)
+
+    def update(self, rows):
+        """
+        Aggiunge le righe non ancora viste.
+
+        Args:
+            rows (list): Tutte le righe del foglio (senza intestazione)
+
+        Returns:
+            int: Numero di righe nuove elaborate
+        """
+        new_rows = rows[self.rows_seen:]
+        if not new_rows:
+            return 0
+        self.add(new_rows)
+        self.rows_seen = len(rows)
+        return len(new_rows)
+
+    def add(self, new_rows):
+        """Aggiunge righe nuove senza toccare il watermark."""
+        arrays = build_arrays(new_rows, self.prompts, self.norms)
+        if not len(arrays):
+            return
+        groups = arrays.condition_idx
+        n_groups = self.count.shape[1]
+        deltas = participant_deltas(arrays)
+        for m, name in enumerate(self.METRICS):
+            values = deltas[name]
+            mask = ~np.isnan(values)
+            self.count[m] += np.bincount(groups[mask], minlength=n_groups)
+            self.total[m] += np.bincount(groups[mask], weights=values[mask], minlength=n_groups)
+            self.total_sq[m] += np.bincount(groups[mask], weights=values[mask] ** 2, minlength=n_groups)
+
+    def summary(self):
+        """Media, deviazione standard e IC normale al 95% per condizione."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = self.total / self.count
+            var = (self.total_sq - self.count * mean ** 2) / (self.count - 1)
+            sem = np.sqrt(var / self.count)
+
+        norm_keys = list(self.norms)
+        summary = []
+        for g in range(self.count.shape[1]):
+            p, n = divmod(g, len(norm_keys))
+            entry = {"prompt_key": list(self.prompts)[p], "norm_key": norm_keys[n]}
+            for m, name in enumerate(self.METRICS):
+                entry[f"{name}_n"] = int(self.count[m, g])
+                entry[f"{name}_mean"] = float(mean[m, g])
+                entry[f"{name}_sd"] = float(np.sqrt(var[m, g]))
+                entry[f"{name}_ci_low"] = float(mean[m, g] - 1.96 * sem[m, g])
+                entry[f"{name}_ci_high"] = float(mean[m, g] + 1.96 * sem[m, g])
+            summary.append(entry)
+        return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Variazione di opinione per condizione (prompt, norma).")
+    parser.add_argument("csv", help="Export CSV del foglio risultati")
+    parser.add_argument("--prompts", default="prompts.json")
+    parser.add_argument("--norms", default="norms.json")
+    parser.add_argument("--boot", type=int, default=2000, help="Numero di ricampionamenti bootstrap")
+    args = parser.parse_args()
+
+    arrays = build_arrays(load_rows_from_csv(args.csv), load_catalog(args.prompts), load_catalog(args.norms))
+    print(f"{len(arrays)} sessioni valide")
+    print(f"{'prompt':>6} {'norm':>8} {'n':>4} {'delta':>8} {'95% CI':>18}")
+    for entry in condition_summary(arrays, n_boot=args.boot):
+        print(
+            f"{entry['prompt_key']:>6} {entry['norm_key']:>8} {entry['treatment_n']:>4} "
+            f"{entry['treatment_mean']:>8.2f} "
+            f"[{entry['treatment_ci_low']:>7.2f}, {entry['treatment_ci_high']:>7.2f}]"
+        )
+
+
+if __name__ == "__main__":
+    main()
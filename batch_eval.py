@@ -0,0 +1,188 @@
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import os
+
+from catalogs import load_catalog
+from llm import (
+    CHAT_MODEL, build_system_prompt, greeting_messages, api_messages, acomplete, request_key, generation_profile,
+    MockOpenAI,
+)
+
+
+# ============================================================================
+# VALUTAZIONE IN BATCH DELLE CONDIZIONI (PROMPT × NORMA × OPINIONE)
+# ============================================================================
+# Espande la matrice di prompts.json × norms.json (eventualmente per più
+# valori di INITIAL_OPINION) e per ogni cella esegue il saluto iniziale e un
+# dialogo scriptato, con asyncio e un limite di richieste contemporanee.
+# Ogni richiesta è salvata su disco con chiave l'hash di (modello, messaggi,
+# parametri): rieseguendo, l'API viene chiamata solo per le celle cambiate.
+#
+# Uso:
+#   python batch_eval.py --mock
+#   python batch_eval.py --opinions 10 50 90 --concurrency 8 --out eval.csv
+#   python batch_eval.py --prompts-only 1 2 --script script.json
+#
+# Senza --mock serve OPENAI_API_KEY nell'ambiente.
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".eval_cache")
+DEFAULT_CONCURRENCY = 4
+DEFAULT_OPINIONS = [50]
+
+# Turni utente di default per il dialogo scriptato
+DEFAULT_SCRIPT = [
+    "I'm not sure, I think it depends on the situation.",
+    "Honestly I've never really thought about it much.",
+    "I guess other people might feel differently than me.",
+]
+
+
+class DiskCache:
+    """Una risposta per file JSON, in sottocartelle per i primi due caratteri dell'hash."""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        self.directory = directory
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, key):
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+
+class Evaluator:
+    """Esegue le richieste con al più `concurrency` chiamate all'API in corso."""
+
+    def __init__(self, client, cache, concurrency=DEFAULT_CONCURRENCY, model=CHAT_MODEL, **params):
+        self.client = client
+        self.cache = cache
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.model = model
+        self.params = params
+        self.stats = {"api_calls": 0, "cached": 0}
+
+    async def request(self, messages, model=None, params=None):
+        model = model or self.model
+        params = self.params if params is None else params
+        key = request_key(model, messages, params)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.stats["cached"] += 1
+            return dict(cached, cached=True)
+        async with self.semaphore:
+            completion = await acomplete(self.client, messages, model, **params)
+        self.stats["api_calls"] += 1
+        result = completion.to_dict()
+        self.cache.put(key, result)
+        return dict(result, cached=False)
+
+    async def run_cell(self, prompt_key, prompt_data, norm_key, norm_data, opinion, script):
+        """
+        Saluto + dialogo scriptato per una cella; una riga di risultato per turno.
+
+        Il profilo di generazione del prompt ha la precedenza su modello e
+        parametri dell'Evaluator.
+        """
+        system_prompt = build_system_prompt(prompt_data, norm_data["title"], opinion)
+        model, profile = generation_profile(prompt_data, self.model)
+        params = dict(self.params, **profile)
+        cell = {"prompt_key": prompt_key, "norm_key": norm_key, "initial_opinion": opinion}
+
+        greeting = await self.request(greeting_messages(system_prompt), model, params)
+        rows = [dict(cell, turn=0, user="", **greeting)]
+
+        history = [{"role": "assistant", "content": greeting["text"]}]
+        for turn, user_text in enumerate(script, start=1):
+            history.append({"role": "user", "content": user_text})
+            reply = await self.request(api_messages(system_prompt, history), model, params)
+            rows.append(dict(cell, turn=turn, user=user_text, **reply))
+            history.append({"role": "assistant", "content": reply["text"]})
+        return rows
+
+
+def expand_matrix(prompts, norms, opinions):
+    """Tutte le celle (prompt, norma, opinione iniziale)."""
+    return list(itertools.product(prompts.items(), norms.items(), opinions))
+
+
+async def run_matrix(evaluator, prompts, norms, opinions, script):
+    cells = expand_matrix(prompts, norms, opinions)
+    results = await asyncio.gather(*(
+        evaluator.run_cell(pk, pd, nk, nd, opinion, script)
+        for (pk, pd), (nk, nd), opinion in cells
+    ))
+    return [row for rows in results for row in rows]
+
+
+OUTPUT_FIELDS = [
+    "prompt_key", "norm_key", "initial_opinion", "turn", "user", "text",
+    "latency", "prompt_tokens", "completion_tokens", "cached",
+]
+
+
+def write_results(rows, path):
+    """CSV o JSONL a seconda dell'estensione."""
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if path.endswith(".jsonl"):
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        else:
+            writer = csv.DictWriter(f, fieldnames=OUTPUT_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Valutazione in batch di prompt × norme × opinioni iniziali.")
+    parser.add_argument("--prompts", default="prompts.json")
+    parser.add_argument("--norms", default="norms.json")
+    parser.add_argument("--prompts-only", nargs="+", help="Solo queste chiavi di prompts.json")
+    parser.add_argument("--norms-only", nargs="+", help="Solo queste chiavi di norms.json")
+    parser.add_argument("--opinions", type=int, nargs="+", default=DEFAULT_OPINIONS,
+                        help="Valori di INITIAL_OPINION (0-100)")
+    parser.add_argument("--script", help="JSON con la lista dei turni utente")
+    parser.add_argument("--model", default=CHAT_MODEL)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--mock", action="store_true", help="Usa MockOpenAI invece dell'API")
+    parser.add_argument("--out", default="batch_eval.csv", help="Risultati (.csv o .jsonl)")
+    args = parser.parse_args()
+
+    prompts, norms = load_catalog(args.prompts), load_catalog(args.norms)
+    if args.prompts_only:
+        prompts = {k: v for k, v in prompts.items() if k in args.prompts_only}
+    if args.norms_only:
+        norms = {k: v for k, v in norms.items() if k in args.norms_only}
+    script = load_catalog(args.script) if args.script else DEFAULT_SCRIPT
+
+    if args.mock:
+        client = MockOpenAI()
+    else:
+        from openai import AsyncOpenAI
+        client = AsyncOpenAI(api_key=os.environ["OPENAI_API_KEY"])
+
+    evaluator = Evaluator(client, DiskCache(args.cache_dir), args.concurrency, args.model)
+    rows = asyncio.run(run_matrix(evaluator, prompts, norms, args.opinions, script))
+    write_results(rows, args.out)
+
+    n_cells = len(prompts) * len(norms) * len(args.opinions)
+    print(f"{n_cells} celle, {len(rows)} risposte -> {args.out}")
+    print(f"Chiamate API: {evaluator.stats['api_calls']}, dalla cache: {evaluator.stats['cached']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import streamlit as st
+
+
+# ============================================================================
+# SLIDER RACCOLTI IN UN UNICO INVIO
+# ============================================================================
+# Uno slider libero provoca un rerun completo dello script a ogni
+# spostamento, anche se il valore viene letto solo al click su "Continue".
+# Dentro st.form gli spostamenti restano nel browser e tutti i valori
+# arrivano al server insieme all'invio: una pagina di questionario costa
+# così due rerun (visualizzazione + invio) invece di uno per ogni slider
+# mosso.
+#
+# Uso:
+#   values = slider_form("initial_opinion_form", [SliderGroup(titles, "slider")], 0, 100)
+#   if values is not None:
+#       opinions = values[0]
+
+
+class SliderGroup:
+    """
+    Gruppo di slider con un'intestazione opzionale.
+
+    Args:
+        labels (list): Etichette degli slider (anche chiavi del risultato)
+        key_prefix (str): Le chiavi dei widget sono f"{key_prefix}_{i}"
+        heading (str): Markdown mostrato sopra il gruppo, preceduto da un separatore
+        default (int | dict): Valore iniziale, uguale per tutti o per etichetta
+    """
+
+    __slots__ = ("labels", "key_prefix", "heading", "default")
+
+    def __init__(self, labels, key_prefix, heading=None, default=50):
+        self.labels = list(labels)
+        self.key_prefix = key_prefix
+        self.heading = heading
+        self.default = default
+
+    def initial_value(self, label):
+        if isinstance(self.default, dict):
+            return self.default.get(label, 50)
+        return self.default
+
+
+def slider_form(form_key, groups, min_value, max_value, submit_label="Continue"):
+    """
+    Mostra i gruppi di slider in un form con un solo pulsante di invio.
+
+    Args:
+        form_key (str): Chiave del form (unica nella pagina)
+        groups (list): SliderGroup nell'ordine di visualizzazione
+        min_value (int): Minimo della scala
+        max_value (int): Massimo della scala
+        submit_label (str): Testo del pulsante
+
+    Returns:
+        list | None: Per ogni gruppo {etichetta: valore}; None finché il form
+            non viene inviato
+    """
+    with st.form(form_key, border=False):
+        values = []
+        for group in groups:
+            if group.heading:
+                st.markdown("---")
+                st.markdown(group.heading)
+            values.append({
+                label: st.slider(
+                    f"**{label}**",
+                    min_value, max_value,
+                    group.initial_value(label),
+                    key=f"{group.key_prefix}_{i}",
+                )
+                for i, label in enumerate(group.labels)
+            })
+        submitted = st.form_submit_button(submit_label)
+    return values if submitted else None
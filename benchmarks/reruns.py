@@ -0,0 +1,215 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# ============================================================================
+# RERUN PER FASE DEL QUESTIONARIO (streamlit.testing AppTest)
+# ============================================================================
+# Porta una sessione di streamlit_app.py dentro una fase, muove ogni slider
+# una volta e preme il bottone che chiude la fase, contando i rerun che il
+# browser farebbe partire:
+#   1  la visualizzazione della fase
+#   +1 per ogni slider mosso fuori da un form (dentro st.form il valore
+#      resta nel browser fino all'invio)
+#   +1 l'invio
+# Accanto al conteggio riporta le esecuzioni dello script nella fase lette
+# da study_reruns_total (includono gli st.rerun() interni).
+# Il foglio Google è sostituito da uno in memoria e le credenziali non
+# vengono mai usate, quindi la misura gira offline.
+#
+# Uso:
+#   python benchmarks/reruns.py                       # questo checkout
+#   python benchmarks/reruns.py --root /tmp/checkout  # un altro checkout (prima/dopo)
+#
+# Le misure prima e dopo il passaggio degli slider a st.form sono in
+# reruns_baseline.json.
+DEFAULT_PHASES = (2, 3, 6, 7, 9)
+SCRIPT_TIMEOUT_SECONDS = 30
+
+SECRETS = {
+    "gcp_service_account": {"type": "service_account", "client_email": "bench@example.com"},
+    "google_sheet_url": "https://docs.google.com/spreadsheets/d/bench",
+    "openai_api_key": "sk-bench",
+}
+
+
+class MemoryWorksheet:
+    """Worksheet gspread in memoria (solo le chiamate usate dalle app)."""
+
+    def __init__(self, title, spreadsheet):
+        self.id = len(spreadsheet._worksheets)
+        self.title = title
+        self.spreadsheet = spreadsheet
+        self.rows = []
+
+    def row_values(self, row, **kwargs):
+        return list(self.rows[row - 1]) if row <= len(self.rows) else []
+
+    def col_values(self, col, **kwargs):
+        return [r[col - 1] if len(r) >= col else "" for r in self.rows]
+
+    def get_all_values(self, **kwargs):
+        return [list(r) for r in self.rows]
+
+    def batch_get(self, ranges, **kwargs):
+        return [[] for _ in ranges]
+
+    def append_row(self, values, **kwargs):
+        self.rows.append([str(v) for v in values])
+
+    def append_rows(self, rows, **kwargs):
+        for values in rows:
+            self.append_row(values)
+
+    def update(self, *args, **kwargs):
+        pass
+
+
+class MemorySpreadsheet:
+    id = "bench"
+
+    def __init__(self):
+        self._worksheets = {}
+        self.sheet1 = self._worksheets["Sheet1"] = MemoryWorksheet("Sheet1", self)
+
+    def worksheet(self, title):
+        import gspread
+        if title not in self._worksheets:
+            raise gspread.WorksheetNotFound(title)
+        return self._worksheets[title]
+
+    def add_worksheet(self, title, rows=0, cols=0, **kwargs):
+        return self._worksheets.setdefault(title, MemoryWorksheet(title, self))
+
+
+def _offline_google(spreadsheet):
+    """gspread.authorize e le credenziali restituiscono il foglio in memoria."""
+    import gspread
+    from google.oauth2 import service_account
+
+    class Client:
+        def open_by_url(self, url):
+            return spreadsheet
+
+    gspread.authorize = lambda *args, **kwargs: Client()
+    service_account.Credentials.from_service_account_info = classmethod(lambda cls, *args, **kwargs: None)
+
+
+def seed_state(phase, norms, prompts):
+    """Stato di una sessione arrivata alla fase `phase` (chat già conclusa)."""
+    norm_keys = list(norms)[:3]
+    titles = [norms[k]["title"] for k in norm_keys]
+    return {
+        "session_initialized": True,
+        "pid_checked": True,
+        "_checkpoint_lookup_done": True,
+        "prolific_id": "bench",
+        "phase": phase,
+        "prompt_key": next(iter(prompts)),
+        "norm_key": norm_keys[-1],
+        "sampled_norms": norm_keys,
+        "initial_opinion": {t: 50 for t in titles},
+        "opinions_others": {t: 50 for t in titles},
+        "final_opinion": {t: 50 for t in titles},
+        "opinions_others_final": {t: 50 for t in titles},
+        "messages": [],
+        "greeting_sent": True,
+        "conversation_ended": True,
+        "data_saved": False,
+        "generate_assistant": False,
+        "comp_response": None,
+        "engagement_text": None,
+        "start_time": 0.0,
+        "comp_response_saved": "",
+        "engagement_text_saved": "",
+        "att_check_response_saved": "",
+        "comp_correct": False,
+        "engagement_word_count": 0,
+        "parallel_comp_time": None,
+        "parallel_engagement_time": None,
+        "sequential_comp_time": None,
+        "sequential_engagement_time": None,
+        "interaction_comp_time": None,
+        "interaction_engagement_time": None,
+    }
+
+
+def measure_phase(root, app, phase, norms, prompts):
+    """
+    Returns:
+        dict: reruns, esecuzioni dello script, slider mossi, slider dentro
+        un form, fase raggiunta
+    """
+    from streamlit.testing.v1 import AppTest
+    from metrics import STUDY_RERUNS
+
+    script_runs = STUDY_RERUNS.value("study", phase)
+
+    at = AppTest.from_file(os.path.join(root, app), default_timeout=SCRIPT_TIMEOUT_SECONDS)
+    at.secrets.update(SECRETS)
+    at.query_params["PROLIFIC_PID"] = "bench"
+    for key, value in seed_state(phase, norms, prompts).items():
+        at.session_state[key] = value
+
+    at.run()
+    reruns = 1
+    sliders = list(at.slider)
+    in_form = 0
+    for i in range(len(sliders)):
+        slider = at.slider[i]
+        slider.set_value(min(slider.max, slider.value + 1) if slider.value < slider.max else slider.min)
+        if slider.form_id:
+            in_form += 1
+        else:
+            # Fuori da un form il browser fa partire un rerun a ogni spostamento
+            at.run()
+            reruns += 1
+
+    at.button[-1].click()
+    at.run()
+    reruns += 1
+    return {
+        "reruns": reruns,
+        "script_runs": STUDY_RERUNS.value("study", phase) - script_runs,
+        "sliders": len(sliders),
+        "sliders_in_form": in_form,
+        "next_phase": at.session_state["phase"] if "phase" in at.session_state else None,
+    }
+
+
+def run(root, app, phases):
+    os.chdir(root)
+    sys.path.insert(0, root)
+    os.environ.setdefault("STUDY_LOCAL_STORE", os.path.join(tempfile.mkdtemp(prefix="reruns-"), "store.sqlite3"))
+    os.environ.setdefault("METRICS_PORT", "0")
+    os.environ.setdefault("CONNECTION_WARM_INTERVAL", "0")
+    _offline_google(MemorySpreadsheet())
+
+    with open("norms.json", "r", encoding="utf-8") as f:
+        norms = json.load(f)
+    with open("prompts.json", "r", encoding="utf-8") as f:
+        prompts = json.load(f)
+    return {str(phase): measure_phase(root, app, phase, norms, prompts) for phase in phases}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rerun per fase del questionario (AppTest).")
+    parser.add_argument("--root", default=ROOT, help="Checkout da misurare")
+    parser.add_argument("--app", default="streamlit_app.py")
+    parser.add_argument("--phases", type=int, nargs="+", default=list(DEFAULT_PHASES))
+    args = parser.parse_args()
+
+    results = run(os.path.abspath(args.root), args.app, args.phases)
+    for phase, r in results.items():
+        print(f"fase {phase}: {r['reruns']} rerun, {r['script_runs']} esecuzioni dello script"
+              f" ({r['sliders']} slider, {r['sliders_in_form']} in un form) -> fase {r['next_phase']}")
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from results import (  # noqa: E402
+    check_prolific_id_exists,
+    get_least_used_combination,
+    results_view,
+    build_session_row,
+    text_tracking_record,
+)
+from session_codec import encode_row, decode_row  # noqa: E402
+from synthetic import FakeSheet, make_rows, make_session_state, make_likert, make_messages  # noqa: E402
+
+
+# ============================================================================
+# BENCHMARK DEI PERCORSI CRITICI
+# ============================================================================
+# Uso:
+#   python benchmarks/run.py                 # esegue e confronta con baselines.json
+#   python benchmarks/run.py --update        # riscrive baselines.json
+#   python benchmarks/run.py --sizes 1000    # solo alcune dimensioni del foglio
+#
+# Il confronto fallisce (exit code 1) se un benchmark è più lento della
+# baseline oltre la tolleranza.
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+DEFAULT_TOLERANCE = 0.25
+
+
+def load_catalog(name):
+    with open(os.path.join(ROOT, name), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def measure(fn, repeat=5, min_time=0.2):
+    """
+    Mediana dei tempi per chiamata, su `repeat` misure.
+
+    Ogni misura ripete fn abbastanza volte da durare almeno min_time.
+    """
+    start = time.perf_counter()
+    fn()
+    single = time.perf_counter() - start
+    loops = max(1, int(min_time / single)) if single > 0 else 1000
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        timings.append((time.perf_counter() - start) / loops)
+    return statistics.median(timings)
+
+
+def sheet_benchmarks(size, prompts, norms):
+    """Benchmark che dipendono dalla dimensione del foglio."""
+    sheet = FakeSheet(make_rows(size, prompts, norms))
+    missing_pid = "not-a-participant"
+    existing_pid = sheet.rows[len(sheet.rows) // 2][0]
+
+    def cold(fn):
+        # Primo accesso del processo: il watermark riparte dall'intestazione
+        def call():
+            results_view(sheet).reset()
+            return fn()
+        return call
+
+    def least_used():
+        return get_least_used_combination(sheet, prompts, norms)
+
+    benches = {
+        f"get_least_used_combination.cold[{size}]": cold(least_used),
+        f"get_least_used_combination[{size}]": least_used,
+        f"check_prolific_id_exists.cold[{size}]": cold(lambda: check_prolific_id_exists(sheet, missing_pid)),
+        f"check_prolific_id_exists.miss[{size}]": lambda: check_prolific_id_exists(sheet, missing_pid),
+        f"check_prolific_id_exists.hit[{size}]": lambda: check_prolific_id_exists(sheet, existing_pid),
+    }
+    return benches, sheet
+
+
+def bytes_per_call(sheet, fn):
+    """Byte letti dal foglio in una singola chiamata."""
+    before = sheet.bytes_read
+    fn()
+    return sheet.bytes_read - before
+
+
+def serializer_benchmarks(prompts, norms):
+    """Benchmark indipendenti dal foglio: costruzione riga e serializzatori."""
+    rng = random.Random(1)
+    state = make_session_state(rng, prompts, norms)
+    likert = make_likert(rng)
+    long_messages = make_messages(rng, rounds=10)
+
+    # ~10 minuti di scrittura con snapshot al secondo (test_epistemia.py)
+    text = ""
+    tracking = {}
+    for second in range(600):
+        if second % 3 == 0:
+            text += " " + rng.choice(["because", "people", "interview", "respect"])
+        tracking[1_700_000_000 + second] = {
+            "text": text, "word_count": len(text.split()), "char_count": len(text)
+        }
+
+    study_row = [str(v) for v in build_session_row(state, state["messages"], *likert, end_time=1.7e9 + 900)]
+
+    return {
+        "build_session_row": lambda: build_session_row(state, state["messages"], *likert, end_time=1.7e9 + 900),
+        "decode_row[study]": lambda: decode_row(study_row, "study"),
+        "m.encode_row[10_rounds]": lambda: encode_row("m", {"conversation": long_messages}),
+        "test_epistemia.encode_row[600s]": lambda: encode_row(
+            "epistemia", {"text_tracking": text_tracking_record(tracking)}
+        ),
+    }
+
+
+def run(sizes, repeat):
+    """
+    Returns:
+        tuple: ({benchmark: secondi per chiamata}, {benchmark: byte letti per chiamata})
+    """
+    prompts, norms = load_catalog("prompts.json"), load_catalog("norms.json")
+    results, transferred = {}, {}
+    for size in sizes:
+        benches, sheet = sheet_benchmarks(size, prompts, norms)
+        for name, fn in benches.items():
+            transferred[name] = bytes_per_call(sheet, fn)
+            results[name] = measure(fn, repeat=repeat)
+            print(f"{name:50s} {results[name] * 1000:10.3f} ms {transferred[name] / 1e6:10.2f} MB")
+    for name, fn in serializer_benchmarks(prompts, norms).items():
+        results[name] = measure(fn, repeat=repeat)
+        print(f"{name:50s} {results[name] * 1000:10.3f} ms")
+    return results, transferred
+
+
+def compare(results, baselines, tolerance):
+    """Elenco dei benchmark più lenti della baseline oltre la tolleranza."""
+    regressions = []
+    for name, seconds in results.items():
+        base = baselines.get(name)
+        if base and seconds > base * (1 + tolerance):
+            regressions.append((name, base, seconds))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dei percorsi critici su fogli sintetici.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--update", action="store_true", help="Riscrive baselines.json con i risultati")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    results, transferred = run(args.sizes, args.repeat)
+
+    if args.update or not os.path.exists(BASELINES_PATH):
+        with open(BASELINES_PATH, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "seconds": results,
+                "bytes_read": transferred,
+            }, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline salvata in {BASELINES_PATH}")
+        return
+
+    with open(BASELINES_PATH, "r", encoding="utf-8") as f:
+        baselines = json.load(f)["seconds"]
+    regressions = compare(results, baselines, args.tolerance)
+    for name, base, seconds in regressions:
+        print(f"REGRESSIONE {name}: {base * 1000:.3f} ms -> {seconds * 1000:.3f} ms")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
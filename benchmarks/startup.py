@@ -0,0 +1,157 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# ============================================================================
+# TEMPI DI IMPORT ALL'AVVIO (python -X importtime)
+# ============================================================================
+# Misura in un interprete nuovo quanto costa importare:
+#   phase0   i moduli che streamlit_app.py carica prima della pagina di benvenuto
+#   clients  gspread, google-auth e openai (caricati solo da clients.py)
+# e controlla che phase0 non trascini con sé nessun modulo pesante.
+#
+# Uso:
+#   python benchmarks/startup.py             # report e confronto con startup_baseline.json
+#   python benchmarks/startup.py --update    # riscrive la baseline
+#   python benchmarks/startup.py --top 30    # più righe nel report
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_baseline.json")
+DEFAULT_TOLERANCE = 0.5
+DEFAULT_REPEAT = 3
+
+TARGETS = {
+    "phase0": [
+        "streamlit",
+        "session_footprint",
+        "checkpoint",
+        "results",
+        "metrics",
+        "profiler",
+        "phase_engine",
+        "phases.common",
+        "phases.welcome",
+    ],
+    "clients": ["gspread", "google.oauth2.service_account", "openai"],
+}
+
+# Pacchetti che non devono comparire negli import della prima pagina
+HEAVY_PACKAGES = ("gspread", "google.auth", "google.oauth2", "openai", "pandas", "numpy", "httpx")
+
+
+def parse_importtime(stderr):
+    """
+    Returns:
+        list: (modulo, self µs, cumulativo µs, profondità) per ogni riga del report
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return entries
+
+
+def _importtime(code):
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+
+
+def import_report(modules, preloaded=()):
+    """
+    Importa `modules` in un interprete nuovo con -X importtime.
+
+    Args:
+        modules (list): Moduli da importare
+        preloaded (set): Moduli caricati dall'interprete prima di -c (esclusi)
+
+    Returns:
+        dict: total_ms, moduli caricati, voci ordinate per costo, errore
+    """
+    proc = _importtime("; ".join(f"import {m}" for m in modules))
+    entries = [e for e in parse_importtime(proc.stderr) if e[0] not in preloaded]
+    error = None
+    if proc.returncode != 0:
+        error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"
+    top_level = min((depth for _, _, _, depth in entries), default=0)
+    return {
+        "total_ms": sum(c for _, _, c, depth in entries if depth == top_level) / 1000,
+        "modules": [name for name, _, _, _ in entries],
+        "entries": sorted(entries, key=lambda e: e[2], reverse=True),
+        "error": error,
+    }
+
+
+def heavy_imports(modules):
+    return sorted({m for m in modules if m.split(".")[0] in HEAVY_PACKAGES or m.startswith(HEAVY_PACKAGES)})
+
+
+def run(repeat, top):
+    preloaded = {name for name, _, _, _ in parse_importtime(_importtime("pass").stderr)}
+    results = {}
+    for target, modules in TARGETS.items():
+        reports = [import_report(modules, preloaded) for _ in range(repeat)]
+        best = min(reports, key=lambda r: r["total_ms"])
+        print(f"== {target}: {best['total_ms']:.1f} ms ({len(best['modules'])} moduli, migliore di {repeat})")
+        if best["error"]:
+            print(f"   import fallito: {best['error']}")
+        for name, self_us, cumulative_us, _ in best["entries"][:top]:
+            print(f"   {name:50s} {cumulative_us / 1000:9.1f} ms cumulativo {self_us / 1000:8.1f} ms proprio")
+        results[target] = best
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempi di import all'avvio delle app.")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--update", action="store_true", help="Riscrive startup_baseline.json")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    results = run(args.repeat, args.top)
+    failed = False
+
+    leaked = heavy_imports(results["phase0"]["modules"])
+    if leaked:
+        print(f"ERRORE: la prima pagina importa moduli pesanti: {', '.join(leaked)}")
+        failed = True
+
+    measured = {target: r["total_ms"] for target, r in results.items() if not r["error"]}
+    if not args.update and not os.path.exists(BASELINE_PATH):
+        print(f"ERRORE: manca {BASELINE_PATH} (rigenerarla con --update)")
+        sys.exit(1)
+    if args.update:
+        if len(measured) < len(TARGETS):
+            print("Baseline non salvata: alcuni import sono falliti (dipendenze mancanti?)")
+            sys.exit(1)
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "import_ms": measured,
+            }, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline salvata in {BASELINE_PATH}")
+        sys.exit(1 if failed else 0)
+
+    with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+        baseline = json.load(f)["import_ms"]
+    for target, ms in measured.items():
+        base = baseline.get(target)
+        if base and ms > base * (1 + args.tolerance):
+            print(f"REGRESSIONE {target}: {base:.1f} ms -> {ms:.1f} ms")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
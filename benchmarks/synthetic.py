@@ -0,0 +1,174 @@
+import random
+import re
+import string
+from datetime import datetime, timedelta
+
+from results import build_session_row
+from session_codec import current_layout
+
+
+# ============================================================================
+# DATI SINTETICI PER I BENCHMARK
+# ============================================================================
+# Righe con la stessa forma di quelle salvate da streamlit_app.py, con
+# conversazioni JSON di lunghezza realistica, e un finto foglio gspread che
+# le serve in memoria.
+
+WORDS = [
+    "people", "park", "quiet", "library", "think", "appropriate", "feel", "public",
+    "interview", "phone", "dinner", "late", "really", "because", "maybe", "others",
+    "situation", "context", "respect", "comfortable", "honestly", "would", "never",
+]
+
+LIKERT_INVOLVEMENT = ["Got me involved", "Seemed relevant to me", "Interested me"]
+LIKERT_THREAT = ["Tried to manipulate me", "Tried to pressure me", "Undermined my sense of self-worth",
+                 "Made me feel less than capable", "Made me think I should change"]
+LIKERT_SOURCE = ["Reliable", "Trusted", "Honest", "Competent", "Expert", "Informed"]
+
+
+def _sentence(rng, n_words):
+    return " ".join(rng.choice(WORDS) for _ in range(n_words)).capitalize() + "."
+
+
+def make_messages(rng, rounds=None):
+    """Conversazione realistica: saluto + 3-10 round, risposte lunghe dell'assistente."""
+    rounds = rounds if rounds is not None else rng.randint(3, 10)
+    start = datetime(2026, 1, 1) + timedelta(seconds=rng.randint(0, 10**7))
+    messages = [{"role": "assistant", "content": _sentence(rng, rng.randint(60, 140)),
+                 "timestamp": start.isoformat()}]
+    for i in range(rounds):
+        t = start + timedelta(seconds=40 * (i + 1))
+        messages.append({"role": "user", "content": _sentence(rng, rng.randint(5, 40)),
+                         "timestamp": t.isoformat()})
+        messages.append({"role": "assistant", "content": _sentence(rng, rng.randint(80, 200)),
+                         "timestamp": (t + timedelta(seconds=8)).isoformat()})
+    return messages
+
+
+def make_session_state(rng, prompts, norms, pid=None):
+    """Stato di sessione completo come al termine della fase 9."""
+    prompt_key = rng.choice(list(prompts))
+    norm_key = rng.choice(list(norms))
+    others = rng.sample([k for k in norms if k != norm_key], 2) + [norm_key]
+    titles = [norms[k]["title"] for k in others]
+
+    def opinions():
+        return {t: rng.randint(0, 100) for t in titles}
+
+    return {
+        "prolific_id": pid or "".join(rng.choices(string.hexdigits.lower(), k=24)),
+        "prompt_key": prompt_key,
+        "norm_key": norm_key,
+        "initial_opinion": opinions(),
+        "final_opinion": opinions(),
+        "opinions_others": opinions(),
+        "opinions_others_final": opinions(),
+        "att_check_response_saved": rng.choice(titles),
+        "comp_response_saved": "Television or print news only",
+        "comp_correct": True,
+        "parallel_comp_time": rng.uniform(20, 120),
+        "parallel_engagement_time": rng.uniform(20, 120),
+        "sequential_comp_time": rng.uniform(20, 120),
+        "sequential_engagement_time": rng.uniform(10, 100),
+        "interaction_comp_time": rng.uniform(10, 100),
+        "interaction_engagement_time": rng.uniform(5, 90),
+        "engagement_text_saved": _sentence(rng, rng.randint(20, 80)),
+        "engagement_word_count": 50,
+        "start_time": 1.7e9,
+        "messages": make_messages(rng),
+    }
+
+
+def make_likert(rng):
+    return (
+        {s: rng.randint(1, 7) for s in LIKERT_INVOLVEMENT},
+        {s: rng.randint(1, 7) for s in LIKERT_THREAT},
+        {s: rng.randint(1, 7) for s in LIKERT_SOURCE},
+    )
+
+
+def make_rows(n_rows, prompts, norms, seed=0, distinct=200):
+    """
+    Righe sintetiche del foglio risultati (senza intestazione).
+
+    Per contenere la memoria con 100k righe vengono generate `distinct`
+    sessioni complete e riusate cambiando Prolific ID e condizione; le celle
+    JSON restano stringhe di dimensione realistica.
+    """
+    rng = random.Random(seed)
+    templates = []
+    for _ in range(distinct):
+        state = make_session_state(rng, prompts, norms)
+        row = build_session_row(state, state["messages"], *make_likert(rng), end_time=1.7e9 + 900)
+        templates.append([v if isinstance(v, str) else str(v) for v in row])
+
+    rows = []
+    prompt_keys, norm_keys = list(prompts), list(norms)
+    for i in range(n_rows):
+        row = list(templates[i % distinct])
+        row[0] = f"{i:08x}{rng.getrandbits(64):016x}"
+        row[1] = rng.choice(prompt_keys)
+        row[2] = rng.choice(norm_keys)
+        rows.append(row)
+    return rows
+
+
+HEADER = current_layout("study").header()
+
+
+class FakeSheet:
+    """
+    Foglio gspread in memoria con le chiamate usate dalle app.
+
+    Ogni lettura restituisce liste nuove (come farebbe gspread dopo il
+    parsing della risposta) e accumula in bytes_read la dimensione dei
+    valori trasferiti.
+    """
+
+    def __init__(self, rows, header=HEADER):
+        self.rows = [list(header)] + rows
+        self.bytes_read = 0
+        self._column_bytes = {}
+
+    @staticmethod
+    def _size(values):
+        return sum(len(v.encode("utf-8")) for v in values)
+
+    def _col_bytes(self, col):
+        cached = self._column_bytes.get(col)
+        if cached is None or cached[0] != len(self.rows):
+            cached = (len(self.rows), self._size(r[col - 1] for r in self.rows if len(r) >= col))
+            self._column_bytes[col] = cached
+        return cached[1]
+
+    def get_all_values(self):
+        width = max(len(r) for r in self.rows)
+        self.bytes_read += sum(self._col_bytes(c) for c in range(1, width + 1))
+        return [list(r) for r in self.rows]
+
+    def col_values(self, col):
+        self.bytes_read += self._col_bytes(col)
+        return [r[col - 1] if len(r) >= col else "" for r in self.rows]
+
+    def row_values(self, row):
+        values = list(self.rows[row - 1]) if row <= len(self.rows) else []
+        self.bytes_read += self._size(values)
+        return values
+
+    def batch_get(self, ranges):
+        """Solo intervalli di una colonna aperti in fondo ("B2:B"), come li usa ResultsSheet."""
+        results = []
+        for a1 in ranges:
+            letters, start = re.fullmatch(r"([A-Z]+)(\d+):[A-Z]+", a1).groups()
+            col = 0
+            for ch in letters:
+                col = col * 26 + ord(ch) - ord("A") + 1
+            values = [r[col - 1] if len(r) >= col else "" for r in self.rows[int(start) - 1:]]
+            while values and not values[-1]:
+                values.pop()
+            self.bytes_read += self._size(values)
+            results.append([[v] if v else [] for v in values])
+        return results
+
+    def append_row(self, values, value_input_option=None):
+        self.rows.append([str(v) if not isinstance(v, str) else v for v in values])
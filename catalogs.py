@@ -0,0 +1,36 @@
+import json
+import os
+import threading
+
+
+# ============================================================================
+# CATALOGHI JSON CONDIVISI
+# ============================================================================
+# prompts.json e norms.json vengono letti una volta per processo e condivisi
+# da tutte le sessioni e da tutti gli studi ospitati nello stesso server; un
+# file modificato su disco viene riletto alla richiesta successiva.
+# I dati restituiti sono condivisi: vanno trattati in sola lettura.
+_catalogs = {}
+_lock = threading.Lock()
+
+
+def load_catalog(path):
+    """
+    Contenuto di un file JSON, dalla cache del processo.
+
+    Raises:
+        FileNotFoundError: Se il file non esiste
+        json.JSONDecodeError: Se il file non è JSON valido
+    """
+    path = os.path.abspath(path)
+    mtime = os.path.getmtime(path)
+    with _lock:
+        entry = _catalogs.get(path)
+    if entry is not None and entry[0] == mtime:
+        return entry[1]
+
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    with _lock:
+        _catalogs[path] = (mtime, data)
+    return data
@@ -0,0 +1,106 @@
+import streamlit as st
+
+from local_store import get_store
+
+
+# ============================================================================
+# CHECKPOINT DEL PROGRESSO DELLO STUDIO
+# ============================================================================
+# Un refresh della pagina crea una nuova sessione Streamlit e azzera
+# st.session_state. Ad ogni cambio di fase (e ad ogni nuovo messaggio della
+# conversazione, compreso quello dell'utente ancora in attesa di risposta:
+# pending_user_message viene aggiunto alla conversazione solo nel rerun
+# successivo) salviamo le chiavi che descrivono il progresso nello store
+# locale, indicizzate per PROLIFIC_PID; alla riconnessione basta una lettura
+# per chiave primaria per riprendere esattamente da dove si era rimasti.
+CHECKPOINT_NAMESPACE = "checkpoints"
+CHECKPOINT_MAX_AGE_SECONDS = 7 * 24 * 3600
+
+CHECKPOINT_KEYS = [
+    "session_initialized",
+    "pid_checked",
+    "phase",
+    "messages",
+    "pending_user_message",
+    "greeting_sent",
+    "conversation_ended",
+    "data_saved",
+    "prompt_key",
+    "norm_key",
+    "start_time",
+    "sampled_norms",
+    "initial_opinion",
+    "opinions_others",
+    "final_opinion",
+    "opinions_others_final",
+    "att_check_response_saved",
+    "comp_response_saved",
+    "engagement_text_saved",
+    "comp_correct",
+    "engagement_word_count",
+    "parallel_comp_time",
+    "parallel_engagement_time",
+    "sequential_comp_time",
+    "sequential_engagement_time",
+    "interaction_comp_time",
+    "interaction_engagement_time",
+    "phase1_client_timing",
+]
+
+
+def _checkpoint_marker():
+    """Identifica il punto di avanzamento: fase, numero di messaggi e messaggio in attesa."""
+    return (
+        st.session_state.get("phase"),
+        len(st.session_state.get("messages") or []),
+        st.session_state.get("pending_user_message") is not None,
+    )
+
+
+def restore_checkpoint(prolific_id):
+    """
+    Ripristina il progresso salvato per questo partecipante, se presente.
+
+    Va chiamata una volta per sessione, prima di inizializzare i default.
+
+    Args:
+        prolific_id (str): PROLIFIC_PID del partecipante
+
+    Returns:
+        bool: True se è stato ripristinato un checkpoint
+    """
+    if st.session_state.get("_checkpoint_lookup_done"):
+        return False
+    st.session_state["_checkpoint_lookup_done"] = True
+
+    saved = get_store().get(CHECKPOINT_NAMESPACE, prolific_id.strip().lower())
+    if not saved:
+        return False
+
+    for key, value in saved.items():
+        st.session_state[key] = value
+    st.session_state["_checkpoint_marker"] = _checkpoint_marker()
+    return True
+
+
+def save_checkpoint(prolific_id):
+    """
+    Salva il progresso se la fase o la conversazione sono avanzate
+    dall'ultimo checkpoint. Da chiamare all'inizio di ogni rerun.
+
+    Args:
+        prolific_id (str): PROLIFIC_PID del partecipante
+    """
+    marker = _checkpoint_marker()
+    if st.session_state.get("_checkpoint_marker") == marker:
+        return
+
+    snapshot = {k: st.session_state[k] for k in CHECKPOINT_KEYS if k in st.session_state}
+    get_store().put(CHECKPOINT_NAMESPACE, prolific_id.strip().lower(), snapshot)
+    st.session_state["_checkpoint_marker"] = marker
+
+
+@st.cache_resource(ttl=24 * 3600)
+def purge_stale_checkpoints():
+    """Elimina i checkpoint più vecchi di una settimana (al massimo una volta al giorno)."""
+    return get_store().purge_older_than(CHECKPOINT_NAMESPACE, CHECKPOINT_MAX_AGE_SECONDS)
@@ -0,0 +1,98 @@
+import os
+import time
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+
+# ============================================================================
+# TEMPI MISURATI NEL BROWSER
+# ============================================================================
+# Il componente (frontend/client_timing) registra nel browser focus, primo
+# input, change e submit dei widget indicati, con performance.now(), e
+# disegna lui stesso il bottone di fine fase: il click invia il batch come
+# valore del componente, quindi batch e click arrivano nello stesso rerun.
+# Così i tempi non dipendono dalla granularità dei rerun né dalla latenza di
+# rete, e il bottone non costa un rerun in più.
+_FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend", "client_timing")
+_client_timing = components.declare_component("client_timing", path=_FRONTEND_DIR)
+
+
+def client_timing(phase, targets, submit_label="Continue", key=None):
+    """
+    Monta il registratore di eventi e il bottone che chiude la fase.
+
+    Args:
+        phase (str | int): Identificativo della fase (separa i dati tra fasi)
+        targets (dict): {nome: selettore CSS del widget nel DOM della pagina}
+        submit_label (str): Testo del bottone
+        key (str): Chiave del componente
+
+    Returns:
+        dict: {"clicked": bool, "batch": dict | None}; clicked è True (con il
+        batch del click) solo nel rerun causato dal click, come st.button
+    """
+    batch = _client_timing(
+        phase=str(phase),
+        targets=[{"name": name, "selector": selector} for name, selector in targets.items()],
+        submit_label=submit_label,
+        server_time=time.time(),
+        key=key or f"client_timing_{phase}",
+        default=None,
+    )
+    if not batch:
+        return {"clicked": False, "batch": None}
+
+    # Il valore del componente resta valido nei rerun successivi: lo
+    # consideriamo solo quando arriva un submit nuovo
+    seen_key = f"_client_timing_seen_{phase}"
+    if st.session_state.get(seen_key) == batch.get("submit_id"):
+        return {"clicked": False, "batch": None}
+    st.session_state[seen_key] = batch.get("submit_id")
+
+    batch["server_received"] = time.time() * 1000
+    batch["clock"] = reconcile_clocks(batch)
+    return {"clicked": True, "batch": batch}
+
+
+def reconcile_clocks(batch):
+    """
+    Stima lo scarto tra orologio del browser e del server (stile NTP).
+
+    t0: il server invia il render      t1: il browser lo riceve
+    t2: il browser invia il batch      t3: il server lo riceve
+
+    Returns:
+        dict: offset_ms (client - server) e round_trip_ms stimati
+    """
+    render = batch.get("last_render") or batch.get("first_render")
+    if not render:
+        return {"offset_ms": None, "round_trip_ms": None}
+    t0, t1 = render["server"], render["client"]
+    t2, t3 = batch["client_sent"], batch["server_received"]
+    return {
+        "offset_ms": ((t1 - t0) + (t2 - t3)) / 2,
+        "round_trip_ms": (t3 - t0) - (t2 - t1),
+    }
+
+
+def to_server_time(batch, client_ms):
+    """Converte un timestamp del browser (ms) in secondi sull'orologio del server."""
+    offset = batch["clock"]["offset_ms"] or 0
+    return (client_ms - offset) / 1000
+
+
+def elapsed_since(batch, target, event, which="first"):
+    """
+    Secondi tra un evento `event` sul widget `target` e il submit.
+
+    Args:
+        which (str): "first" o "last" (occorrenza dell'evento)
+
+    Returns:
+        float | None: None se l'evento non è mai avvenuto
+    """
+    stamp = batch.get("targets", {}).get(target, {}).get(f"{which}_{event}")
+    if stamp is None:
+        return None
+    return (batch["submit"] - stamp) / 1000
@@ -0,0 +1,158 @@
+import contextvars
+import os
+import threading
+import time
+
+import streamlit as st
+
+from study_logging import get_logger
+
+
+# ============================================================================
+# CLIENT ESTERNI, CARICATI SU RICHIESTA
+# ============================================================================
+# gspread, google-auth e openai pesano all'avvio (import e autorizzazione)
+# e nessuna app ne ha bisogno per mostrare la prima pagina. Qui vengono
+# importati e inizializzati solo al primo uso, una volta per processo, e
+# condivisi da tutte le sessioni. start_warmup() fa lo stesso in un thread
+# in background appena l'app parte, così che il primo accesso a Sheets o al
+# modello trovi i client già pronti, e poi avvia il connection warmer
+# (connection_warmer.py) che ne tiene calde le connessioni.
+#
+# Le connessioni inattive restano nel pool per KEEPALIVE_SECONDS (httpx di
+# default le chiude dopo 5 secondi).
+KEEPALIVE_SECONDS = int(os.environ.get("CONNECTION_KEEPALIVE_SECONDS", 240))
+
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+
+log = get_logger("clients")
+
+# Studio servito dal rerun corrente (impostato da study_router.py); i
+# secrets in [studies.<nome>] hanno la precedenza su quelli globali, così
+# che ogni studio scriva sul proprio foglio
+_current_study = contextvars.ContextVar("study", default=None)
+
+_spreadsheets = {}
+_sheets = {}
+_openai_clients = {}
+_sheets_lock = threading.Lock()
+_openai_lock = threading.Lock()
+_warmup_studies = set()  # studi già avviati (None = secrets globali)
+_warmup_lock = threading.Lock()
+
+
+def use_study(name):
+    """Imposta lo studio del rerun corrente; restituisce il token per reset_study()."""
+    return _current_study.set(name)
+
+
+def reset_study(token):
+    _current_study.reset(token)
+
+
+def current_study():
+    return _current_study.get()
+
+
+def study_secret(key):
+    """Secret dello studio corrente ([studies.<nome>]) oppure quello globale."""
+    study = _current_study.get()
+    if study is not None:
+        overrides = st.secrets.get("studies", {}).get(study, {})
+        if key in overrides:
+            return overrides[key]
+    return st.secrets[key]
+
+
+def get_spreadsheet(url=None):
+    """
+    Spreadsheet gspread autorizzato con il service account dei secrets.
+
+    Args:
+        url (str): URL del foglio (default: quello dello studio corrente)
+    """
+    url = url or study_secret("google_sheet_url")
+    with _sheets_lock:
+        spreadsheet = _spreadsheets.get(url)
+        if spreadsheet is None:
+            import gspread
+            from google.oauth2.service_account import Credentials
+
+            creds = Credentials.from_service_account_info(st.secrets["gcp_service_account"], scopes=SCOPES)
+            spreadsheet = _spreadsheets[url] = gspread.authorize(creds).open_by_url(url)
+        return spreadsheet
+
+
+def get_sheet(url=None):
+    """Primo worksheet del foglio, con le chiamate che passano dallo scheduler."""
+    from sheets_scheduler import ScheduledSheet
+
+    url = url or study_secret("google_sheet_url")
+    sheet = _sheets.get(url)
+    if sheet is None:
+        spreadsheet = get_spreadsheet(url)
+        with _sheets_lock:
+            sheet = _sheets.setdefault(url, ScheduledSheet(spreadsheet.sheet1))
+    return sheet
+
+
+def get_openai_client(api_key=None):
+    """Client OpenAI (default: la chiave dello studio corrente)."""
+    api_key = api_key or study_secret("openai_api_key")
+    with _openai_lock:
+        client = _openai_clients.get(api_key)
+        if client is None:
+            import httpx
+            from openai import OpenAI
+
+            http_client = httpx.Client(
+                limits=httpx.Limits(max_connections=1000, max_keepalive_connections=100,
+                                    keepalive_expiry=KEEPALIVE_SECONDS),
+                follow_redirects=True,
+            )
+            client = _openai_clients[api_key] = OpenAI(api_key=api_key, http_client=http_client)
+        return client
+
+
+def _warmup(sheets, openai):
+    for name, enabled, init in (("sheets", sheets, get_sheet), ("openai", openai, get_openai_client)):
+        if not enabled:
+            continue
+        start = time.perf_counter()
+        try:
+            init()
+        except Exception:
+            # Alla prima richiesta vera l'errore si ripresenta nella sessione
+            log.exception("client_warmup_failed", extra={"fields": {"client": name}})
+            continue
+        log.info("client_ready", extra={"fields": {
+            "client": name, "seconds": round(time.perf_counter() - start, 3)
+        }})
+
+    from connection_warmer import get_warmer
+    get_warmer().start()
+
+
+def start_warmup(sheets=True, openai=True):
+    """
+    Avvia (una volta per processo e per studio) l'inizializzazione dei client
+    in background.
+
+    Non blocca il rerun: chi chiede un client mentre il thread lo sta creando
+    aspetta sul lock invece di autorizzare una seconda volta. Il thread gira
+    in una copia del contesto corrente, quindi usa i secrets dello studio
+    impostato da use_study().
+    """
+    study = _current_study.get()
+    with _warmup_lock:
+        if study in _warmup_studies:
+            return
+        _warmup_studies.add(study)
+    context = contextvars.copy_context()
+    threading.Thread(
+        target=context.run, args=(_warmup, sheets, openai),
+        name=f"clients-warmup-{study or 'default'}", daemon=True,
+    ).start()
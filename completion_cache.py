@@ -0,0 +1,181 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from llm import CHAT_MODEL, GREETING_TURN, Completion, complete, request_key
+from local_store import get_store
+from metrics import REGISTRY
+
+
+# ============================================================================
+# CACHE DELLE RISPOSTE DEL MODELLO
+# ============================================================================
+# Richieste identiche (stesso modello, messaggi e parametri) possono
+# riusare la risposta salvata: LRU in memoria davanti a un livello su disco
+# (local_store, namespace "completions"), entrambi con scadenza TTL e un
+# numero massimo di voci.
+#
+# Si attiva per ambiente con COMPLETION_CACHE:
+#   off        (default) nessuna cache: ogni partecipante riceve una risposta nuova
+#   greetings  solo i saluti iniziali ("Start the discussion"/"Start the conversation")
+#   all        tutte le richieste non in streaming (test interni, demo, anteprime)
+# Con partecipanti reali va lasciata "off" salvo scelta esplicita di
+# riusare i saluti.
+CACHE_MODE = os.environ.get("COMPLETION_CACHE", "off").lower()
+CACHE_TTL_SECONDS = int(os.environ.get("COMPLETION_CACHE_TTL", 24 * 3600))
+MEMORY_MAX_ENTRIES = 256
+DISK_MAX_ENTRIES = 5000
+DISK_NAMESPACE = "completions"
+
+GREETING_TURNS = {GREETING_TURN, "Start the conversation"}
+
+
+def is_greeting(messages):
+    """True per una richiesta di saluto: system prompt + solo il turno di apertura."""
+    return (
+        len(messages) == 2
+        and messages[0]["role"] == "system"
+        and messages[1]["role"] == "user"
+        and messages[1]["content"] in GREETING_TURNS
+    )
+
+
+class CompletionCache:
+    """
+    Cache a due livelli per complete().
+
+    Le metriche (hit in memoria/su disco, miss, richieste non cacheabili,
+    evizioni) sono disponibili con `metrics()`.
+    """
+
+    def __init__(self, mode=CACHE_MODE, ttl=CACHE_TTL_SECONDS, memory_max=MEMORY_MAX_ENTRIES,
+                 disk_max=DISK_MAX_ENTRIES, store=None):
+        self.mode = mode
+        self.ttl = ttl
+        self.memory_max = memory_max
+        self.disk_max = disk_max
+        self._store = store
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+        self._metrics = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "evictions": 0,
+        }
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = get_store()
+        return self._store
+
+    def cacheable(self, messages):
+        if self.mode == "all":
+            return True
+        if self.mode == "greetings":
+            return is_greeting(messages)
+        return False
+
+    def _count(self, metric, n=1):
+        with self._lock:
+            self._metrics[metric] += n
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self._metrics["memory_hits"] += 1
+                    return entry[1]
+                del self._memory[key]
+
+        entry = self.store.get(DISK_NAMESPACE, key)
+        if entry is not None and now - entry["created"] <= self.ttl:
+            self._remember(key, entry["created"], entry["value"])
+            self._count("disk_hits")
+            return entry["value"]
+        return None
+
+    def _remember(self, key, created, value):
+        with self._lock:
+            self._memory[key] = (created, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_max:
+                self._memory.popitem(last=False)
+                self._metrics["evictions"] += 1
+
+    def put(self, key, value):
+        created = time.time()
+        self._remember(key, created, value)
+        self.store.put(DISK_NAMESPACE, key, {"created": created, "value": value})
+        with self._lock:
+            self._disk_writes += 1
+            sweep = self._disk_writes % 100 == 0
+        if sweep:
+            # Pulizia del livello su disco ogni 100 scritture
+            removed = self.store.purge_older_than(DISK_NAMESPACE, self.ttl)
+            removed += self.store.trim(DISK_NAMESPACE, self.disk_max)
+            self._count("evictions", removed)
+
+    def complete(self, client, messages, model=CHAT_MODEL, **params):
+        """
+        complete() con cache, se la richiesta è cacheabile in questo ambiente.
+
+        Returns:
+            Completion: Per gli hit la latenza è quella della lettura in cache
+        """
+        if not self.cacheable(messages):
+            self._count("bypassed")
+            return complete(client, messages, model, **params)
+
+        start = time.perf_counter()
+        key = request_key(model, messages, params)
+        cached = self.get(key)
+        if cached is not None:
+            return Completion(cached["text"], time.perf_counter() - start,
+                              cached["prompt_tokens"], cached["completion_tokens"])
+
+        self._count("misses")
+        completion = complete(client, messages, model, **params)
+        self.put(key, completion.to_dict())
+        return completion
+
+    def metrics(self):
+        """Copia delle metriche correnti, con hit rate e voci in memoria."""
+        with self._lock:
+            snapshot = dict(self._metrics)
+            snapshot["memory_entries"] = len(self._memory)
+        lookups = snapshot["memory_hits"] + snapshot["disk_hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = (snapshot["memory_hits"] + snapshot["disk_hits"]) / lookups if lookups else 0.0
+        snapshot["mode"] = self.mode
+        return snapshot
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _cache_events():
+    if _cache is None:
+        return {}
+    snapshot = _cache.metrics()
+    return {(event,): snapshot[event] for event in ("memory_hits", "disk_hits", "misses", "bypassed", "evictions")}
+
+
+REGISTRY.gauge("completion_cache_events", "Eventi della cache delle risposte (cumulativi)", ("event",),
+               callback=_cache_events)
+
+
+def get_completion_cache():
+    """Cache unica per tutto il processo (configurata da COMPLETION_CACHE)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CompletionCache()
+        return _cache
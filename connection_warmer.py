@@ -0,0 +1,155 @@
+import os
+import threading
+import time
+
+from clients import KEEPALIVE_SECONDS, get_spreadsheet, get_openai_client
+from llm import CHAT_MODEL
+from metrics import REGISTRY
+from study_logging import get_logger
+
+
+# ============================================================================
+# CONNESSIONI HTTPS TENUTE CALDE
+# ============================================================================
+# La prima richiesta dopo un periodo di inattività paga DNS, TCP e TLS (e
+# per Sheets anche il refresh del token). Il warmer manda a ogni endpoint
+# una richiesta leggera che non consuma quota né token:
+#   openai  GET /models/<modello>
+#   sheets  HEAD https://sheets.googleapis.com/ con la sessione autorizzata
+# all'avvio, ogni CONNECTION_WARM_INTERVAL secondi (0 = niente timer) e
+# quando una sessione entra nella fase che precede la conversazione.
+#
+# Metriche:
+#   connection_warm_seconds{endpoint,state}   durata dei ping, a freddo o a caldo
+#   connection_handshake_seconds_avoided_total{endpoint}
+#       stima del tempo di connessione risparmiato dalle sessioni: quando una
+#       sessione chiede il warm-up e senza warmer il pool sarebbe stato
+#       freddo, si conta (latenza media a freddo - latenza media a caldo)
+WARM_INTERVAL_SECONDS = int(os.environ.get("CONNECTION_WARM_INTERVAL", 60))
+PING_TIMEOUT_SECONDS = 10
+SHEETS_ENDPOINT = "https://sheets.googleapis.com/"
+EWMA_ALPHA = 0.2
+
+log = get_logger("connection_warmer")
+
+WARM_SECONDS = REGISTRY.histogram(
+    "connection_warm_seconds", "Durata dei ping del connection warmer", ("endpoint", "state")
+)
+HANDSHAKE_AVOIDED = REGISTRY.counter(
+    "connection_handshake_seconds_avoided_total",
+    "Tempo di connessione (DNS/TCP/TLS) stimato risparmiato dalle sessioni", ("endpoint",)
+)
+
+
+def _ping_openai():
+    client = get_openai_client().with_options(max_retries=0, timeout=PING_TIMEOUT_SECONDS)
+    client.models.retrieve(CHAT_MODEL)
+
+
+def _ping_sheets():
+    # Stessa sessione (e quindi stesso pool) usata da gspread
+    session = get_spreadsheet().client.session
+    session.head(SHEETS_ENDPOINT, timeout=PING_TIMEOUT_SECONDS)
+
+
+class Endpoint:
+    """Un endpoint da tenere caldo e le latenze medie dei suoi ping."""
+
+    def __init__(self, name, ping):
+        self.name = name
+        self.ping = ping
+        self.last_ping = None
+        self.last_demand = None
+        self.cold_seconds = None
+        self.warm_seconds = None
+        self._lock = threading.Lock()
+
+    def is_cold(self, now):
+        return self.last_ping is None or now - self.last_ping > KEEPALIVE_SECONDS
+
+    def handshake_estimate(self):
+        if self.cold_seconds is None or self.warm_seconds is None:
+            return 0.0
+        return max(0.0, self.cold_seconds - self.warm_seconds)
+
+    def warm(self):
+        """
+        Esegue un ping (uno alla volta per endpoint).
+
+        Returns:
+            float | None: Durata del ping; None se è fallito
+        """
+        with self._lock:
+            state = "cold" if self.is_cold(time.monotonic()) else "warm"
+            start = time.perf_counter()
+            try:
+                self.ping()
+            except Exception as e:
+                log.warning("connection_warm_failed", extra={"fields": {"endpoint": self.name, "error": str(e)}})
+                return None
+            seconds = time.perf_counter() - start
+            self.last_ping = time.monotonic()
+            attr = f"{state}_seconds"
+            previous = getattr(self, attr)
+            setattr(self, attr, seconds if previous is None else previous + EWMA_ALPHA * (seconds - previous))
+        WARM_SECONDS.observe(self.name, state, value=seconds)
+        return seconds
+
+    def warm_for_demand(self):
+        """Warm-up chiesto da una sessione: conta il risparmio se senza warmer il pool sarebbe stato freddo."""
+        now = time.monotonic()
+        with self._lock:
+            would_be_cold = self.last_demand is None or now - self.last_demand > KEEPALIVE_SECONDS
+            self.last_demand = now
+        if self.warm() is not None and would_be_cold:
+            HANDSHAKE_AVOIDED.inc(self.name, amount=self.handshake_estimate())
+
+
+class ConnectionWarmer:
+    """Tiene calde le connessioni degli endpoint registrati."""
+
+    def __init__(self, endpoints, interval=WARM_INTERVAL_SECONDS):
+        self.endpoints = {endpoint.name: endpoint for endpoint in endpoints}
+        self.interval = interval
+        self._started = False
+        self._lock = threading.Lock()
+
+    def warm_all(self):
+        for endpoint in self.endpoints.values():
+            endpoint.warm()
+
+    def warm_for_session(self):
+        """Warm-up in background per una sessione che sta per usare gli endpoint."""
+        def run():
+            for endpoint in self.endpoints.values():
+                endpoint.warm_for_demand()
+        threading.Thread(target=run, name="connection-warm-session", daemon=True).start()
+
+    def _loop(self):
+        while True:
+            self.warm_all()
+            time.sleep(self.interval)
+
+    def start(self):
+        """Avvia (una volta) il timer; con interval=0 esegue solo un warm-up iniziale."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        if self.interval:
+            threading.Thread(target=self._loop, name="connection-warmer", daemon=True).start()
+        else:
+            threading.Thread(target=self.warm_all, name="connection-warmer", daemon=True).start()
+
+
+_warmer = None
+_warmer_lock = threading.Lock()
+
+
+def get_warmer():
+    """Warmer unico per tutto il processo (OpenAI e Sheets)."""
+    global _warmer
+    with _warmer_lock:
+        if _warmer is None:
+            _warmer = ConnectionWarmer([Endpoint("openai", _ping_openai), Endpoint("sheets", _ping_sheets)])
+        return _warmer
@@ -0,0 +1,148 @@
+import hmac
+import os
+from datetime import datetime
+
+import streamlit as st
+
+from catalogs import load_catalog
+from study_progress import (
+    APP_PHASES, DURATION_BUCKETS, LATENCY_BUCKETS, DROP_OFF_SECONDS,
+    histogram_quantile, load_progress, load_latency, open_sessions,
+)
+
+# ============================================================================
+# DASHBOARD DEGLI SPERIMENTATORI
+# ============================================================================
+# Avanzamento degli studi dagli aggregati che le app tengono nell'archivio
+# locale (study_progress.py). Nessuna chiamata all'API di Sheets, quindi la
+# pagina può aggiornarsi da sola mentre le sessioni sono in corso.
+#   streamlit run dashboard.py           (oppure /dashboard con study_router.py)
+# L'accesso richiede ?key=<dashboard_key> (secrets) o DASHBOARD_KEY (ambiente).
+REFRESH_SECONDS = int(os.environ.get("DASHBOARD_REFRESH_SECONDS", 10))
+APPS = ("study", "m", "pilot", "epistemia")
+
+st.set_page_config(page_title="Study progress", page_icon="📊", layout="wide")
+
+
+def _authorized():
+    expected = os.environ.get("DASHBOARD_KEY")
+    if not expected:
+        try:
+            expected = st.secrets.get("dashboard_key")
+        except Exception:
+            # Nessun secrets.toml
+            expected = None
+    given = st.query_params.get("key", "")
+    return bool(expected) and hmac.compare_digest(str(given), str(expected))
+
+
+def _seconds(value):
+    if value is None:
+        return "-"
+    return f"{value:.0f} s" if value < 120 else f"{value / 60:.1f} min"
+
+
+# ============================================================================
+# SEZIONI
+# ============================================================================
+def render_fill(progress):
+    st.markdown("### Condition fill")
+    st.caption("Completed sessions per (prompt, norm); assigned sessions (including unfinished ones) in brackets.")
+    prompts, norms = load_catalog("prompts.json"), load_catalog("norms.json")
+    completed, assigned = progress["completed"], progress["assigned"]
+    rows = []
+    for prompt_key, prompt_data in prompts.items():
+        row = {"prompt": f"{prompt_key} · {prompt_data.get('title', '')}"}
+        for norm_key in norms:
+            cell = (prompt_key, norm_key)
+            row[norm_key] = f"{completed.get(cell, 0)} ({assigned.get(cell, 0)})"
+        rows.append(row)
+    st.dataframe(rows, hide_index=True, use_container_width=True)
+
+    counts = [completed.get((p, n), 0) for p in prompts for n in norms]
+    if counts:
+        st.caption(f"Least filled: {min(counts)} · most filled: {max(counts)} · "
+                   f"total completed: {sum(completed.values())}")
+
+
+def render_funnel(app, progress):
+    st.markdown("### Completion funnel")
+    phases = {spec["phase"]: spec["name"] for spec in load_catalog("phases.json").get(app, [])}
+    phases = phases or APP_PHASES.get(app, {})
+    entered = progress["entered"]
+    if not entered:
+        st.info("No phase transitions recorded for this app yet.")
+        return
+
+    open_by_phase = open_sessions(app)
+    order = sorted(set(entered) | set(phases))
+    started = entered.get(order[0], 0) or max(entered.values())
+    rows = []
+    for i, phase in enumerate(order):
+        reached = entered.get(phase, 0)
+        following = entered.get(order[i + 1], 0) if i + 1 < len(order) else None
+        here = open_by_phase.get(phase, {"active": 0, "dropped": 0})
+        histogram = progress["phase_seconds"].get(phase)
+        rows.append({
+            "phase": phase,
+            "name": phases.get(phase, ""),
+            "reached": reached,
+            "% of started": round(100 * reached / started, 1) if started else None,
+            "in progress": here["active"],
+            "dropped here": here["dropped"],
+            "lost to next": reached - following if following is not None else None,
+            "median time": _seconds(histogram_quantile(histogram, DURATION_BUCKETS, 0.5)) if histogram else "-",
+        })
+    st.dataframe(rows, hide_index=True, use_container_width=True)
+    st.caption(f"A session counts as dropped after {_seconds(DROP_OFF_SECONDS)} without a phase change.")
+
+
+def render_durations(progress):
+    total = progress["total_seconds"]
+    cols = st.columns(3)
+    cols[0].metric("Completed", sum(progress["completed"].values()))
+    cols[1].metric("Median session duration", _seconds(histogram_quantile(total, DURATION_BUCKETS, 0.5)))
+    cols[2].metric("90th percentile", _seconds(histogram_quantile(total, DURATION_BUCKETS, 0.9)))
+
+
+def render_latency():
+    st.markdown("### API latency (all studies)")
+    rows = []
+    for kind, label in (("llm", "OpenAI (per response)"), ("sheets", "Google Sheets (per request)")):
+        histogram = load_latency(kind)
+        median = histogram_quantile(histogram, LATENCY_BUCKETS, 0.5)
+        p95 = histogram_quantile(histogram, LATENCY_BUCKETS, 0.95)
+        rows.append({
+            "endpoint": label,
+            "requests": sum(histogram),
+            "median s": round(median, 2) if median is not None else None,
+            "p95 s": round(p95, 2) if p95 is not None else None,
+        })
+    st.dataframe(rows, hide_index=True, use_container_width=True)
+
+
+def render_dashboard(app):
+    progress = load_progress(app)
+    updated = progress["updated"]
+    st.caption(
+        f"Last update from the app: {datetime.fromtimestamp(updated).strftime('%Y-%m-%d %H:%M:%S') if updated else 'never'}"
+        f" · refreshed {datetime.now().strftime('%H:%M:%S')}"
+    )
+    render_durations(progress)
+    render_fill(progress)
+    render_funnel(app, progress)
+    render_latency()
+
+
+# ============================================================================
+# PAGINA
+# ============================================================================
+if not _authorized():
+    st.error("Not authorized.")
+    st.stop()
+
+st.markdown("## Study progress")
+selected = st.selectbox("App", APPS, index=0)
+
+# Solo il frammento viene rieseguito a intervalli
+st.fragment(run_every=REFRESH_SECONDS)(render_dashboard)(selected)
@@ -0,0 +1,162 @@
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+import uuid
+
+from llm import generation_profile
+from local_store import get_store
+from study_progress import record_latency
+
+
+# ============================================================================
+# TOKEN E LATENZA PER TEMPLATE DI PROMPT
+# ============================================================================
+# Le fasi di chat registrano ogni risposta del modello (template, modello,
+# token in uscita, latenza) nell'archivio locale; il report ne calcola media
+# e p95 per template accanto al profilo di generazione attuale, per regolare
+# max_tokens e gli altri parametri in prompts.json.
+#
+# Uso:
+#   python generation_report.py                       # dall'archivio locale
+#   python generation_report.py --from batch_eval.csv # da batch_eval.py (csv o jsonl)
+#   python generation_report.py --since-hours 24
+NAMESPACE = "generations"
+MAX_ENTRIES = 50_000
+
+_writes = 0
+_writes_lock = threading.Lock()
+
+
+def record_generation(template, model, mode, latency, completion_tokens, store=None):
+    """
+    Registra una risposta del modello.
+
+    Args:
+        template (str): Chiave del prompt in prompts.json
+        model (str): Modello usato
+        mode (str): "greeting", "turn" o "final_chat" (chat laterale finale)
+        latency (float): Secondi fino all'ultimo token
+        completion_tokens (int): Token generati
+    """
+    global _writes
+    store = store or get_store()
+    store.put(NAMESPACE, f"{time.time():.6f}-{uuid.uuid4().hex[:8]}", {
+        "ts": time.time(),
+        "template": str(template),
+        "model": model,
+        "mode": mode,
+        "latency": latency,
+        "completion_tokens": completion_tokens,
+    })
+    with _writes_lock:
+        _writes += 1
+        sweep = _writes % 1000 == 0
+    if sweep:
+        store.trim(NAMESPACE, MAX_ENTRIES)
+    record_latency("llm", latency, store=store)
+
+
+def load_records(store=None, since_hours=None):
+    records = [value for _, value in (store or get_store()).items(NAMESPACE)]
+    if since_hours is not None:
+        cutoff = time.time() - since_hours * 3600
+        records = [r for r in records if r["ts"] >= cutoff]
+    return records
+
+
+def load_eval_results(path):
+    """Righe di batch_eval.py (csv o jsonl) nello stesso formato dei record."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        rows = [json.loads(line) for line in f if line.strip()] if path.endswith(".jsonl") else list(csv.DictReader(f))
+    records = []
+    for row in rows:
+        if row.get("cached") in (True, "True"):
+            # Latenza della cache su disco, non del modello
+            continue
+        records.append({
+            "template": str(row["prompt_key"]),
+            "mode": "greeting" if str(row["turn"]) == "0" else "turn",
+            "latency": float(row["latency"]),
+            "completion_tokens": int(row["completion_tokens"]) if row.get("completion_tokens") not in (None, "") else None,
+        })
+    return records
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _mean(values):
+    return sum(values) / len(values) if values else None
+
+
+def summarize(records, prompts):
+    """
+    Returns:
+        list: Una riga per template con n, media e p95 di token e latenza e il profilo
+    """
+    by_template = {}
+    for record in records:
+        by_template.setdefault(record["template"], []).append(record)
+
+    rows = []
+    for template in sorted(set(by_template) | set(prompts), key=str):
+        entries = by_template.get(template, [])
+        tokens = [r["completion_tokens"] for r in entries if r["completion_tokens"] is not None]
+        latency = [r["latency"] for r in entries]
+        prompt_data = prompts.get(template, {})
+        model, params = generation_profile(prompt_data)
+        rows.append({
+            "template": template,
+            "title": prompt_data.get("title", ""),
+            "n": len(entries),
+            "tokens_mean": _mean(tokens),
+            "tokens_p95": _percentile(tokens, 0.95),
+            "latency_mean": _mean(latency),
+            "latency_p95": _percentile(latency, 0.95),
+            "profile": json.dumps(dict(params, model=model), sort_keys=True),
+        })
+    return rows
+
+
+def print_report(rows):
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else "-"
+
+    print(f"{'template':10s} {'titolo':10s} {'n':>6s} {'token μ':>8s} {'token p95':>9s} "
+          f"{'lat. μ s':>9s} {'lat. p95 s':>10s}  profilo")
+    for row in rows:
+        print(f"{row['template']:10s} {row['title']:10s} {row['n']:6d} {fmt(row['tokens_mean'], '8.1f')} "
+              f"{fmt(row['tokens_p95'], '>9')} {fmt(row['latency_mean'], '9.2f')} "
+              f"{fmt(row['latency_p95'], '10.2f')}  {row['profile']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Token in uscita e latenza per template di prompt.")
+    parser.add_argument("--prompts", default="prompts.json")
+    parser.add_argument("--from", dest="source", help="Risultati di batch_eval.py invece dell'archivio locale")
+    parser.add_argument("--since-hours", type=float, help="Solo le risposte recenti (archivio locale)")
+    parser.add_argument("--mode", choices=("greeting", "turn", "final_chat"), help="Solo saluti, turni o chat finale")
+    args = parser.parse_args()
+
+    with open(args.prompts, "r", encoding="utf-8") as f:
+        prompts = json.load(f)
+    if args.source:
+        if not os.path.exists(args.source):
+            parser.error(f"file non trovato: {args.source}")
+        records = load_eval_results(args.source)
+    else:
+        records = load_records(since_hours=args.since_hours)
+    if args.mode:
+        records = [r for r in records if r["mode"] == args.mode]
+    print_report(summarize(records, prompts))
+
+
+if __name__ == "__main__":
+    main()
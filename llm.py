@@ -0,0 +1,256 @@
+import asyncio
+import hashlib
+import inspect
+import json
+import os
+import random
+import time
+
+from metrics import LLM_ERRORS, LLM_REQUEST_SECONDS, LLM_TOKENS
+
+
+# ============================================================================
+# PERCORSO DI CHAT COMPLETION CONDIVISO
+# ============================================================================
+# Costruzione del system prompt e chiamata al modello, usati dall'app dello
+# studio e dagli strumenti offline (replay, valutazioni in batch) così che
+# questi ultimi riproducano esattamente le richieste fatte ai partecipanti.
+CHAT_MODEL = "gpt-3.5-turbo"
+
+# Turno utente fittizio che apre la conversazione
+GREETING_TURN = "Start the discussion"
+
+# Chiavi ammesse nel profilo di generazione di una voce di prompts.json:
+#   "generation": {"model": "...", "max_tokens": 300, "temperature": 0.7, "stop": ["..."]}
+# Nessun template ha un profilo predefinito: una risposta che raggiunge
+# max_tokens viene troncata (finish_reason "length") senza che le app la
+# completino o la segnalino.
+GENERATION_KEYS = ("model", "max_tokens", "temperature", "top_p", "stop", "presence_penalty", "frequency_penalty")
+
+
+def build_system_prompt(prompt_data, norm_title, initial_opinion=None):
+    """
+    System prompt di una condizione.
+
+    Args:
+        prompt_data (dict): Voce di prompts.json
+        norm_title (str): Titolo della norma ({NORM_DESCRIPTION})
+        initial_opinion (int): Opinione iniziale ({INITIAL_OPINION}); se
+            None il segnaposto resta invariato, come in m.py e pilot_study.py
+
+    Returns:
+        str: System prompt
+    """
+    template = prompt_data.get("system_prompt_template", prompt_data.get("system_prompt", ""))
+    system_prompt = template.replace("{NORM_DESCRIPTION}", norm_title)
+    if initial_opinion is not None:
+        system_prompt = system_prompt.replace("{INITIAL_OPINION}", str(initial_opinion))
+    return system_prompt
+
+
+def generation_profile(prompt_data, default_model=CHAT_MODEL):
+    """
+    Modello e parametri dell'API per una voce di prompts.json.
+
+    Returns:
+        tuple: (modello, dict di parametri); senza profilo (default_model, {})
+
+    Raises:
+        ValueError: Se il profilo contiene chiavi non supportate
+    """
+    profile = dict(prompt_data.get("generation") or {})
+    unknown = set(profile) - set(GENERATION_KEYS)
+    if unknown:
+        raise ValueError(f"Parametri di generazione non supportati: {sorted(unknown)}")
+    return profile.pop("model", default_model), profile
+
+
+def api_messages(system_prompt, messages):
+    """Messaggi per l'API: system prompt + solo ruolo e contenuto della conversazione."""
+    return [{"role": "system", "content": system_prompt}] + [
+        {"role": m["role"], "content": m["content"]} for m in messages
+    ]
+
+
+def greeting_messages(system_prompt, greeting_turn=GREETING_TURN):
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": greeting_turn},
+    ]
+
+
+def request_key(model, messages, params=None):
+    """Hash di (modello, messaggi, parametri): stessa richiesta, stessa chiave."""
+    payload = json.dumps([model, messages, params or {}], ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Completion:
+    """Risposta non in streaming con latenza e token usati."""
+
+    __slots__ = ("text", "latency", "prompt_tokens", "completion_tokens")
+
+    def __init__(self, text, latency, prompt_tokens=None, completion_tokens=None):
+        self.text = text
+        self.latency = latency
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+    def to_dict(self):
+        return {
+            "text": self.text,
+            "latency": self.latency,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+
+def _to_completion(response, model, latency):
+    usage = getattr(response, "usage", None)
+    LLM_REQUEST_SECONDS.observe(model, "complete", value=latency)
+    if usage is not None:
+        LLM_TOKENS.inc(model, "prompt", amount=usage.prompt_tokens or 0)
+        LLM_TOKENS.inc(model, "completion", amount=usage.completion_tokens or 0)
+    return Completion(
+        response.choices[0].message.content,
+        latency,
+        getattr(usage, "prompt_tokens", None),
+        getattr(usage, "completion_tokens", None),
+    )
+
+
+def complete(client, messages, model=CHAT_MODEL, **params):
+    """
+    Chat completion non in streaming.
+
+    Args:
+        client: OpenAI (o MockOpenAI)
+        messages (list): Messaggi già nel formato dell'API
+        model (str): Modello
+        **params: Altri parametri dell'API (temperature, max_tokens, ...)
+
+    Returns:
+        Completion: Testo, latenza in secondi e token
+    """
+    start = time.perf_counter()
+    try:
+        response = client.chat.completions.create(model=model, messages=messages, stream=False, **params)
+    except Exception:
+        LLM_ERRORS.inc(model)
+        raise
+    return _to_completion(response, model, time.perf_counter() - start)
+
+
+async def acomplete(client, messages, model=CHAT_MODEL, **params):
+    """
+    Come complete(), per asyncio.
+
+    Con openai.AsyncOpenAI la chiamata viene attesa direttamente; con un
+    client sincrono (OpenAI, MockOpenAI) gira in un thread.
+    """
+    create = client.chat.completions.create
+    if not inspect.iscoroutinefunction(create):
+        return await asyncio.to_thread(complete, client, messages, model, **params)
+
+    start = time.perf_counter()
+    try:
+        response = await create(model=model, messages=messages, stream=False, **params)
+    except Exception:
+        LLM_ERRORS.inc(model)
+        raise
+    return _to_completion(response, model, time.perf_counter() - start)
+
+
+def stream_chat(client, messages, model=CHAT_MODEL, stats=None, **params):
+    """
+    Chat completion in streaming (per st.write_stream): produce il testo a pezzi.
+
+    Durata e token vengono registrati quando lo stream è stato consumato tutto.
+
+    Args:
+        stats (dict): Se indicato, a fine stream riceve latency e
+            completion_tokens (dall'uso riportato dall'API, altrimenti il
+            numero di pezzi ricevuti)
+    """
+    start = time.perf_counter()
+    usage = None
+    chunks = 0
+    try:
+        stream = client.chat.completions.create(
+            model=model, messages=messages, stream=True, stream_options={"include_usage": True}, **params
+        )
+        for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                chunks += 1
+                yield chunk.choices[0].delta.content
+    except Exception:
+        LLM_ERRORS.inc(model)
+        raise
+    latency = time.perf_counter() - start
+    LLM_REQUEST_SECONDS.observe(model, "stream", value=latency)
+    completion_tokens = chunks
+    if usage is not None:
+        LLM_TOKENS.inc(model, "prompt", amount=usage.prompt_tokens or 0)
+        LLM_TOKENS.inc(model, "completion", amount=usage.completion_tokens or 0)
+        completion_tokens = usage.completion_tokens
+    if stats is not None:
+        stats.update(latency=latency, completion_tokens=completion_tokens)
+
+
+# ============================================================================
+# CLIENT FINTO PER PROVE LOCALI
+# ============================================================================
+# Stessa interfaccia di client.chat.completions.create (anche con stream=True).
+# La risposta dipende solo dai messaggi, quindi è riproducibile; la latenza
+# simulata si regola con MOCK_OPENAI_LATENCY (secondi, default 0).
+_MOCK_WORDS = [
+    "that", "is", "an", "interesting", "point", "and", "I", "wonder", "how", "the",
+    "setting", "shapes", "what", "feels", "comfortable", "for", "you", "when", "you", "think",
+    "about", "places", "like", "parks", "or", "libraries", "what", "comes", "to", "mind",
+]
+
+
+class _Obj:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def _approx_tokens(text):
+    return max(1, round(len(text.split()) * 1.3))
+
+
+class _MockCompletions:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def create(self, model, messages, stream=False, **params):
+        digest = hashlib.sha256(repr((model, messages)).encode("utf-8")).digest()
+        rng = random.Random(digest)
+        n_words = rng.randint(40, 200)
+        if params.get("max_tokens"):
+            n_words = max(1, min(n_words, int(params["max_tokens"] / 1.3)))
+        text = " ".join(rng.choice(_MOCK_WORDS) for _ in range(n_words)).capitalize() + "?"
+        if self.latency:
+            time.sleep(self.latency * (0.5 + rng.random()))
+
+        usage = _Obj(
+            prompt_tokens=sum(_approx_tokens(m["content"]) for m in messages),
+            completion_tokens=_approx_tokens(text),
+        )
+        if stream:
+            chunks = [_Obj(choices=[_Obj(delta=_Obj(content=word + " "))], usage=None) for word in text.split(" ")]
+            if (params.get("stream_options") or {}).get("include_usage"):
+                # Come l'API: un ultimo pezzo senza choices con l'uso dei token
+                chunks.append(_Obj(choices=[], usage=usage))
+            return iter(chunks)
+        return _Obj(choices=[_Obj(message=_Obj(role="assistant", content=text))], usage=usage, model=model)
+
+
+class MockOpenAI:
+    """Sostituto locale di openai.OpenAI per replay, benchmark e demo senza rete."""
+
+    def __init__(self, latency=None):
+        latency = float(os.environ.get("MOCK_OPENAI_LATENCY", 0)) if latency is None else latency
+        self.chat = _Obj(completions=_MockCompletions(latency))
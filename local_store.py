@@ -0,0 +1,159 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+
+# ============================================================================
+# ARCHIVIO LOCALE (SQLITE) CONDIVISO DALLE APP
+# ============================================================================
+# Piccolo key-value store su SQLite, diviso in namespace, usato per tenere
+# fuori dalla memoria del processo i dati che non servono ad ogni rerun.
+# Un solo file per server, modalità WAL: letture concorrenti e scritture
+# brevi senza bloccare le sessioni attive.
+DEFAULT_STORE_PATH = os.environ.get(
+    "STUDY_LOCAL_STORE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "local_store.sqlite3")
+)
+
+
+class LocalStore:
+    """
+    Key-value store persistente con namespace.
+
+    I valori vengono serializzati con pickle: il file è locale al server e
+    contiene solo dati prodotti dalle app stesse.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS kv (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value BLOB NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+            """
+        )
+
+    def put(self, namespace, key, value):
+        """Salva (o sovrascrive) un valore."""
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO kv (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, blob, time.time())
+            )
+
+    def update(self, namespace, key, mutate, initial=dict):
+        """
+        Legge, modifica e riscrive un valore in un'unica transazione
+        (BEGIN IMMEDIATE): gli aggiornamenti concorrenti, anche di processi
+        diversi sullo stesso file, vengono serializzati e nessuno va perso.
+
+        Args:
+            mutate (callable): Modifica sul posto il valore attuale
+            initial (callable): Valore di partenza se la chiave è assente
+
+        Returns:
+            Il valore aggiornato
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT value FROM kv WHERE namespace = ? AND key = ?",
+                    (namespace, key)
+                ).fetchone()
+                value = pickle.loads(row[0]) if row else initial()
+                mutate(value)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO kv (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                    (namespace, key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), time.time())
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return value
+
+    def get(self, namespace, key, default=None):
+        """Legge un valore, oppure default se assente."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE namespace = ? AND key = ?",
+                (namespace, key)
+            ).fetchone()
+        return pickle.loads(row[0]) if row else default
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM kv WHERE namespace = ? AND key = ?",
+                (namespace, key)
+            )
+
+    def pop(self, namespace, key, default=None):
+        """Legge e rimuove un valore."""
+        value = self.get(namespace, key, default)
+        self.delete(namespace, key)
+        return value
+
+    def keys(self, namespace):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key FROM kv WHERE namespace = ? ORDER BY key",
+                (namespace,)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def items(self, namespace):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value FROM kv WHERE namespace = ? ORDER BY key",
+                (namespace,)
+            ).fetchall()
+        return [(k, pickle.loads(v)) for k, v in rows]
+
+    def purge_older_than(self, namespace, max_age_seconds):
+        """Elimina le voci non aggiornate da più di max_age_seconds."""
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM kv WHERE namespace = ? AND updated_at < ?",
+                (namespace, time.time() - max_age_seconds)
+            )
+        return cur.rowcount
+
+    def trim(self, namespace, max_entries):
+        """Tiene solo le max_entries voci aggiornate più di recente."""
+        with self._lock:
+            cur = self._conn.execute(
+                """
+                DELETE FROM kv WHERE namespace = ? AND key NOT IN (
+                    SELECT key FROM kv WHERE namespace = ? ORDER BY updated_at DESC LIMIT ?
+                )
+                """,
+                (namespace, namespace, max_entries)
+            )
+        return cur.rowcount
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Istanza condivisa di LocalStore per tutto il processo."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = LocalStore()
+        return _store
@@ -1,14 +1,27 @@
 import streamlit as st
-import gspread
-from google.oauth2.service_account import Credentials
 from datetime import datetime
-from openai import OpenAI
 import json
+import logging
 import os
 import time
 import random
 from collections import defaultdict
 
+from theme import apply_theme
+from catalogs import load_catalog
+from study_logging import get_logger
+from metrics import start_metrics_server, record_rerun, STUDY_SAVES
+from llm import greeting_messages, generation_profile, stream_chat
+from generation_report import record_generation
+from study_progress import record_completion, record_progress
+from completion_cache import get_completion_cache
+from results import results_view
+from session_codec import encode_row, ensure_header
+from sheets_scheduler import PRIORITY_DIAGNOSTIC
+from clients import get_sheet, get_openai_client, start_warmup, study_secret
+
+log = get_logger("m")
+
 # Page configuration
 st.set_page_config(
     page_title="Everyday Norm Experiment",
@@ -18,195 +31,7 @@ st.set_page_config(
 )
 
 # Custom CSS for elegant design
-st.markdown("""
-<style>
-    * {
-        font-family: 'Segoe UI', Trebuchet MS, sans-serif;
-    }
-    
-    html, body, [data-testid="stAppViewContainer"] {
-        background: linear-gradient(135deg, #f5f7fa 0%, #f8f9fb 100%);
-    }
-    
-    [data-testid="stMainBlockContainer"] {
-        padding: 2rem 3rem;
-    }
-    
-    [data-testid="stForm"] {
-        background: white;
-        padding: 2.5rem;
-        border-radius: 12px;
-        box-shadow: 0 2px 8px rgba(0, 0, 0, 0.06);
-        border: 1px solid #e5e7eb;
-    }
-    
-    [data-testid="stForm"] label {
-        font-weight: 500;
-        color: #333;
-        font-size: 0.95rem;
-        margin-bottom: 0.5rem;
-    }
-    
-    [data-testid="stTextInput"] input {
-        border: 1.5px solid #e5e7eb !important;
-        border-radius: 8px !important;
-        padding: 0.75rem 1rem !important;
-        font-size: 0.95rem !important;
-        transition: all 0.3s ease;
-    }
-    
-    [data-testid="stTextInput"] input:focus {
-        border-color: #003d82 !important;
-        box-shadow: 0 0 0 3px rgba(0, 61, 130, 0.1) !important;
-    }
-    
-    button[kind="primary"] {
-        background: linear-gradient(135deg, #003d82 0%, #004a9e 100%);
-        color: white !important;
-        border: none !important;
-        padding: 0.75rem 2rem !important;
-        border-radius: 8px !important;
-        font-weight: 600 !important;
-        font-size: 0.95rem !important;
-        transition: all 0.3s ease;
-        margin-top: 1.5rem;
-    }
-    
-    button[kind="primary"]:hover {
-        box-shadow: 0 4px 12px rgba(0, 61, 130, 0.3);
-        transform: translateY(-1px);
-    }
-    
-    button[kind="secondary"] {
-        background: #ffffff !important;
-        color: #4b5563 !important;
-        border: 1px solid #d1d5db !important;
-        padding: 0.6rem 1.25rem !important;
-        border-radius: 6px !important;
-        font-weight: 500 !important;
-        font-size: 0.875rem !important;
-        transition: all 0.2s ease;
-    }
-    
-    button[kind="secondary"]:hover {
-        background: #f9fafb !important;
-        border-color: #9ca3af !important;
-    }
-    
-    .success-badge {
-        background: #f0fdf4;
-        color: #166534;
-        padding: 1rem 1.5rem;
-        border-radius: 8px;
-        border-left: 4px solid #22c55e;
-        margin-bottom: 2rem;
-        font-weight: 500;
-    }
-    
-    [data-testid="chatAvatarIcon-assistant"], [data-testid="chatAvatarIcon-user"] {
-        display: none !important;
-    }
-    
-    [role="presentation"] [data-testid="stChatMessage"] {
-        background: transparent !important;
-        padding: 1rem 0 !important;
-    }
-    
-    [data-testid="stChatMessageContent"] {
-        background: white;
-        padding: 1.25rem 1.5rem;
-        border-radius: 10px;
-        border: 1px solid #e5e7eb;
-        line-height: 1.6;
-        color: #333;
-        font-size: 0.95rem;
-    }
-    
-    [data-testid="stChatMessage"]:has([data-testid="stChatMessageContent"] p) > div:first-child {
-        margin-right: auto;
-        max-width: 85%;
-    }
-    
-    [data-testid="stChatMessage"]:last-child [data-testid="stChatMessageContent"] {
-        background: linear-gradient(135deg, #f3f4f6 0%, #ffffff 100%);
-    }
-    
-    [data-testid="stChatInputTextArea"] textarea {
-        border: 1.5px solid #e5e7eb !important;
-        border-radius: 8px !important;
-        padding: 1rem !important;
-        font-size: 0.95rem !important;
-    }
-    
-    [data-testid="stChatInputTextArea"] textarea:focus {
-        border-color: #003d82 !important;
-        box-shadow: 0 0 0 3px rgba(0, 61, 130, 0.1) !important;
-    }
-    
-    .chat-container {
-        background: white;
-        border-radius: 12px;
-        padding: 2rem;
-        border: 1px solid #e5e7eb;
-        box-shadow: 0 2px 8px rgba(0, 0, 0, 0.04);
-    }
-    
-    hr {
-        border: none;
-        border-top: 1px solid #e5e7eb;
-        margin: 2rem 0;
-    }
-    
-    .error {
-        background: #fef2f2;
-        color: #991b1b;
-        padding: 1rem 1.5rem;
-        border-radius: 8px;
-        border-left: 4px solid #ef4444;
-        font-size: 0.95rem;
-    }
-    
-    .warning {
-        background: #fffbeb;
-        color: #92400e;
-        padding: 1rem 1.5rem;
-        border-radius: 8px;
-        border-left: 4px solid #f59e0b;
-        font-size: 0.95rem;
-    }
-    
-    .info-text {
-        color: #666;
-        font-size: 0.9rem;
-        margin-top: 1rem;
-    }
-    
-    .opinion-container {
-        background: white;
-        padding: 2.5rem;
-        border-radius: 12px;
-        box-shadow: 0 2px 8px rgba(0, 0, 0, 0.06);
-        border: 1px solid #e5e7eb;
-        margin-bottom: 2rem;
-    }
-    
-    .timestamp {
-        font-size: 0.8rem;
-        color: #999;
-        margin-top: 0.5rem;
-    }
-    
-    .message-counter {
-        background: #f3f4f6;
-        color: #6b7280;
-        padding: 0.5rem 1rem;
-        border-radius: 6px;
-        font-size: 0.85rem;
-        text-align: center;
-        margin-bottom: 1rem;
-    }
-</style>
-""", unsafe_allow_html=True)
+apply_theme("m.css")
 
 
 # ============================================================================
@@ -221,9 +46,8 @@ def load_json_from_file(file_path, item_name="items"):
             st.error(f"❌ File {file_path} non trovato")
             return {}
         
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return data
+        # Cache condivisa dal processo (anche tra studi diversi)
+        return load_catalog(file_path)
     
     except json.JSONDecodeError as e:
         st.error(f"❌ Errore nel parsing del JSON {file_path}: {str(e)}")
@@ -240,19 +64,12 @@ NORMS = load_json_from_file("norms.json", "norms")
 # ============================================================================
 # VERIFICA PROLIFIC ID
 # ============================================================================
-def check_prolific_id_exists(sheet, prolific_id):
+def check_prolific_id_exists(prolific_id):
     """
     Verifica se un Prolific ID esiste già nel Google Sheet.
     """
     try:
-        all_values = sheet.col_values(1)
-        
-        if len(all_values) > 1:
-            existing_ids = all_values[1:]
-        else:
-            existing_ids = []
-        
-        return prolific_id.strip().lower() in [id.strip().lower() for id in existing_ids]
+        return results_view(get_sheet()).has_prolific_id(prolific_id)
     
     except Exception as e:
         st.error(f"❌ Errore nella verifica del Prolific ID: {str(e)}")
@@ -262,14 +79,13 @@ def check_prolific_id_exists(sheet, prolific_id):
 # ============================================================================
 # ANALISI FREQUENZE COMBINAZIONI PROMPT-NORM
 # ============================================================================
-def get_least_used_combination(sheet, prompts_dict, norms_dict):
+def get_least_used_combination(prompts_dict, norms_dict):
     """
     Analizza il Google Sheet e trova la combinazione Prompt-Norm meno utilizzata.
     """
     try:
-        all_data = sheet.get_all_values()
-        print(f"📊 Totale righe nel Google Sheet: {len(all_data)}")
-        
+        # Solo le colonne B-C (prompt, norma), righe nuove dall'ultima lettura
+        columns = results_view(get_sheet()).fetch("prompt_key", "norm_key")
         combination_counts = defaultdict(int)
         
         # Crea tutte le possibili combinazioni
@@ -277,21 +93,10 @@ def get_least_used_combination(sheet, prompts_dict, norms_dict):
             for norm_key in norms_dict.keys():
                 combination_counts[(prompt_key, norm_key)] = 0
         
-        print(f"🔢 Totale combinazioni possibili: {len(combination_counts)}")
-        
         # Conta le combinazioni esistenti nel Google Sheet
-        if len(all_data) > 1:
-            for row in all_data[1:]:
-                if len(row) >= 3:
-                    prompt_key = row[1]
-                    norm_key = row[2]
-                    
-                    if prompt_key in prompts_dict and norm_key in norms_dict:
-                        combination_counts[(prompt_key, norm_key)] += 1
-        
-        print(f"📈 Frequenze combinazioni:")
-        for combo, count in sorted(combination_counts.items(), key=lambda x: x[1]):
-            print(f"   {combo}: {count} volte")
+        for prompt_key, norm_key in zip(columns["prompt_key"], columns["norm_key"]):
+            if prompt_key in prompts_dict and norm_key in norms_dict:
+                combination_counts[(prompt_key, norm_key)] += 1
         
         # Trova la combinazione con la frequenza minima
         min_count = min(combination_counts.values())
@@ -300,17 +105,26 @@ def get_least_used_combination(sheet, prompts_dict, norms_dict):
             if count == min_count
         ]
         
-        print(f"🎯 Frequenza minima: {min_count}")
-        print(f"🎲 Combinazioni con frequenza minima ({len(least_used_combinations)}): {least_used_combinations}")
-        
         selected_combination = random.choice(least_used_combinations)
         
-        print(f"✅ Combinazione selezionata: {selected_combination}")
+        # Un solo record per assegnazione; le frequenze complete solo a livello DEBUG
+        log.info("combination_assigned", extra={"fields": {
+            "rows": len(columns["prompt_key"]),
+            "combinations": len(combination_counts),
+            "min_count": min_count,
+            "least_used": len(least_used_combinations),
+            "prompt_key": selected_combination[0],
+            "norm_key": selected_combination[1],
+        }})
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("combination_counts", extra={"fields": {
+                "counts": {f"{p}|{n}": c for (p, n), c in combination_counts.items()}
+            }})
         
         return selected_combination
     
     except Exception as e:
-        print(f"❌ ERRORE nell'analisi delle frequenze: {str(e)}")
+        log.exception("combination_assignment_failed")
         st.error(f"❌ Errore nell'analisi delle frequenze: {str(e)}")
         return (list(prompts_dict.keys())[0], list(norms_dict.keys())[0])
 
@@ -318,44 +132,47 @@ def get_least_used_combination(sheet, prompts_dict, norms_dict):
 # ============================================================================
 # SALVATAGGIO SU GOOGLE SHEETS - VERSIONE CORRETTA
 # ============================================================================
-def save_to_google_sheets(sheet, user_info, prompt_key, norm_key, messages, 
+def save_to_google_sheets(user_info, prompt_key, norm_key, messages, 
                           initial_opinion=None, final_opinion=None):
     """
-    Salva i dati su Google Sheets.
-    CORREZIONE: Gestisce correttamente i valori None e converte tutto in stringe.
+    Salva i dati su Google Sheets nel layout "m" di session_codec
+    (i valori None diventano celle vuote).
     """
     try:
-        # Converti la conversazione in JSON
-        conversation_json = json.dumps(messages, ensure_ascii=False, indent=2)
-        
-        # Prepara i dati assicurandosi che siano tutti stringhe
-        row_data = [
-            str(user_info.get("prolific_id", "")),
-            str(prompt_key),
-            str(norm_key),
-            str(initial_opinion) if initial_opinion is not None else "",
-            conversation_json,
-            str(final_opinion) if final_opinion is not None else "",
-            datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        ]
+        row_data = encode_row("m", {
+            "prolific_id": user_info.get("prolific_id", ""),
+            "prompt_key": prompt_key,
+            "norm_key": norm_key,
+            "initial_opinion": initial_opinion,
+            "conversation": messages,
+            "final_opinion": final_opinion,
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        })
+        # Il foglio si apre qui al primo uso (il warmup di solito l'ha già fatto)
+        sheet = get_sheet()
+        ensure_header(sheet, "m")
         
         # Append row with retry logic
         max_retries = 3
         for attempt in range(max_retries):
             try:
                 sheet.append_row(row_data, value_input_option='RAW')
-                return True
+                break
             except Exception as e:
                 if attempt < max_retries - 1:
                     time.sleep(2)
                 else:
                     raise e
-        
-        return False
-        
+
     except Exception as e:
+        STUDY_SAVES.inc("m", "failure")
         return False
 
+    # Solo dopo un append riuscito
+    STUDY_SAVES.inc("m", "success")
+    record_completion("m", user_info.get("prolific_id", ""), prompt_key, norm_key)
+    return True
+
 
 # ============================================================================
 # MAIN APP
@@ -364,29 +181,25 @@ def save_to_google_sheets(sheet, user_info, prompt_key, norm_key, messages,
 try:
     # Load credentials and URL from secrets.toml
     creds_dict = st.secrets["gcp_service_account"]
-    sheet_url = st.secrets["google_sheet_url"]
-    openai_api_key = st.secrets["openai_api_key"]
-    
-    # Configure credentials with correct scopes
-    scopes = [
-        'https://www.googleapis.com/auth/spreadsheets',
-        'https://www.googleapis.com/auth/drive'
-    ]
-    creds = Credentials.from_service_account_info(creds_dict, scopes=scopes)
-    client_sheets = gspread.authorize(creds)
-    
-    # Open the sheet
-    spreadsheet = client_sheets.open_by_url(sheet_url)
-    sheet = spreadsheet.sheet1
-    
-    # VERIFICA: Controlla se il foglio è accessibile
-    try:
-        headers = sheet.row_values(1)
-        st.sidebar.success(f"✅ Connesso a Google Sheets")
-        st.sidebar.info(f"Headers: {headers}")
-    except Exception as e:
-        st.sidebar.error(f"❌ Errore accesso sheet: {e}")
-    
+    sheet_url = study_secret("google_sheet_url")
+    openai_api_key = study_secret("openai_api_key")
+
+    # Client gspread/OpenAI importati e autorizzati una volta per processo
+    # (in background dall'avvio), non a ogni rerun
+    start_warmup()
+
+    # Diagnostica del foglio solo con ?debug_sheet=1 (è una lettura in più)
+    if st.query_params.get("debug_sheet") == "1":
+        try:
+            headers = get_sheet(sheet_url).row_values(1, priority=PRIORITY_DIAGNOSTIC)
+            st.sidebar.success("✅ Connesso a Google Sheets")
+            st.sidebar.info(f"Headers: {headers}")
+        except Exception as e:
+            st.sidebar.error(f"❌ Errore accesso sheet: {e}")
+
+    # Metriche (server avviato una volta per processo)
+    start_metrics_server()
+
     # Initialize session state
     if "user_data_collected" not in st.session_state:
         st.session_state.user_data_collected = False
@@ -412,6 +225,24 @@ try:
         st.session_state.final_opinion_collected = False
     if "data_saved" not in st.session_state:
         st.session_state.data_saved = False
+
+    # Fase corrente (numeri dei commenti PHASE N) per metriche e dashboard
+    if not st.session_state.user_data_collected:
+        phase = 1
+    elif not st.session_state.initial_opinion_collected:
+        phase = 2
+    elif not st.session_state.conversation_ended:
+        phase = 3
+    elif not st.session_state.data_saved:
+        phase = 4
+    else:
+        phase = 5
+    record_rerun("m", st.session_state, phase=phase)
+    if st.session_state.user_data_collected:
+        record_progress(
+            "m", st.session_state, st.session_state.user_info["prolific_id"], phase=phase,
+            condition=(st.session_state.selected_prompt_key, st.session_state.selected_norm_key),
+        )
     
     # Verifica se i file sono stati caricati
     if not PROMPTS:
@@ -445,14 +276,14 @@ try:
             if submitted:
                 if not prolific_id:
                     st.markdown("<div class='error'>Please enter your Prolific ID to continue.</div>", unsafe_allow_html=True)
-                elif check_prolific_id_exists(sheet, prolific_id):
+                elif check_prolific_id_exists(prolific_id):
                     st.markdown("""
                     <div class='warning'>
                         ⚠️ <strong>This Prolific ID has already been used.</strong> Please enter a different ID.
                     </div>
                     """, unsafe_allow_html=True)
                 else:
-                    selected_prompt_key, selected_norm_key = get_least_used_combination(sheet, PROMPTS, NORMS)
+                    selected_prompt_key, selected_norm_key = get_least_used_combination(PROMPTS, NORMS)
                     
                     st.session_state.user_info = {
                         "prolific_id": prolific_id,
@@ -512,24 +343,25 @@ try:
         st.markdown("<hr>", unsafe_allow_html=True)
         
         # Create OpenAI client
-        openai_client = OpenAI(api_key=openai_api_key)
+        openai_client = get_openai_client(openai_api_key)
         
         # Get the system prompt template and inject the selected norm
         system_prompt_template = prompt_data.get("system_prompt_template", prompt_data.get("system_prompt", ""))
         system_prompt = system_prompt_template.replace("{NORM_DESCRIPTION}", norm_data["title"])
+        # Modello e parametri dal profilo "generation" del template (se presente)
+        model, generation_params = generation_profile(prompt_data)
         
         # Generate initial greeting if not yet sent
         if not st.session_state.greeting_sent:
-            greeting_response = openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": "Start the conversation"}
-                ],
-                stream=False,
+            # Cache dei saluti solo se abilitata con COMPLETION_CACHE
+            greeting = get_completion_cache().complete(
+                openai_client,
+                greeting_messages(system_prompt, "Start the conversation"),
+                model,
+                **generation_params,
             )
-            
-            initial_message = greeting_response.choices[0].message.content
+            record_generation(prompt_key, model, "greeting", greeting.latency, greeting.completion_tokens)
+            initial_message = greeting.text
             st.session_state.messages.append({
                 "role": "assistant",
                 "content": initial_message,
@@ -575,15 +407,13 @@ try:
                 for m in st.session_state.messages
             ]
             
-            stream = openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=messages_for_api,
-                stream=True,
-            )
+            stats = {}
+            stream = stream_chat(openai_client, messages_for_api, model, stats=stats, **generation_params)
             
             # Stream response
             with st.chat_message("assistant"):
                 response = st.write_stream(stream)
+            record_generation(prompt_key, model, "turn", stats["latency"], stats["completion_tokens"])
             
             response_timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             st.markdown(f"<div class='timestamp'>{response_timestamp}</div>", unsafe_allow_html=True)
@@ -621,7 +451,6 @@ try:
             
             # Salva su Google Sheets
             success = save_to_google_sheets(
-                sheet,
                 user_info,
                 st.session_state.selected_prompt_key,
                 st.session_state.selected_norm_key,
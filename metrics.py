@@ -0,0 +1,318 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from study_logging import get_logger
+
+log = get_logger("metrics")
+
+
+# ============================================================================
+# METRICHE DEL SERVER (FORMATO TESTO PROMETHEUS)
+# ============================================================================
+# Contatori, gauge e istogrammi con etichette, registrati in un registro di
+# processo ed esposti su un piccolo server HTTP locale:
+#   curl http://127.0.0.1:9464/metrics
+# Porta e indirizzo con METRICS_PORT / METRICS_HOST; METRICS_PORT=0 disattiva
+# il server (le metriche vengono comunque raccolte).
+#
+# Sul percorso caldo un aggiornamento costa un lookup in dict e un lock per
+# metrica; la formattazione del testo avviene solo quando qualcuno legge.
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 9464))
+
+# Secondi: dalle letture Sheets (decine di ms) alle risposte lunghe del modello
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.label_names):
+            raise ValueError(f"{self.name}: attese etichette {self.label_names}")
+        return tuple(str(v) for v in labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Valore che può solo crescere."""
+
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(self._key(labels), 0)
+
+    def collect(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(v)}" for key, v in items
+        ]
+
+
+class Gauge(_Metric):
+    """
+    Valore istantaneo. In alternativa a set(), `callback` viene chiamata a
+    ogni lettura e restituisce {tuple di etichette: valore}.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels=(), callback=None):
+        super().__init__(name, help_text, labels)
+        self.callback = callback
+
+    def set(self, *labels, value):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def collect(self):
+        if self.callback is not None:
+            try:
+                items = [(self._key(k if isinstance(k, tuple) else (k,)), v) for k, v in self.callback().items()]
+            except Exception:
+                items = []
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(v)}" for key, v in items
+        ]
+
+
+class Histogram(_Metric):
+    """Distribuzione in bucket cumulativi, con somma e conteggio."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, *labels, value):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, *labels):
+        """Context manager che osserva la durata del blocco."""
+        return _Timer(self, labels)
+
+    def collect(self):
+        with self._lock:
+            items = [(key, (list(counts), total, n)) for key, (counts, total, n) in self._values.items()]
+        lines = self.header()
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {n}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(*self.labels, value=time.perf_counter() - self.start)
+        return False
+
+
+class Registry:
+    """Metriche del processo, registrate per nome (una sola volta)."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text, labels=(), callback=None):
+        return self._register(Gauge, name, help_text, labels, callback=callback)
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, help_text, labels, buckets=buckets)
+
+    def render(self):
+        """Tutte le metriche nel formato testo di Prometheus."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+# ============================================================================
+# METRICHE COMUNI
+# ============================================================================
+# Definite qui così che tutti i moduli aggiornino le stesse serie.
+STUDY_RERUNS = REGISTRY.counter("study_reruns_total", "Rerun dello script per app e fase", ("app", "phase"))
+STUDY_PHASE_ENTERED = REGISTRY.counter("study_phase_entered_total", "Sessioni entrate in una fase", ("app", "phase"))
+STUDY_SAVES = REGISTRY.counter("study_saves_total", "Salvataggi dei risultati per esito", ("app", "outcome"))
+STUDY_PHASE_RERUNS = REGISTRY.histogram(
+    "study_phase_reruns", "Rerun di una sessione in una fase, osservati all'uscita dalla fase", ("app", "phase"),
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100)
+)
+
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "llm_request_seconds", "Durata delle chiamate al modello", ("model", "mode")
+)
+LLM_TOKENS = REGISTRY.counter("llm_tokens_total", "Token usati per tipo", ("model", "kind"))
+LLM_ERRORS = REGISTRY.counter("llm_errors_total", "Chiamate al modello fallite", ("model",))
+
+SHEETS_REQUESTS = REGISTRY.counter("sheets_requests_total", "Chiamate a Google Sheets", ("method", "kind"))
+SHEETS_REQUEST_SECONDS = REGISTRY.histogram(
+    "sheets_request_seconds", "Durata delle chiamate a Google Sheets (attesa in coda esclusa)", ("kind",)
+)
+SHEETS_THROTTLE_SECONDS = REGISTRY.counter(
+    "sheets_throttle_seconds_total", "Attesa per quota (token bucket e backoff dopo 429)", ("kind",)
+)
+SHEETS_RATE_LIMITED = REGISTRY.counter("sheets_rate_limited_total", "Risposte 429 da Google Sheets")
+SHEETS_ERRORS = REGISTRY.counter("sheets_errors_total", "Chiamate a Google Sheets fallite", ("method",))
+
+
+def record_rerun(app, state, phase=None):
+    """
+    Conta un rerun; se la sessione ha cambiato fase conta anche l'ingresso e
+    registra quanti rerun ha richiesto la fase precedente (confrontabile
+    prima/dopo una modifica della pagina).
+
+    Args:
+        app (str): Nome dell'app (etichetta)
+        state: st.session_state
+        phase: Fase corrente (default: state["phase"] se presente)
+    """
+    if phase is None:
+        phase = state.get("phase", "")
+    STUDY_RERUNS.inc(app, phase)
+    previous = state.get("_metrics_phase")
+    if previous != phase:
+        if previous is not None:
+            STUDY_PHASE_RERUNS.observe(app, previous, value=state.get("_metrics_phase_reruns", 0))
+        state["_metrics_phase"] = phase
+        state["_metrics_phase_reruns"] = 0
+        STUDY_PHASE_ENTERED.inc(app, phase)
+    state["_metrics_phase_reruns"] = state.get("_metrics_phase_reruns", 0) + 1
+
+
+# ============================================================================
+# ENDPOINT HTTP
+# ============================================================================
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Niente righe di log per ogni scrape
+        pass
+
+
+# Porta occupata (es. un secondo processo sulla stessa macchina): non si
+# riprova a ogni rerun
+_DISABLED = object()
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """
+    Avvia (una volta per processo) il server HTTP delle metriche.
+
+    Returns:
+        ThreadingHTTPServer | None: None se disattivato o porta occupata
+    """
+    global _server
+    with _server_lock:
+        if _server is None and port:
+            try:
+                _server = ThreadingHTTPServer((host, port), _Handler)
+            except OSError as e:
+                _server = _DISABLED
+                log.warning("metrics_server_disabled", extra={"fields": {
+                    "host": host, "port": port, "error": str(e),
+                }})
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        return None if _server is _DISABLED else _server
@@ -0,0 +1,333 @@
+import argparse
+import csv
+import hashlib
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+
+from local_store import LocalStore, get_store
+from metrics import REGISTRY
+from study_logging import get_logger
+
+
+# ============================================================================
+# RISPOSTE QUASI IDENTICHE (MINHASH + LSH)
+# ============================================================================
+# Il testo libero della fase 1 (engagement_text) e i messaggi dei
+# partecipanti in chat sono la difesa principale contro bot e copia-incolla.
+# Confrontare ogni risposta con tutte le altre costa O(n) a risposta; qui
+# ogni testo diventa una firma MinHash (NUM_PERM minimi di hash dei suoi
+# shingle di SHINGLE_CHARS caratteri) divisa in BANDS bande: due testi
+# finiscono nello stesso bucket di almeno una banda con probabilità alta
+# sopra la soglia di somiglianza (~0.7 con 16 × 8) e bassa sotto. Per ogni
+# risposta nuova si confrontano solo le firme dei bucket in comune.
+#
+# Firme, bucket e coppie trovate stanno in local_store, per campo:
+#   minhash:<campo>   id -> (gruppo, firma)
+#   lsh:<campo>       "<banda>:<digest>" -> id nel bucket
+#   dupes:<campo>     id -> [(id simile, somiglianza stimata)]
+# Il gruppo è il Prolific ID: i messaggi di uno stesso partecipante non
+# vengono confrontati tra loro.
+#
+# Le app chiamano screen_response() (fase 1 e ogni messaggio in chat);
+# in batch, su un export del foglio:
+#   python near_duplicates.py --csv results.csv --field engagement_text
+#   python near_duplicates.py --csv results.csv --field chat --threshold 0.8
+#   python near_duplicates.py --csv results.csv --field chat --transcripts-url URL --credentials sa.json
+#   python near_duplicates.py --field chat          # coppie già trovate dalle app
+NUM_PERM = 128
+BANDS = 16
+SHINGLE_CHARS = 5
+THRESHOLD = float(os.environ.get("NEAR_DUPLICATE_THRESHOLD", 0.7))
+# Testi più corti non vengono indicizzati ("yes", "I agree", ...)
+MIN_CHARS = 40
+# Un bucket molto affollato (frase di rito) non deve rendere lineare la ricerca
+MAX_BUCKET = 200
+SEED = 20240601
+FIELDS = ("engagement_text", "chat")
+
+# Primo di Mersenne 2^31 - 1: (a * h + b) resta sotto 2^63 in uint64
+_PRIME = np.uint64((1 << 31) - 1)
+
+log = get_logger("near_duplicates")
+
+NEAR_DUPLICATES = REGISTRY.counter(
+    "near_duplicate_responses_total", "Risposte quasi identiche a quelle di altri partecipanti", ("field",)
+)
+
+_WORD_RE = re.compile(r"[^\w\s]+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize(text):
+    """Minuscolo, senza punteggiatura, spazi compattati."""
+    return _SPACE_RE.sub(" ", _WORD_RE.sub(" ", text.lower())).strip()
+
+
+class MinHasher:
+    """Firme MinHash con NUM_PERM permutazioni universali (a * h + b) mod p."""
+
+    def __init__(self, num_perm=NUM_PERM, shingle_chars=SHINGLE_CHARS, seed=SEED):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_chars = shingle_chars
+        self.a = rng.integers(1, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, int(_PRIME), size=num_perm, dtype=np.uint64)
+
+    def shingles(self, text):
+        """Hash (mod p) degli shingle di caratteri del testo normalizzato."""
+        text = normalize(text)
+        if len(text) < MIN_CHARS:
+            return None
+        k = self.shingle_chars
+        hashes = {zlib.crc32(text[i:i + k].encode("utf-8")) for i in range(len(text) - k + 1)}
+        return np.fromiter(hashes, dtype=np.uint64, count=len(hashes)) % _PRIME
+
+    def signature(self, text):
+        """
+        Returns:
+            np.ndarray | None: uint32, shape (num_perm,); None se il testo è troppo corto
+        """
+        hashes = self.shingles(text)
+        if hashes is None:
+            return None
+        # (num_perm, shingle) -> minimo per permutazione
+        return ((self.a[:, None] * hashes[None, :] + self.b[:, None]) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+def similarity(sig_a, sig_b):
+    """Stima della somiglianza di Jaccard tra due firme."""
+    return float(np.mean(sig_a == sig_b))
+
+
+class LSHIndex:
+    """
+    Indice LSH incrementale di un campo, persistente in local_store.
+
+    Args:
+        field (str): Campo indicizzato ("engagement_text", "chat", ...)
+        store (LocalStore): Archivio (default: quello condiviso del processo)
+        threshold (float): Somiglianza minima per segnalare una coppia
+    """
+
+    def __init__(self, field, store=None, threshold=THRESHOLD, hasher=None, bands=BANDS):
+        self.field = field
+        self.store = store or get_store()
+        self.threshold = threshold
+        self.hasher = hasher or MinHasher()
+        if self.hasher.num_perm % bands:
+            raise ValueError(f"num_perm ({self.hasher.num_perm}) non è multiplo di bands ({bands})")
+        self.bands = bands
+        self.rows = self.hasher.num_perm // bands
+        self.signatures_ns = f"minhash:{field}"
+        self.buckets_ns = f"lsh:{field}"
+        self.dupes_ns = f"dupes:{field}"
+        self._lock = threading.Lock()
+
+    def _bucket_keys(self, sig):
+        return [
+            f"{band}:{hashlib.blake2b(sig[band * self.rows:(band + 1) * self.rows].tobytes(), digest_size=8).hexdigest()}"
+            for band in range(self.bands)
+        ]
+
+    def query(self, sig, group=None):
+        """
+        Firme indicizzate simili a `sig` (esclusi gli id dello stesso gruppo).
+
+        Returns:
+            list: [(id, somiglianza)] sopra la soglia, dalla più simile
+        """
+        candidates = set()
+        for key in self._bucket_keys(sig):
+            candidates.update(self.store.get(self.buckets_ns, key, ()))
+        matches = []
+        for item_id in candidates:
+            entry = self.store.get(self.signatures_ns, item_id)
+            if entry is None or (group is not None and entry[0] == group):
+                continue
+            score = similarity(sig, entry[1])
+            if score >= self.threshold:
+                matches.append((item_id, score))
+        return sorted(matches, key=lambda m: -m[1])
+
+    def add(self, item_id, sig, group=None):
+        """Indicizza una firma (una seconda add dello stesso id non duplica i bucket)."""
+        with self._lock:
+            if self.store.get(self.signatures_ns, item_id) is not None:
+                return
+            self.store.put(self.signatures_ns, item_id, (group, sig))
+            for key in self._bucket_keys(sig):
+                bucket = self.store.get(self.buckets_ns, key, [])
+                bucket.append(item_id)
+                self.store.put(self.buckets_ns, key, bucket[-MAX_BUCKET:])
+
+    def screen(self, item_id, text, group=None):
+        """
+        Cerca risposte simili a `text` e poi la aggiunge all'indice.
+
+        Returns:
+            list: [(id, somiglianza)] delle risposte già indicizzate simili;
+                vuota anche per i testi troppo corti
+        """
+        sig = self.hasher.signature(text)
+        if sig is None:
+            return []
+        matches = self.query(sig, group)
+        self.add(item_id, sig, group)
+        if matches:
+            self.store.put(self.dupes_ns, item_id, matches)
+        return matches
+
+    def pairs(self):
+        """Coppie (id, id simile, somiglianza) trovate finora."""
+        return [(item_id, other, score) for item_id, matches in self.store.items(self.dupes_ns)
+                for other, score in matches]
+
+    def clusters(self):
+        """
+        Gruppi di risposte collegate da almeno una coppia (union-find).
+
+        Returns:
+            list: Liste di id, dal gruppo più numeroso
+        """
+        parent = {}
+
+        def find(x):
+            parent.setdefault(x, x)
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for a, b, _ in self.pairs():
+            parent[find(a)] = find(b)
+        groups = {}
+        for item_id in parent:
+            groups.setdefault(find(item_id), []).append(item_id)
+        return sorted((sorted(g) for g in groups.values()), key=lambda g: (-len(g), g[0]))
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(field):
+    """Indice condiviso del campo per tutto il processo."""
+    with _indexes_lock:
+        index = _indexes.get(field)
+        if index is None:
+            index = _indexes[field] = LSHIndex(field)
+        return index
+
+
+def screen_response(field, item_id, text, group=None):
+    """
+    Screening di una risposta appena inviata, dalle app.
+
+    Non interrompe mai la sessione: un errore viene solo registrato nel log.
+
+    Returns:
+        list: [(id, somiglianza)] delle risposte simili di altri partecipanti
+    """
+    try:
+        matches = get_index(field).screen(item_id, text, group)
+    except Exception:
+        log.exception("near_duplicate_screen_failed", extra={"fields": {"field": field, "id": item_id}})
+        return []
+    if matches:
+        NEAR_DUPLICATES.inc(field)
+        log.warning("near_duplicate", extra={"fields": {
+            "field": field, "id": item_id, "matches": [m[0] for m in matches[:5]],
+            "similarity": round(matches[0][1], 3),
+        }})
+    return matches
+
+
+# ============================================================================
+# BATCH
+# ============================================================================
+def responses_from_csv(path, field, transcripts=None, unresolved=None):
+    """
+    Risposte di un export CSV del foglio risultati, nell'ordine delle righe.
+
+    Args:
+        transcripts: Archivio da cui risolvere i riferimenti alle conversazioni ("chat")
+        unresolved (list): Riceve i Prolific ID delle conversazioni non risolvibili
+
+    Returns:
+        list: [(id, gruppo, testo)]; per "chat" un elemento per messaggio
+            dell'utente, con id "<prolific_id>:<indice>"
+    """
+    from replay import resolve_messages
+    from session_codec import decode_rows
+    from transcript_store import is_transcript_ref
+
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        records = decode_rows(list(csv.reader(f)), "study")
+
+    responses = []
+    for record in records:
+        pid = record["prolific_id"]
+        if field == "engagement_text":
+            responses.append((pid, pid, record["engagement_text"] or ""))
+            continue
+        messages = resolve_messages(record["messages"], transcripts)
+        if messages is None and is_transcript_ref(record["messages"]):
+            if unresolved is not None:
+                unresolved.append(pid)
+            continue
+        for i, m in enumerate(messages or []):
+            if m.get("role") == "user":
+                responses.append((f"{pid}:{i}", pid, m.get("content") or ""))
+    return responses
+
+
+def screen_batch(responses, index):
+    """Screening in ordine di arrivo, come farebbero le app; restituisce il numero di risposte segnalate."""
+    return sum(1 for item_id, group, text in responses if index.screen(item_id, text, group))
+
+
+def print_clusters(index, texts=None, limit=20):
+    clusters = index.clusters()
+    print(f"{len(clusters)} gruppi di risposte quasi identiche ({index.field}, soglia {index.threshold})")
+    for cluster in clusters[:limit]:
+        sample = (texts or {}).get(cluster[0], "")
+        print(f"  {len(cluster):>3}  {', '.join(cluster[:6])}{' ...' if len(cluster) > 6 else ''}")
+        if sample:
+            print(f"       {sample[:100]!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Risposte quasi identiche (MinHash + LSH).")
+    parser.add_argument("--csv", help="Export CSV del foglio risultati (altrimenti: indice delle app)")
+    parser.add_argument("--field", choices=FIELDS, default="engagement_text")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--limit", type=int, default=20, help="Gruppi da mostrare")
+    parser.add_argument("--transcripts-url", help="Foglio da cui risolvere le conversazioni dell'export CSV")
+    parser.add_argument("--credentials", help="JSON del service account (con --transcripts-url)")
+    args = parser.parse_args()
+    if args.transcripts_url and not args.credentials:
+        parser.error("--transcripts-url richiede --credentials")
+
+    if not args.csv:
+        print_clusters(LSHIndex(args.field, threshold=args.threshold), limit=args.limit)
+        return
+
+    from replay import csv_transcripts, print_unresolved
+
+    unresolved = []
+    transcripts = csv_transcripts(args.transcripts_url, args.credentials) if args.field == "chat" else None
+    responses = responses_from_csv(args.csv, args.field, transcripts, unresolved)
+    print_unresolved(unresolved)
+    # Indice in memoria: l'export non tocca quello delle app
+    index = LSHIndex(args.field, store=LocalStore(":memory:"), threshold=args.threshold)
+    flagged = screen_batch(responses, index)
+    print(f"{len(responses)} risposte, {flagged} simili a una precedente")
+    print_clusters(index, {item_id: text for item_id, _, text in responses}, args.limit)
+
+
+if __name__ == "__main__":
+    main()
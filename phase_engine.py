@@ -0,0 +1,126 @@
+import importlib
+import json
+import threading
+import time
+
+from metrics import REGISTRY
+
+
+# ============================================================================
+# MOTORE DELLE FASI
+# ============================================================================
+# Le fasi di uno studio sono descritte in phases.json: numero, nome e modulo
+# che le mostra (una funzione render(ctx)). Il modulo di una fase viene
+# importato solo la prima volta che una sessione ci entra, e a ogni rerun
+# si esegue soltanto il gestore della fase attiva.
+#
+#   {"study": [{"phase": 0, "name": "welcome", "handler": "phases.welcome"}, ...]}
+#
+# "handler" può indicare anche una funzione diversa con "modulo:funzione".
+# Una fase con "final": true gestisce anche tutti i numeri successivi.
+PHASES_CONFIG = "phases.json"
+
+PHASE_SECONDS = REGISTRY.histogram(
+    "study_phase_seconds", "Durata del gestore della fase per rerun", ("app", "phase"),
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+
+class PhaseSpec:
+    """Una fase dello studio come descritta nella configurazione."""
+
+    __slots__ = ("number", "name", "handler", "final")
+
+    def __init__(self, number, name, handler, final=False):
+        self.number = number
+        self.name = name
+        self.handler = handler
+        self.final = final
+
+    @classmethod
+    def from_dict(cls, entry):
+        return cls(int(entry["phase"]), entry["name"], entry["handler"], bool(entry.get("final", False)))
+
+
+class PhaseEngine:
+    """
+    Esegue il gestore della fase attiva e ne misura rerun e durata.
+
+    Args:
+        app (str): Nome dello studio (etichetta delle metriche)
+        specs (list): PhaseSpec dello studio
+    """
+
+    def __init__(self, app, specs):
+        self.app = app
+        self.specs = {spec.number: spec for spec in specs}
+        self._final = max((s for s in specs if s.final), key=lambda s: s.number, default=None)
+        self._handlers = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, app, path=PHASES_CONFIG):
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        return cls(app, [PhaseSpec.from_dict(entry) for entry in config[app]])
+
+    def spec_for(self, phase):
+        spec = self.specs.get(phase)
+        if spec is None and self._final is not None and phase > self._final.number:
+            spec = self._final
+        return spec
+
+    def handler(self, spec):
+        """Funzione della fase, importata al primo uso."""
+        handler = self._handlers.get(spec.number)
+        if handler is None:
+            module_name, _, function = spec.handler.partition(":")
+            handler = getattr(importlib.import_module(module_name), function or "render")
+            with self._lock:
+                self._handlers[spec.number] = handler
+        return handler
+
+    def run(self, phase, ctx):
+        """
+        Mostra la fase `phase`. La durata viene registrata anche quando il
+        gestore termina con st.rerun() o st.stop().
+
+        Returns:
+            bool: False se nessuna fase corrisponde a `phase`
+        """
+        spec = self.spec_for(phase)
+        if spec is None:
+            return False
+        handler = self.handler(spec)
+        start = time.perf_counter()
+        try:
+            handler(ctx)
+        finally:
+            self._record(spec, time.perf_counter() - start)
+        return True
+
+    def _record(self, spec, seconds):
+        PHASE_SECONDS.observe(self.app, spec.number, value=seconds)
+        with self._lock:
+            stats = self._stats.setdefault(spec.number, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+    def report(self):
+        """Rerun e durate per fase dall'avvio del processo."""
+        with self._lock:
+            stats = {number: list(values) for number, values in self._stats.items()}
+        rows = []
+        for number, spec in sorted(self.specs.items()):
+            reruns, total, slowest = stats.get(number, (0, 0.0, 0.0))
+            rows.append({
+                "phase": number,
+                "name": spec.name,
+                "loaded": number in self._handlers,
+                "reruns": reruns,
+                "mean_ms": round(total / reruns * 1000, 1) if reruns else 0.0,
+                "max_ms": round(slowest * 1000, 1),
+            })
+        return rows
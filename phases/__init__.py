@@ -0,0 +1,2 @@
+# Phase handlers of the study (see phases.json and phase_engine.py).
+# Each module exposes render(ctx) and is imported on first use.
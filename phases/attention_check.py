@@ -0,0 +1,21 @@
+import streamlit as st
+
+
+# ============================================================================
+# PHASE 8 — ATTENTION CHECK
+# ============================================================================
+def render(ctx):
+    st.markdown("## What did you discuss with the AI?")
+    st.markdown("Select the topic that you discussed with the AI in the conversation section. If you don't remember, please select the option that best matches your discussion.")
+    att_check_options = [ctx.norms[k]["title"] for k in st.session_state.sampled_norms] + ["None of the above / I don't remember"]
+    att_check_response = st.radio(
+        "Which topic did you discuss with the AI?",
+        att_check_options,
+        key="att_check_response",
+        label_visibility="collapsed"
+    )
+
+    if st.button("Continue"):
+        st.session_state["att_check_response_saved"] = st.session_state.get("att_check_response", "")
+        st.session_state.phase = 9  # move to final questionnaire phase
+        st.rerun()
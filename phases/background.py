@@ -0,0 +1,195 @@
+import time
+
+import streamlit as st
+
+from client_timing import client_timing, elapsed_since, to_server_time
+from near_duplicates import screen_response
+
+
+# ============================================================================
+# COMPREHENSION QUESTION (MASKED ATTENTION CHECK)
+# ============================================================================
+COMPREHENSION_QUESTION = {
+    "question": '''People get their news from a variety of sources, and in today’s world reliance on on-line news sources is increasingly common. 
+    To show that you’ve read this much, please select “Television or print news only” as your answer.''',
+    "options": [
+        "On-line sources only",
+        "Mostly on-line sources with some television and print news",
+        "About half on-line sources",
+        "Mostly television or print news with some on-line sources",
+        "Television or print news only"
+    ],
+    "correct": "Television or print news only"
+}
+
+
+# ============================================================================
+# PHASE 1 — COMPREHENSION + BACKGROUND (SAME PAGE, 3 TIMERS)
+# ============================================================================
+def _server_elapsed(key, now):
+    # Seconds since a server-side on_change stamp, None if it never fired
+    stamp = st.session_state.get(key)
+    return now - stamp if stamp else None
+
+
+def render(ctx):
+    # =========================
+    # INITIALIZE TIMERS
+    # =========================
+    # Server-side stamps (on_change callbacks), used wherever the browser
+    # timing batch is missing or has no event for a widget
+    now = time.time()
+
+    if "page_load_time" not in st.session_state:
+        st.session_state.page_load_time = now  # Parallel timer baseline
+
+    if "comp_first_interaction" not in st.session_state:
+        st.session_state.comp_first_interaction = None
+
+    if "engagement_start_time_seq" not in st.session_state:
+        st.session_state.engagement_start_time_seq = None
+
+    if "engagement_first_interaction" not in st.session_state:
+        st.session_state.engagement_first_interaction = None
+
+    # =========================
+    # PLACEHOLDERS
+    # =========================
+    comp_container = st.empty()
+    engagement_container = st.empty()
+
+
+    # =========================
+    # QUESTION 1 — COMPREHENSION
+    # =========================
+
+    def comp_interaction_callback():
+        if st.session_state.comp_first_interaction is None:
+            st.session_state.comp_first_interaction = time.time()
+
+        # Start Q2 sequential timer once Q1 answered
+        if st.session_state.engagement_start_time_seq is None:
+            st.session_state.engagement_start_time_seq = time.time()
+
+    st.markdown("---")
+    with comp_container.container():
+        st.markdown("## Background Questions")
+        st.markdown('''In this section, you will answer two brief questions. Please: \n- Read each question carefully.\n- Select or write the response that best reflects your view. \n- Respond thoughtfully and independently. \nAfter clicking continue, you will proceed to the next part of the study.''')
+        st.markdown("---")
+        st.markdown("### Question 1")
+        st.markdown(COMPREHENSION_QUESTION["question"])
+        response = st.radio(
+            COMPREHENSION_QUESTION["question"],
+            COMPREHENSION_QUESTION["options"],
+            key="comp_response",
+            on_change=comp_interaction_callback,
+            label_visibility="collapsed"
+        )
+
+
+    # =========================
+    # QUESTION 2 — BACKGROUND
+    # =========================
+    if st.session_state.get("comp_response"):
+
+        with engagement_container.container():
+            st.markdown("---")
+            st.markdown("### Question 2")
+            st.markdown("If you could change one thing about the world what would it be and why? Please elaborate in a few sentences so we can better understand your perspective.")
+            text = st.text_area(
+                "If you could change one thing about the world what would it be and why? Please elaborate in a few sentences so we can better understand your perspective.",
+                height=150,
+                key="engagement_text",
+                on_change=lambda: st.session_state.update({"engagement_first_interaction": time.time()}),
+                label_visibility="collapsed"
+            )
+
+    else:
+        engagement_container.empty()
+        st.info("Please answer the first question to continue.")
+
+    # =========================
+    # SUBMIT BUTTON
+    # =========================
+    # The button is drawn by the timing component: focus / input / change /
+    # submit timestamps recorded in the browser arrive in the click's own rerun
+    submit = client_timing(
+        phase=1,
+        targets={
+            "comp": '[data-testid="stRadio"]',
+            "engagement": '[data-testid="stTextArea"]',
+        },
+        submit_label="Continue",
+    )
+    if submit["clicked"]:
+        batch = submit["batch"]
+        st.session_state.phase1_client_timing = batch
+
+        # Force-save responses to session state
+        st.session_state["comp_response_saved"] = st.session_state.get("comp_response", "")
+        st.session_state["engagement_text_saved"] = st.session_state.get("engagement_text", "")
+
+        # Validation
+        if not st.session_state["comp_response_saved"]:
+            st.warning("Please answer the first question before continuing.")
+            st.stop()
+
+        if st.session_state["engagement_text_saved"] == "":
+            st.warning("Please provide a response to the second question before continuing.")
+            st.stop()
+
+        server_now = time.time()
+        if batch:
+            # Browser clock: page load -> submit, reconciled with the server clock
+            page_load = to_server_time(batch, batch["page_load"])
+            now = to_server_time(batch, batch["submit"])
+        else:
+            page_load = st.session_state.page_load_time
+            now = server_now
+
+        # -------- PARALLEL --------
+        parallel_comp_time = now - page_load
+        parallel_engagement_time = now - page_load
+
+        # -------- SEQUENTIAL --------
+        # Q1 starts at page load, Q2 starts once Q1 has been answered
+        sequential_comp_time = now - page_load
+        sequential_engagement_time = elapsed_since(batch, "comp", "change") if batch else None
+        if sequential_engagement_time is None:
+            sequential_engagement_time = _server_elapsed("engagement_start_time_seq", server_now)
+
+        # -------- INTERACTION --------
+        interaction_comp_time = elapsed_since(batch, "comp", "change") if batch else None
+        if interaction_comp_time is None:
+            interaction_comp_time = _server_elapsed("comp_first_interaction", server_now)
+        # Same meaning as the on_change stamp: time since the text was last committed
+        interaction_engagement_time = elapsed_since(batch, "engagement", "change", which="last") if batch else None
+        if interaction_engagement_time is None:
+            interaction_engagement_time = _server_elapsed("engagement_first_interaction", server_now)
+
+        # Save responses
+        st.session_state.comp_correct = (
+            st.session_state.comp_response == COMPREHENSION_QUESTION["correct"]
+        )
+
+        st.session_state.engagement_word_count = len(
+            st.session_state.get("engagement_text_saved", "").split()
+        )
+
+        # Copy-paste / bot screening against earlier participants (local index only)
+        with ctx.profile.section("storage"):
+            screen_response(
+                "engagement_text", st.session_state.prolific_id,
+                st.session_state["engagement_text_saved"], group=st.session_state.prolific_id
+            )
+
+        # Store ALL timing variables
+        st.session_state.parallel_comp_time = parallel_comp_time
+        st.session_state.parallel_engagement_time = parallel_engagement_time
+        st.session_state.sequential_comp_time = sequential_comp_time
+        st.session_state.sequential_engagement_time = sequential_engagement_time
+        st.session_state.interaction_comp_time = interaction_comp_time
+        st.session_state.interaction_engagement_time = interaction_engagement_time
+
+        st.session_state.phase = 2
+        st.rerun()
@@ -0,0 +1,47 @@
+import os
+
+import streamlit as st
+
+import catalogs
+from clients import get_sheet, get_openai_client
+
+
+# ============================================================================
+# SHARED RESOURCES (BUILT ONCE PER PROCESS)
+# ============================================================================
+def load_catalog(path):
+    # Read-only: shared by every session (and every study in the router)
+    if not os.path.exists(path):
+        st.error(f"Missing file: {path}")
+        st.stop()
+    return catalogs.load_catalog(path)
+
+
+# ============================================================================
+# PHASE CONTEXT
+# ============================================================================
+class StudyContext:
+    """What phase handlers get: the rerun profile plus lazily resolved shared resources."""
+
+    def __init__(self, profile):
+        self.profile = profile
+
+    @property
+    def prompts(self):
+        with self.profile.section("load_catalogs"):
+            return load_catalog("prompts.json")
+
+    @property
+    def norms(self):
+        with self.profile.section("load_catalogs"):
+            return load_catalog("norms.json")
+
+    @property
+    def sheet(self):
+        with self.profile.section("clients"):
+            return get_sheet()
+
+    @property
+    def openai_client(self):
+        with self.profile.section("clients"):
+            return get_openai_client()
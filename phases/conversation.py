@@ -0,0 +1,109 @@
+from datetime import datetime
+
+import streamlit as st
+
+from session_footprint import Message
+from llm import build_system_prompt, api_messages, greeting_messages, stream_chat, generation_profile
+from completion_cache import get_completion_cache
+from generation_report import record_generation
+from near_duplicates import screen_response
+
+
+# ============================================================================
+# PHASE 5 — CONVERSATION
+# ============================================================================
+def render(ctx):
+    prompt_data = ctx.prompts[st.session_state.prompt_key]
+    norm_data = ctx.norms[st.session_state.norm_key]
+    initial_opinion_treatment = st.session_state.initial_opinion.get(norm_data["title"], 50)
+    system_prompt = build_system_prompt(prompt_data, norm_data["title"], initial_opinion_treatment)
+    # Model, max_tokens, temperature, stop... from the template's "generation" profile
+    model, params = generation_profile(prompt_data)
+    #Print for debugging
+    #st.write("System Prompt:", system_prompt)
+
+    # Initial greeting
+    if not st.session_state.greeting_sent:
+        # Served from the completion cache only where COMPLETION_CACHE allows it
+        with ctx.profile.section("llm"):
+            reply = get_completion_cache().complete(
+                ctx.openai_client, greeting_messages(system_prompt), model, **params
+            )
+        record_generation(st.session_state.prompt_key, model, "greeting", reply.latency, reply.completion_tokens)
+        st.session_state.messages.append(Message(
+            "assistant",
+            reply.text,
+            datetime.now().isoformat()
+        ))
+        st.session_state.greeting_sent = True
+        st.rerun()
+
+    # Display all messages
+    with ctx.profile.section("render_messages"):
+        for m in st.session_state.messages:
+            with st.chat_message(m["role"]):
+                st.markdown(m["content"])
+
+    assistant_msgs = [m for m in st.session_state.messages if m["role"] == "assistant"]
+    round_count = max(0, len(assistant_msgs) - 1)
+
+    # Capture pending user input
+    if "pending_user_message" not in st.session_state:
+        st.session_state.pending_user_message = None
+
+    if user_input := st.chat_input("Type your response here"):
+        st.session_state.pending_user_message = Message(
+            "user",
+            user_input,
+            datetime.now().isoformat()
+        )
+        st.rerun()  # rerun to render user message first
+
+    # If pending user message, append and display it
+    if st.session_state.pending_user_message:
+        user_msg = st.session_state.pending_user_message
+        st.session_state.messages.append(user_msg)
+        pid = st.session_state.prolific_id
+        with ctx.profile.section("storage"):
+            screen_response("chat", f"{pid}:{len(st.session_state.messages) - 1}", user_msg["content"], group=pid)
+        with st.chat_message("user"):
+            st.markdown(user_msg["content"])
+        st.session_state.pending_user_message = None
+
+        # Generate assistant response only if < 10 rounds
+        if round_count < 10:
+            # Streaming: time to the last token, including rendering the chunks
+            stats = {}
+            with ctx.profile.section("llm"), st.chat_message("assistant"):
+                stream = stream_chat(
+                    ctx.openai_client, api_messages(system_prompt, st.session_state.messages),
+                    model, stats=stats, **params
+                )
+                reply_text = st.write_stream(stream)
+            record_generation(st.session_state.prompt_key, model, "turn", stats["latency"], stats["completion_tokens"])
+
+            st.session_state.messages.append(Message(
+                "assistant",
+                reply_text,
+                datetime.now().isoformat()
+            ))
+
+            st.rerun()
+        else:
+            # 10th round completed — final assistant message
+            final_message = "Thank you for your thoughtful responses! The discussion is now complete. Please click the button below to proceed with the study."
+            st.session_state.messages.append(Message(
+                "assistant",
+                final_message,
+                datetime.now().isoformat()
+            ))
+
+            # Automatically move to next phase
+            #st.session_state.phase = 5
+            st.rerun()
+
+    # Show "End Discussion" button after 3 rounds (before 10 rounds)
+    if round_count >= 3 and st.session_state.phase == 5:
+        if st.button("End Discussion"):
+            st.session_state.phase = 6
+            st.rerun()
@@ -0,0 +1,22 @@
+import streamlit as st
+
+from batched_inputs import SliderGroup, slider_form
+
+
+# ============================================================================
+# PHASE 7 — FINAL GROUP OPINION
+# ============================================================================
+def render(ctx):
+    st.markdown("## How do you rate others’ opinion?")
+    st.markdown("After the discussion, what do you think the other participants of this study have on average reported as an answer to the appropiateness of the following behaviors when asked a second time, where 0 means very inappropriate and 100 means highly appropriate.\nWe will calculate the responses provided by the other participants and compare them with the estimate you provided. If your estimate is correct, you will receive an additional bonus of £1/£0.50.")
+    sampled_norms = [ctx.norms[k] for k in st.session_state.sampled_norms]
+    values = slider_form(
+        "group_opinion_final_form",
+        [SliderGroup([norm["title"] for norm in sampled_norms], "group_opinion_final_slider")],
+        0, 100,
+    )
+
+    if values is not None:
+        st.session_state.opinions_others_final = values[0]
+        st.session_state.phase = 8  # move to final questionnaire phase
+        st.rerun()
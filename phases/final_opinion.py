@@ -0,0 +1,33 @@
+import streamlit as st
+
+from batched_inputs import SliderGroup, slider_form
+
+
+# ============================================================================
+# PHASE 6 — FINAL OPINION
+# ============================================================================
+def render(ctx):
+    # Nothing to show once the results have been saved
+    if st.session_state.data_saved:
+        return
+
+    st.markdown("## Final Opinion")
+    st.markdown("After the discussion, how appropriate do you consider this behaviors are? You can adjust the sliders to reflect any change in your opinion after the discussion, where 0 means very inappropriate and 100 means highly appropriate.")
+
+    sampled_norms = [ctx.norms[k] for k in st.session_state.sampled_norms]
+
+    # Show sliders in SAME ORDER as Phase 3, initialized at the original response
+    values = slider_form(
+        "final_opinion_form",
+        [SliderGroup(
+            [norm["title"] for norm in sampled_norms],
+            "final_slider",
+            default=st.session_state.initial_opinion,
+        )],
+        0, 100,
+    )
+
+    if values is not None:
+        st.session_state.final_opinion = values[0]
+        st.session_state.phase = 7  # move to final opinion phase
+        st.rerun()
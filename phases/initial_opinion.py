@@ -0,0 +1,46 @@
+import random
+import time
+
+import streamlit as st
+
+from results import get_least_used_combination
+from batched_inputs import SliderGroup, slider_form
+
+
+# ============================================================================
+# PHASE 2 — INITIAL OPINION
+# ============================================================================
+def render(ctx):
+    if "prompt_key" not in st.session_state:
+        with ctx.profile.section("storage"):
+            prompt_key, norm_key = get_least_used_combination(ctx.sheet, ctx.prompts, ctx.norms)
+        st.session_state.prompt_key = prompt_key
+        st.session_state.norm_key = norm_key
+        st.session_state.start_time = time.time()
+
+    # Store sampled & shuffled norm keys only once (the norm dicts stay in the catalog)
+    if "sampled_norms" not in st.session_state:
+        # Remove current norm and sample 2 more
+        other_keys = [k for k in ctx.norms if k != st.session_state.norm_key]
+        sampled_keys = random.sample(other_keys, 2)
+        sampled_keys.append(st.session_state.norm_key)  # append the original norm
+        random.shuffle(sampled_keys)
+
+        st.session_state.sampled_norms = sampled_keys
+
+    sampled_norms = [ctx.norms[k] for k in st.session_state.sampled_norms]
+
+    st.markdown("## Your Initial Opinion")
+    st.markdown("We ask you to indicate how appropriate you consider each of the following behaviors, where 0 means very inappropriate and 100 means highly appropriate.")
+
+    # Slider values reach the server only when the form is submitted
+    values = slider_form(
+        "initial_opinion_form",
+        [SliderGroup([norm["title"] for norm in sampled_norms], "slider")],
+        0, 100,
+    )
+
+    if values is not None:
+        st.session_state.initial_opinion = values[0]
+        st.session_state.phase = 3
+        st.rerun()
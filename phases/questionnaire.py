@@ -0,0 +1,69 @@
+import time
+
+import streamlit as st
+
+from session_footprint import messages_to_dicts
+from results import save_to_google_sheets, build_session_row
+from transcript_store import get_transcript_store
+from session_codec import ensure_header
+from metrics import STUDY_SAVES
+from study_progress import record_completion
+from batched_inputs import SliderGroup, slider_form
+
+
+# ============================================================================
+# PHASE 9 — FINAL QUESTIONNAIRE
+# ============================================================================
+def render(ctx):
+    st.markdown("## Final Questionnaire")
+    st.markdown("###  Indicate your degree of agreement with the following statements (where 1 means strongly disagree and 7 means strongly agree).")
+    # All 14 items are sent in one submission
+    values = slider_form(
+        "final_questionnaire_form",
+        [
+            SliderGroup(["Got me involved", "Seemed relevant to me", "Interested me"],
+                        "involvement_slider", heading="#### The messages I read:", default=4),
+            SliderGroup(["Tried to manipulate me", "Tried to pressure me", "Undermined my sense of self-worth",
+                         "Made me feel less than capable", "Made me think I should change"],
+                        "threat_slider", heading="#### The messages I read:", default=4),
+            SliderGroup(["Reliable", "Trusted", "Honest", "Competent", "Expert", "Informed"],
+                        "source_slider", heading="#### To what extent the source of these messages is:", default=4),
+        ],
+        1, 7,
+        submit_label="Submit Responses",
+    )
+
+    if values is not None:
+        involvement_responses, threat_responses, source_responses = values
+
+        messages = messages_to_dicts(st.session_state.messages)
+
+        # Transcript goes to the secondary store first; the summary row only keeps its hash
+        with ctx.profile.section("storage"):
+            transcripts = get_transcript_store(ctx.sheet.spreadsheet)
+
+            row = build_session_row(
+                st.session_state,
+                messages,
+                involvement_responses,
+                threat_responses,
+                source_responses,
+                end_time=time.time(),
+                transcript=transcripts.put(messages),
+            )
+
+            try:
+                ensure_header(ctx.sheet, "study")
+                save_to_google_sheets(ctx.sheet, row)
+            except Exception:
+                STUDY_SAVES.inc("study", "failure")
+                raise
+            STUDY_SAVES.inc("study", "success")
+            record_completion(
+                "study", st.session_state.prolific_id, st.session_state.prompt_key,
+                st.session_state.norm_key, time.time() - st.session_state.start_time
+            )
+
+        st.session_state.data_saved = True
+        st.session_state.phase = 10  # move to thank you phase
+        st.rerun()
@@ -0,0 +1,20 @@
+import streamlit as st
+
+
+# ============================================================================
+# PHASE 10 — THANK YOU & PROLIFIC REDIRECT
+# ============================================================================
+def render(ctx):
+    st.markdown("## Thank you for your participation")
+    st.markdown("""
+    Your responses have been successfully recorded.
+
+    The link below will redirect you immediately to Prolific:""")
+
+    # Replace with your actual Prolific completion code
+    prolific_id = st.session_state.get("prolific_id", "")
+    # Safe placeholder for testing; replace with your real Prolific completion code
+    completion_base_url = "https://www.prolific.co/"
+    completion_url = f"{completion_base_url}?PROLIFIC_PID={prolific_id}"
+
+    st.markdown(f"[Return to Prolific immediately]({completion_url})", unsafe_allow_html=True)
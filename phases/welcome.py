@@ -0,0 +1,21 @@
+import streamlit as st
+
+
+# ============================================================================
+# PHASE 0 — WELCOME & INSTRUCTIONS
+# ============================================================================
+def render(ctx):
+    st.markdown("## Welcome")
+    st.markdown("""
+    Thank you for taking part in this study.
+
+    You will:
+    - Answer a few short questions
+    - Have a brief discussion with an AI system
+    - Share your opinion before and after the discussion
+
+    Please complete the study in one sitting and respond thoughtfully.
+    """)
+    if st.button("Begin"):
+        st.session_state.phase = 1
+        st.rerun()
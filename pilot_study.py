@@ -1,13 +1,23 @@
 import streamlit as st
-import gspread
-from google.oauth2.service_account import Credentials
 from datetime import datetime
-from openai import OpenAI
 import json
 import os
 import time
 from collections import defaultdict
 
+from theme import apply_theme
+from catalogs import load_catalog
+from study_logging import get_logger
+from metrics import start_metrics_server, record_rerun, STUDY_SAVES
+from llm import api_messages, complete, greeting_messages, generation_profile, stream_chat
+from generation_report import record_generation
+from study_progress import record_completion, record_progress
+from completion_cache import get_completion_cache
+from clients import get_sheet, get_openai_client, start_warmup, study_secret
+from session_codec import encode_row, ensure_header
+
+log = get_logger("pilot_study")
+
 # Page configuration
 st.set_page_config(
     page_title="Everyday Norm Experiment",
@@ -17,235 +27,7 @@ st.set_page_config(
 )
 
 # Custom CSS for elegant design
-st.markdown("""
-<style>
-    * {
-        font-family: 'Segoe UI', Trebuchet MS, sans-serif;
-    }
-    
-    html, body, [data-testid="stAppViewContainer"] {
-        background: linear-gradient(135deg, #f5f7fa 0%, #f8f9fb 100%);
-    }
-    
-    [data-testid="stMainBlockContainer"] {
-        padding: 2rem 3rem;
-    }
-    
-    [data-testid="stForm"] {
-        background: white;
-        padding: 2.5rem;
-        border-radius: 12px;
-        box-shadow: 0 2px 8px rgba(0, 0, 0, 0.06);
-        border: 1px solid #e5e7eb;
-    }
-    
-    [data-testid="stForm"] label {
-        font-weight: 500;
-        color: #333;
-        font-size: 0.95rem;
-        margin-bottom: 0.5rem;
-    }
-    
-    [data-testid="stTextInput"] input {
-        border: 1.5px solid #e5e7eb !important;
-        border-radius: 8px !important;
-        padding: 0.75rem 1rem !important;
-        font-size: 0.95rem !important;
-        transition: all 0.3s ease;
-    }
-    
-    [data-testid="stTextInput"] input:focus {
-        border-color: #003d82 !important;
-        box-shadow: 0 0 0 3px rgba(0, 61, 130, 0.1) !important;
-    }
-    
-    button[kind="primary"] {
-        background: linear-gradient(135deg, #003d82 0%, #004a9e 100%);
-        color: white !important;
-        border: none !important;
-        padding: 0.75rem 2rem !important;
-        border-radius: 8px !important;
-        font-weight: 600 !important;
-        font-size: 0.95rem !important;
-        transition: all 0.3s ease;
-        margin-top: 1.5rem;
-    }
-    
-    button[kind="primary"]:hover {
-        box-shadow: 0 4px 12px rgba(0, 61, 130, 0.3);
-        transform: translateY(-1px);
-    }
-    
-    .success-badge {
-        background: #f0fdf4;
-        color: #166534;
-        padding: 1rem 1.5rem;
-        border-radius: 8px;
-        border-left: 4px solid #22c55e;
-        margin-bottom: 2rem;
-        font-weight: 500;
-    }
-    
-    [data-testid="chatAvatarIcon-assistant"], [data-testid="chatAvatarIcon-user"] {
-        display: none !important;
-    }
-    
-    [role="presentation"] [data-testid="stChatMessage"] {
-        background: transparent !important;
-        padding: 1rem 0 !important;
-    }
-    
-    [data-testid="stChatMessageContent"] {
-        background: white;
-        padding: 1.25rem 1.5rem;
-        border-radius: 10px;
-        border: 1px solid #e5e7eb;
-        line-height: 1.6;
-        color: #333;
-        font-size: 0.95rem;
-    }
-    
-    [data-testid="stChatMessage"]:has([data-testid="stChatMessageContent"] p) > div:first-child {
-        margin-right: auto;
-        max-width: 85%;
-    }
-    
-    [data-testid="stChatMessage"]:last-child [data-testid="stChatMessageContent"] {
-        background: linear-gradient(135deg, #f3f4f6 0%, #ffffff 100%);
-    }
-    
-    [data-testid="stChatInputTextArea"] textarea {
-        border: 1.5px solid #e5e7eb !important;
-        border-radius: 8px !important;
-        padding: 1rem !important;
-        font-size: 0.95rem !important;
-    }
-    
-    [data-testid="stChatInputTextArea"] textarea:focus {
-        border-color: #003d82 !important;
-        box-shadow: 0 0 0 3px rgba(0, 61, 130, 0.1) !important;
-    }
-    
-    .chat-container {
-        background: white;
-        border-radius: 12px;
-        padding: 2rem;
-        border: 1px solid #e5e7eb;
-        box-shadow: 0 2px 8px rgba(0, 0, 0, 0.04);
-    }
-    
-    hr {
-        border: none;
-        border-top: 1px solid #e5e7eb;
-        margin: 2rem 0;
-    }
-    
-    .error {
-        background: #fef2f2;
-        color: #991b1b;
-        padding: 1rem 1.5rem;
-        border-radius: 8px;
-        border-left: 4px solid #ef4444;
-        font-size: 0.95rem;
-    }
-    
-    .info-text {
-        color: #666;
-        font-size: 0.9rem;
-        margin-top: 1rem;
-    }
-    
-    .prompt-selector {
-        background: white;
-        padding: 2.5rem;
-        border-radius: 12px;
-        box-shadow: 0 2px 8px rgba(0, 0, 0, 0.06);
-        border: 1px solid #e5e7eb;
-    }
-    
-    .prompt-option {
-        background: #f9fafb;
-        padding: 1.5rem;
-        border-radius: 8px;
-        border: 2px solid #e5e7eb;
-        margin-bottom: 1rem;
-        cursor: pointer;
-        transition: all 0.3s ease;
-    }
-    
-    .prompt-option:hover {
-        border-color: #003d82;
-        background: #f0f4f8;
-    }
-    
-    .prompt-option h3 {
-        margin: 0 0 0.5rem 0;
-        color: #1a1a1a;
-        font-size: 1.1rem;
-    }
-    
-    .prompt-option p {
-        margin: 0;
-        color: #666;
-        font-size: 0.9rem;
-    }
-    
-    .timestamp {
-        font-size: 0.8rem;
-        color: #999;
-        margin-top: 0.5rem;
-    }
-    
-    [data-testid="stTextArea"] textarea {
-        border: 1.5px solid #e5e7eb !important;
-        border-radius: 8px !important;
-        padding: 1rem !important;
-        font-size: 0.95rem !important;
-        font-family: 'Segoe UI', Trebuchet MS, sans-serif;
-    }
-    
-    [data-testid="stTextArea"] textarea:focus {
-        border-color: #003d82 !important;
-        box-shadow: 0 0 0 3px rgba(0, 61, 130, 0.1) !important;
-    }
-    
-    .final-phase-container {
-        display: flex;
-        gap: 2rem;
-        margin-top: 2rem;
-    }
-    
-    .form-column {
-        flex: 1;
-        min-width: 300px;
-    }
-    
-    .chat-column {
-        flex: 1;
-        min-width: 300px;
-        background: white;
-        border-radius: 12px;
-        padding: 1.5rem;
-        border: 1px solid #e5e7eb;
-        box-shadow: 0 2px 8px rgba(0, 0, 0, 0.04);
-        max-height: 600px;
-        display: flex;
-        flex-direction: column;
-    }
-    
-    .chat-messages {
-        flex: 1;
-        overflow-y: auto;
-        margin-bottom: 1rem;
-    }
-    
-    @media (max-width: 1200px) {
-        .final-phase-container {
-            flex-direction: column;
-        }
-    }
-</style>
-""", unsafe_allow_html=True)
+apply_theme("pilot_study.css")
 
 
 # ============================================================================
@@ -267,9 +49,8 @@ def load_json_from_file(file_path, item_name="items"):
             st.error(f"❌ File {file_path} non trovato")
             return {}
         
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return data
+        # Cache condivisa dal processo (anche tra studi diversi)
+        return load_catalog(file_path)
     
     except json.JSONDecodeError as e:
         st.error(f"❌ Errore nel parsing del JSON {file_path}: {str(e)}")
@@ -329,12 +110,11 @@ def save_conversation_to_json(user_info, prompt_data, norm_data, messages, filen
 # ============================================================================
 # SALVATAGGIO SU GOOGLE SHEETS
 # ============================================================================
-def save_to_google_sheets(sheet, user_info, prompt_key, prompt_data, norm_key, norm_data, messages, argumentation, word_tracking=None, final_chat_messages=None):
+def save_to_google_sheets(user_info, prompt_key, prompt_data, norm_key, norm_data, messages, argumentation, word_tracking=None, final_chat_messages=None):
     """
     Salva i dati su Google Sheets.
     
     Args:
-        sheet: Sheet object di gspread
         user_info (dict): Informazioni dell'utente
         prompt_key (str): Chiave del prompt selezionato
         prompt_data (dict): Dati del prompt
@@ -349,48 +129,40 @@ def save_to_google_sheets(sheet, user_info, prompt_key, prompt_data, norm_key, n
         bool: True se il salvataggio è riuscito, False altrimenti
     """
     try:
-        conversation_json = json.dumps(messages, ensure_ascii=False, indent=2)
-        final_chat_json = json.dumps(final_chat_messages or [], ensure_ascii=False, indent=2)
-        
-        # Formatta il word tracking in modo leggibile
-        word_tracking_formatted = ""
-        if word_tracking:
-            sorted_tracking = sorted(word_tracking.items())
-            word_tracking_formatted = json.dumps(
-                {f"second_{i}": count for i, count in sorted_tracking},
-                ensure_ascii=False,
-                indent=2
-            )
-        
-        sheet.append_row([
-            user_info["prolific_id"],
-            prompt_key,
-            norm_key,
-            conversation_json,
-            argumentation,
-            datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        ])
-        return True
+        # Il foglio si apre qui al primo uso (il warmup di solito l'ha già fatto)
+        sheet = get_sheet()
+        ensure_header(sheet, "pilot")
+        sheet.append_row(encode_row("pilot", {
+            "prolific_id": user_info["prolific_id"],
+            "prompt_key": prompt_key,
+            "norm_key": norm_key,
+            "conversation": messages,
+            "argumentation": argumentation,
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }), value_input_option="RAW")
     except Exception as e:
+        STUDY_SAVES.inc("pilot", "failure")
         st.error(f"❌ Errore nel salvataggio su Google Sheets: {str(e)}")
         return False
 
+    STUDY_SAVES.inc("pilot", "success")
+    record_completion("pilot", user_info.get("prolific_id", ""), prompt_key, norm_key)
+    return True
+
 
 try:
     # Load credentials and URL from secrets.toml
     creds_dict = st.secrets["gcp_service_account"]
-    sheet_url = st.secrets["google_sheet_url"]
-    openai_api_key = st.secrets["openai_api_key"]
-    
-    # Configure credentials with correct scopes
-    scopes = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
-    creds = Credentials.from_service_account_info(creds_dict, scopes=scopes)
-    client_sheets = gspread.authorize(creds)
+    sheet_url = study_secret("google_sheet_url")
+    openai_api_key = study_secret("openai_api_key")
     
-    # Open the sheet
-    spreadsheet = client_sheets.open_by_url(sheet_url)
-    sheet = spreadsheet.sheet1
+    # Client gspread/OpenAI importati e autorizzati una volta per processo
+    # (in background dall'avvio), non a ogni rerun
+    start_warmup()
     
+    # Metriche (server avviato una volta per processo)
+    start_metrics_server()
+
     # Initialize session state
     if "user_data_collected" not in st.session_state:
         st.session_state.user_data_collected = False
@@ -424,6 +196,27 @@ try:
         st.session_state.word_tracking = defaultdict(int)
     if "last_check_time" not in st.session_state:
         st.session_state.last_check_time = time.time()
+
+    # Fase corrente (numeri dei commenti PHASE N) per metriche e dashboard
+    if not st.session_state.user_data_collected:
+        phase = 1
+    elif not st.session_state.prompt_selected:
+        phase = 2
+    elif not st.session_state.norm_selected:
+        phase = 3
+    elif not st.session_state.conversation_ended:
+        phase = 4
+    else:
+        phase = 5
+    record_rerun("pilot", st.session_state, phase=phase)
+    if st.session_state.user_data_collected:
+        # La condizione conta come assegnata quando sono scelti sia il tema sia la norma
+        condition = (None, None)
+        if st.session_state.prompt_selected and st.session_state.norm_selected:
+            condition = (st.session_state.selected_prompt_key, st.session_state.selected_norm_key)
+        record_progress(
+            "pilot", st.session_state, st.session_state.user_info["prolific_id"], phase=phase, condition=condition,
+        )
     
     # Verifica se i file sono stati caricati
     if not PROMPTS:
@@ -530,9 +323,9 @@ try:
         prompt_key = st.session_state.selected_prompt_key
         prompt_data = PROMPTS[prompt_key]
         norm_key = st.session_state.selected_norm_key
-        print(norm_key)
         norm_data = NORMS[norm_key]
-        print(norm_data)
+        # Ad ogni rerun della chat: campionato
+        log.debug("chat_rerun", extra={"fields": {"prompt_key": prompt_key, "norm_key": norm_key}, "sample": 0.05})
 
         st.markdown(f"""
         <div class="success-badge">
@@ -560,24 +353,25 @@ try:
         st.markdown("<hr>", unsafe_allow_html=True)
         
         # Create OpenAI client
-        openai_client = OpenAI(api_key=openai_api_key)
+        openai_client = get_openai_client(openai_api_key)
         
         # Get the system prompt template and inject the selected norm
         system_prompt_template = prompt_data.get("system_prompt_template", prompt_data.get("system_prompt", ""))
         system_prompt = system_prompt_template.replace("{NORM_DESCRIPTION}", norm_data["title"])
+        # Modello e parametri dal profilo "generation" del template (se presente)
+        model, generation_params = generation_profile(prompt_data)
         
         # Generate initial greeting if not yet sent
         if not st.session_state.greeting_sent:
-            greeting_response = openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": "Start the conversation"}
-                ],
-                stream=False,
+            # Cache dei saluti solo se abilitata con COMPLETION_CACHE
+            greeting = get_completion_cache().complete(
+                openai_client,
+                greeting_messages(system_prompt, "Start the conversation"),
+                model,
+                **generation_params,
             )
-            
-            initial_message = greeting_response.choices[0].message.content
+            record_generation(prompt_key, model, "greeting", greeting.latency, greeting.completion_tokens)
+            initial_message = greeting.text
             st.session_state.messages.append({
                 "role": "assistant",
                 "content": initial_message,
@@ -611,15 +405,13 @@ try:
                 for m in st.session_state.messages
             ]
             
-            stream = openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=messages_for_api,
-                stream=True,
-            )
+            stats = {}
+            stream = stream_chat(openai_client, messages_for_api, model, stats=stats, **generation_params)
             
             # Stream response
             with st.chat_message("assistant"):
                 response = st.write_stream(stream)
+                record_generation(prompt_key, model, "turn", stats["latency"], stats["completion_tokens"])
                 
                 # Check if conversation should end (LLM responds with ABRACADABRA)
                 if "ABRACADABRA" in response:
@@ -659,8 +451,9 @@ try:
         """, unsafe_allow_html=True)
         
         # Create OpenAI client for final chat
-        openai_client = OpenAI(api_key=openai_api_key)
+        openai_client = get_openai_client(openai_api_key)
         final_chat_system_prompt = f"You are a helpful assistant. Answer questions about the topic discussed: {norm_data['title']}. Be supportive and provide insights."
+        model, generation_params = generation_profile(prompt_data)
         
         # Create two columns: form on left, AI Assistant on right
         col_form, col_assistant = st.columns([2, 1])
@@ -702,15 +495,15 @@ try:
                     # Traccia finale
                     track_words_callback()
                     
-                    # Stampa il tracking (solo tu lo vedi nei log/debug)
-                    print("📊 WORD TRACKING PER SECONDO:")
-                    for second, word_count in sorted(st.session_state.word_tracking.items()):
-                        print(f"  Secondo {second}: {word_count} parole")
+                    # Tracking per secondo nei log (solo a livello DEBUG)
+                    log.debug("word_tracking", extra={"fields": {
+                        "prolific_id": user_info["prolific_id"],
+                        "words_per_second": dict(sorted(st.session_state.word_tracking.items())),
+                    }})
                     
                     # Salva tutto normalmente
                     save_conversation_to_json(user_info, prompt_data, norm_data, st.session_state.messages)
                     success = save_to_google_sheets(
-                        sheet,
                         user_info,
                         prompt_key,
                         prompt_data,
@@ -751,19 +544,16 @@ try:
                     "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 })
                 
-                # Generate response from OpenAI
-                messages_for_api = [{"role": "system", "content": final_chat_system_prompt}] + [
-                    {"role": m["role"], "content": m["content"]}
-                    for m in st.session_state.final_chat_messages
-                ]
-                
-                response = openai_client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=messages_for_api,
-                    stream=False,
+                # Stesso modello e parametri della conversazione (profilo del template)
+                reply = complete(
+                    openai_client,
+                    api_messages(final_chat_system_prompt, st.session_state.final_chat_messages),
+                    model,
+                    **generation_params,
                 )
+                record_generation(prompt_key, model, "final_chat", reply.latency, reply.completion_tokens)
                 
-                response_text = response.choices[0].message.content
+                response_text = reply.text
                 response_timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 
                 st.session_state.final_chat_messages.append({
@@ -0,0 +1,253 @@
+import argparse
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+import streamlit as st
+
+
+# ============================================================================
+# PROFILER DEI RERUN (OPZIONALE)
+# ============================================================================
+# Misura le sezioni etichettate di un rerun (caricamento cataloghi, accesso
+# a Sheets/store, chiamate al modello, ...) e mostra il dettaglio in un
+# expander in fondo alla pagina. Il resto del tempo finisce in "other"
+# (soprattutto rendering). Le durate si accumulano in istogrammi per app,
+# fase e sezione, salvati in profiles/<app>.json per confronti successivi:
+#   python profiler.py show profiles/study.json
+#   python profiler.py compare prima.json dopo.json
+#
+# Attivo con ?profile=1 nell'URL oppure STUDY_PROFILE=1 nell'ambiente; se
+# spento section() restituisce un context manager vuoto condiviso.
+PROFILE_ENV = os.environ.get("STUDY_PROFILE") == "1"
+PROFILES_DIR = os.environ.get(
+    "STUDY_PROFILE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+)
+FLUSH_INTERVAL_SECONDS = 10
+
+# Millisecondi, scala circa logaritmica
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+
+
+class _NoopSection:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSection()
+
+
+class _Section:
+    __slots__ = ("profile", "label", "start")
+
+    def __init__(self, profile, label):
+        self.profile = profile
+        self.label = label
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profile.sections.append((self.label, time.perf_counter() - self.start))
+        return False
+
+
+class RerunProfile:
+    """Sezioni misurate durante un singolo rerun."""
+
+    def __init__(self, app, enabled):
+        self.app = app
+        self.enabled = enabled
+        self.phase = None
+        self.sections = []
+        self.start = time.perf_counter()
+        self.end = None
+
+    def section(self, label):
+        """Context manager che misura il blocco come `label`."""
+        return _Section(self, label) if self.enabled else _NOOP
+
+    def breakdown(self):
+        """
+        Returns:
+            tuple: (totale in secondi, [(etichetta, secondi)] con "other" per
+                il tempo non coperto da sezioni)
+        """
+        total = (self.end or time.perf_counter()) - self.start
+        merged = {}
+        for label, seconds in self.sections:
+            merged[label] = merged.get(label, 0.0) + seconds
+        merged["other"] = max(0.0, total - sum(merged.values()))
+        return total, sorted(merged.items(), key=lambda item: item[1], reverse=True)
+
+
+class PhaseHistograms:
+    """Istogrammi delle durate per (fase, sezione), salvati periodicamente su file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self.data = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("buckets_ms") == list(BUCKETS_MS):
+                return data
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+        return {"buckets_ms": list(BUCKETS_MS), "phases": {}}
+
+    def add(self, phase, breakdown):
+        total, sections = breakdown
+        with self._lock:
+            phase_data = self.data["phases"].setdefault(str(phase), {})
+            for label, seconds in [("total", total)] + sections:
+                entry = phase_data.get(label)
+                if entry is None:
+                    entry = phase_data[label] = {"counts": [0] * (len(BUCKETS_MS) + 1), "sum_ms": 0.0, "n": 0}
+                ms = seconds * 1000
+                entry["counts"][bisect_left(BUCKETS_MS, ms)] += 1
+                entry["sum_ms"] += ms
+                entry["n"] += 1
+            due = time.monotonic() - self._last_flush >= FLUSH_INTERVAL_SECONDS
+            if due:
+                self._last_flush = time.monotonic()
+                snapshot = json.dumps(self.data)
+        if due:
+            self._write(snapshot)
+
+    def _write(self, snapshot):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(snapshot)
+        os.replace(tmp, self.path)
+
+
+@st.cache_resource
+def _histograms(app):
+    return PhaseHistograms(os.path.join(PROFILES_DIR, f"{app}.json"))
+
+
+def _enabled():
+    return PROFILE_ENV or st.query_params.get("profile") == "1"
+
+
+def begin_rerun(app):
+    """
+    Da chiamare all'inizio dello script.
+
+    Un rerun interrotto da st.rerun() non arriva a finish_rerun(): viene
+    chiuso qui, all'inizio del rerun successivo, e mostrato nell'overlay.
+    """
+    profile = RerunProfile(app, _enabled())
+    if profile.enabled:
+        previous = st.session_state.get("_profile_pending")
+        if previous is not None and previous.end is None:
+            previous.end = profile.start
+            _histograms(app).add(previous.phase, previous.breakdown())
+            st.session_state["_profile_previous"] = previous
+        st.session_state["_profile_pending"] = profile
+    return profile
+
+
+def _render_breakdown(title, profile):
+    total, sections = profile.breakdown()
+    st.markdown(f"**{title}** — fase {profile.phase}, {total * 1000:.1f} ms")
+    st.table([
+        {"sezione": label, "ms": round(seconds * 1000, 1), "%": round(100 * seconds / total, 1) if total else 0}
+        for label, seconds in sections
+    ])
+
+
+def finish_rerun(profile, extra=None):
+    """
+    Da chiamare in fondo allo script: registra il rerun e mostra l'overlay.
+
+    Args:
+        profile (RerunProfile): Profilo restituito da begin_rerun()
+        extra (dict): Tabelle aggiuntive da mostrare, {titolo: righe}
+    """
+    if not profile.enabled:
+        return
+    profile.end = time.perf_counter()
+    _histograms(profile.app).add(profile.phase, profile.breakdown())
+
+    with st.expander("⏱️ Profilo del rerun", expanded=False):
+        _render_breakdown("Questo rerun", profile)
+        previous = st.session_state.pop("_profile_previous", None)
+        if previous is not None:
+            _render_breakdown("Rerun precedente (terminato con st.rerun)", previous)
+        for title, rows in (extra or {}).items():
+            st.markdown(f"**{title}**")
+            st.table(rows)
+
+
+# ============================================================================
+# CONFRONTO DEI FILE DI ISTOGRAMMI
+# ============================================================================
+def percentile_ms(entry, q):
+    """Percentile approssimato (limite superiore del bucket)."""
+    target = q * entry["n"]
+    cumulative = 0
+    for bound, count in zip(BUCKETS_MS + (float("inf"),), entry["counts"]):
+        cumulative += count
+        if cumulative >= target:
+            return bound
+    return float("inf")
+
+
+def _summary_rows(data):
+    for phase, sections in sorted(data["phases"].items()):
+        for label, entry in sorted(sections.items()):
+            if entry["n"]:
+                yield (phase, label), entry
+
+
+def _load_file(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Istogrammi dei rerun per fase e sezione.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    show = sub.add_parser("show")
+    show.add_argument("path")
+    compare = sub.add_parser("compare")
+    compare.add_argument("before")
+    compare.add_argument("after")
+    args = parser.parse_args()
+
+    if args.command == "show":
+        print(f"{'fase':6s} {'sezione':22s} {'n':>7s} {'media ms':>10s} {'p50':>8s} {'p95':>8s}")
+        for (phase, label), entry in _summary_rows(_load_file(args.path)):
+            print(f"{phase:6s} {label:22s} {entry['n']:7d} {entry['sum_ms'] / entry['n']:10.1f} "
+                  f"{percentile_ms(entry, 0.5):8} {percentile_ms(entry, 0.95):8}")
+    else:
+        before = dict(_summary_rows(_load_file(args.before)))
+        after = dict(_summary_rows(_load_file(args.after)))
+        print(f"{'fase':6s} {'sezione':22s} {'media prima':>12s} {'media dopo':>12s} {'delta':>8s}")
+        for key in sorted(set(before) | set(after)):
+            b, a = before.get(key), after.get(key)
+            mean_b = b["sum_ms"] / b["n"] if b else None
+            mean_a = a["sum_ms"] / a["n"] if a else None
+            delta = f"{(mean_a - mean_b) / mean_b * 100:+.0f}%" if mean_a is not None and mean_b else "-"
+            fmt = lambda v: f"{v:12.1f}" if v is not None else f"{'-':>12s}"
+            print(f"{key[0]:6s} {key[1]:22s} {fmt(mean_b)} {fmt(mean_a)} {delta:>8s}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+import argparse
+import json
+import os
+import statistics
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from catalogs import load_catalog
+from llm import CHAT_MODEL, build_system_prompt, greeting_messages, api_messages, complete, generation_profile, MockOpenAI
+from session_codec import decode_rows
+from transcript_store import LazyTranscript, is_transcript_ref, open_sheet_transcripts, open_transcript_store
+
+
+# ============================================================================
+# REPLAY DELLE CONVERSAZIONI REGISTRATE
+# ============================================================================
+# Ri-esegue i turni utente delle conversazioni salvate con i prompt attuali
+# di prompts.json (e il modello scelto), per confrontare latenza, token e
+# lunghezza delle risposte con quelle originali.
+#
+# Uso:
+#   python replay.py --csv results.csv --mock
+#   python replay.py --csv results.csv --transcripts-url URL --credentials service_account.json
+#   python replay.py --sheet-url URL --credentials service_account.json --workers 8
+#   python replay.py --checkpoints --limit 20 --model gpt-4o-mini --out replay.json
+#
+# Senza --mock serve OPENAI_API_KEY nell'ambiente. Le righe di un export CSV
+# contengono solo il riferimento "sha256:..." alla conversazione: con
+# --transcripts-url si risolve sul worksheet "transcripts" del foglio,
+# altrimenti su local_store (TRANSCRIPT_STORE=local). Le sessioni con un
+# riferimento non risolvibile vengono saltate e contate nel riepilogo.
+MAX_ROUNDS = 10
+DEFAULT_WORKERS = 4
+
+
+# ============================================================================
+# SORGENTI DELLE SESSIONI
+# ============================================================================
+def resolve_messages(cell, transcripts):
+    """
+    Conversazione di una riga (JSON in linea o riferimento "sha256:...").
+
+    Returns:
+        list | None: None se il riferimento non è nell'archivio (o è incompleto)
+    """
+    if not is_transcript_ref(cell):
+        return cell
+    if transcripts is None:
+        return None
+    try:
+        return LazyTranscript(cell, transcripts).messages
+    except (KeyError, ValueError):
+        return None
+
+
+def sessions_from_rows(rows, transcripts=None, unresolved=None):
+    """
+    Sessioni dalle righe del foglio risultati (qualunque layout "study").
+
+    Args:
+        transcripts: Archivio da cui risolvere i riferimenti alle conversazioni
+        unresolved (list): Riceve i Prolific ID delle righe saltate perché il
+            riferimento non si risolve
+    """
+    sessions = []
+    for record in decode_rows(rows, "study"):
+        messages = resolve_messages(record["messages"], transcripts)
+        if messages is None and is_transcript_ref(record["messages"]):
+            if unresolved is not None:
+                unresolved.append(record["prolific_id"])
+            continue
+        sessions.append({
+            "prolific_id": record["prolific_id"],
+            "prompt_key": record["prompt_key"],
+            "norm_key": record["norm_key"],
+            "initial_opinion": record["initial_opinion"] or {},
+            "messages": messages or [],
+        })
+    return sessions
+
+
+def sessions_from_csv(path, transcripts=None, unresolved=None):
+    import csv
+
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return sessions_from_rows(list(csv.reader(f)), transcripts, unresolved)
+
+
+def sessions_from_sheet(sheet_url, credentials_path, unresolved=None):
+    import gspread
+
+    spreadsheet = gspread.service_account(filename=credentials_path).open_by_url(sheet_url)
+    return sessions_from_rows(spreadsheet.sheet1.get_all_values(), open_transcript_store(spreadsheet), unresolved)
+
+
+def csv_transcripts(transcripts_url=None, credentials_path=None):
+    """Archivio per i riferimenti di un export CSV: il foglio indicato o local_store."""
+    if transcripts_url:
+        return open_sheet_transcripts(transcripts_url, credentials_path)
+    return open_transcript_store()
+
+
+def print_unresolved(unresolved):
+    if unresolved:
+        print(f"{len(unresolved)} sessioni saltate: conversazione non trovata nell'archivio "
+              f"(export CSV: usa --transcripts-url con --credentials)")
+
+
+def sessions_from_checkpoints():
+    """Sessioni dai checkpoint locali (anche non concluse)."""
+    from local_store import get_store
+
+    sessions = []
+    for pid, state in get_store().items("checkpoints"):
+        if not state.get("messages") or not state.get("prompt_key"):
+            continue
+        sessions.append({
+            "prolific_id": pid,
+            "prompt_key": state["prompt_key"],
+            "norm_key": state["norm_key"],
+            "initial_opinion": state.get("initial_opinion") or {},
+            "messages": [{"role": m["role"], "content": m["content"], "timestamp": m.get("timestamp")}
+                         for m in state["messages"]],
+        })
+    return sessions
+
+
+# ============================================================================
+# REPLAY
+# ============================================================================
+def _seconds_between(start, end):
+    try:
+        return (datetime.fromisoformat(end) - datetime.fromisoformat(start)).total_seconds()
+    except (TypeError, ValueError):
+        return None
+
+
+def original_turns(messages):
+    """Risposte dell'assistente registrate: lunghezza e latenza dai timestamp."""
+    turns = []
+    previous = None
+    for m in messages:
+        if m["role"] == "assistant":
+            latency = None
+            if previous is not None and previous["role"] == "user":
+                latency = _seconds_between(previous.get("timestamp"), m.get("timestamp"))
+            turns.append({
+                "latency": latency,
+                "chars": len(m["content"]),
+                "words": len(m["content"].split()),
+            })
+        previous = m
+    return turns
+
+
+def replay_session(client, session, prompts, norms, model=CHAT_MODEL, **params):
+    """
+    Ri-esegue una sessione: saluto iniziale e poi ogni turno utente registrato,
+    con le risposte nuove (non quelle originali) nella cronologia.
+
+    Returns:
+        dict: prolific_id, condizione e turni {latency, prompt_tokens,
+            completion_tokens, chars, words}; "error" se la condizione non
+            esiste più nei cataloghi
+    """
+    result = {
+        "prolific_id": session["prolific_id"],
+        "prompt_key": session["prompt_key"],
+        "norm_key": session["norm_key"],
+        "original": original_turns(session["messages"]),
+        "replay": [],
+    }
+    prompt_data = prompts.get(session["prompt_key"])
+    norm_data = norms.get(session["norm_key"])
+    if prompt_data is None or norm_data is None:
+        result["error"] = "condizione non presente in prompts.json/norms.json"
+        return result
+
+    initial_opinion = session["initial_opinion"].get(norm_data["title"], 50)
+    system_prompt = build_system_prompt(prompt_data, norm_data["title"], initial_opinion)
+    # Come nelle app, il profilo di generazione del template ha la precedenza su --model
+    model, profile = generation_profile(prompt_data, model)
+    params = dict(params, **profile)
+
+    def record(completion):
+        result["replay"].append({
+            "latency": completion.latency,
+            "prompt_tokens": completion.prompt_tokens,
+            "completion_tokens": completion.completion_tokens,
+            "chars": len(completion.text),
+            "words": len(completion.text.split()),
+        })
+
+    greeting = complete(client, greeting_messages(system_prompt), model=model, **params)
+    record(greeting)
+
+    history = [{"role": "assistant", "content": greeting.text}]
+    user_turns = [m["content"] for m in session["messages"] if m["role"] == "user"]
+    for content in user_turns[:MAX_ROUNDS]:
+        history.append({"role": "user", "content": content})
+        completion = complete(client, api_messages(system_prompt, history), model=model, **params)
+        record(completion)
+        history.append({"role": "assistant", "content": completion.text})
+    return result
+
+
+def replay_all(client, sessions, prompts, norms, workers=DEFAULT_WORKERS, **kwargs):
+    """Replay in parallelo con al più `workers` sessioni in corso."""
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(replay_session, client, s, prompts, norms, **kwargs) for s in sessions]
+        for future in as_completed(futures):
+            results.append(future.result())
+    return results
+
+
+# ============================================================================
+# REPORT
+# ============================================================================
+def distribution(values):
+    """n, media, mediana e 95° percentile (None se non ci sono valori)."""
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    return {
+        "n": len(values),
+        "mean": statistics.fmean(values),
+        "p50": values[len(values) // 2],
+        "p95": values[min(len(values) - 1, int(0.95 * len(values)))],
+    }
+
+
+def summarize(results):
+    """Distribuzioni per metrica, originali accanto al replay."""
+    original = [t for r in results for t in r["original"]]
+    replayed = [t for r in results for t in r["replay"]]
+    summary = {}
+    for metric in ("latency", "prompt_tokens", "completion_tokens", "chars", "words"):
+        summary[metric] = {
+            "original": distribution(t.get(metric) for t in original),
+            "replay": distribution(t.get(metric) for t in replayed),
+        }
+    return summary
+
+
+def _format(dist):
+    if dist is None:
+        return f"{'-':>29s}"
+    return f"{dist['mean']:9.1f} {dist['p50']:9.1f} {dist['p95']:9.1f}"
+
+
+def print_summary(summary, n_sessions, n_errors):
+    print(f"Sessioni: {n_sessions} (saltate: {n_errors})")
+    print(f"{'':18s} {'originale (media/p50/p95)':>30s}   {'replay (media/p50/p95)':>30s}")
+    for metric, dists in summary.items():
+        print(f"{metric:18s} {_format(dists['original'])}   {_format(dists['replay'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay delle conversazioni registrate con i prompt attuali.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--csv", help="Export CSV del foglio risultati")
+    source.add_argument("--sheet-url", help="URL del foglio risultati")
+    source.add_argument("--checkpoints", action="store_true", help="Checkpoint in local_store")
+    parser.add_argument("--transcripts-url", help="Foglio da cui risolvere le conversazioni dell'export CSV")
+    parser.add_argument("--credentials", help="JSON del service account (con --sheet-url o --transcripts-url)")
+    parser.add_argument("--prompts", default="prompts.json")
+    parser.add_argument("--norms", default="norms.json")
+    parser.add_argument("--model", default=CHAT_MODEL)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--limit", type=int, help="Solo le prime N sessioni")
+    parser.add_argument("--mock", action="store_true", help="Usa MockOpenAI invece dell'API")
+    parser.add_argument("--out", help="Salva risultati per sessione e riepilogo in JSON")
+    args = parser.parse_args()
+
+    if (args.sheet_url or args.transcripts_url) and not args.credentials:
+        parser.error("--sheet-url e --transcripts-url richiedono --credentials")
+    unresolved = []
+    if args.csv:
+        sessions = sessions_from_csv(args.csv, csv_transcripts(args.transcripts_url, args.credentials), unresolved)
+    elif args.sheet_url:
+        sessions = sessions_from_sheet(args.sheet_url, args.credentials, unresolved)
+    else:
+        sessions = sessions_from_checkpoints()
+    print_unresolved(unresolved)
+    sessions = sessions[:args.limit] if args.limit else sessions
+
+    if args.mock:
+        client = MockOpenAI()
+    else:
+        from openai import OpenAI
+        client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+
+    results = replay_all(
+        client, sessions, load_catalog(args.prompts), load_catalog(args.norms),
+        workers=args.workers, model=args.model
+    )
+    ok = [r for r in results if "error" not in r]
+    summary = summarize(ok)
+    print_summary(summary, len(results), len(results) - len(ok))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "sessions": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
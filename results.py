@@ -0,0 +1,258 @@
+import copy
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from session_codec import current_layout, encode_row
+
+
+# ============================================================================
+# FOGLIO RISULTATI: QUERY E COSTRUZIONE DELLE RIGHE
+# ============================================================================
+# Funzioni pure (nessuna dipendenza da Streamlit) condivise dalle app e dai
+# benchmark in benchmarks/.
+
+# Colonne della riga salvata da streamlit_app.py, nell'ordine del foglio
+RESULT_COLUMNS = current_layout("study").columns
+
+
+def column_letter(index):
+    """Lettera A1 della colonna (index a partire da 1)."""
+    letters = ""
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+class ResultsSheet:
+    """
+    Accesso al foglio risultati per colonne con nome.
+
+    Legge solo le colonne richieste (batch_get su intervalli "B2:B") e tiene
+    in memoria quanto già letto: le letture successive chiedono, per ogni
+    colonna, solo le righe che non ha ancora in memoria (le colonne possono
+    essere aggiornate in momenti diversi). La colonna A (Prolific ID, sempre
+    presente e corta) viene letta insieme alle altre e fa da contatore righe.
+
+    Thread-safe: un'istanza è condivisa da tutte le sessioni del server.
+    """
+
+    # Ogni tanto si rilegge tutto, nel caso qualcuno abbia modificato il foglio a mano
+    FULL_REFRESH_SECONDS = 600
+
+    def __init__(self, sheet, columns=RESULT_COLUMNS, header_rows=1):
+        self.sheet = sheet
+        self.positions = {name: i + 1 for i, name in enumerate(columns)}
+        self.header_rows = header_rows
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.watermark = self.header_rows  # ultima riga già letta della colonna A
+        self._columns = {}
+        self._pid_index = set()
+        self._aggregates = {}
+        self._loaded_at = time.monotonic()
+
+    def _fetch_new_rows(self, names):
+        """Legge le righe nuove delle colonne indicate (più la colonna A)."""
+        wanted = ["prolific_id"] + [n for n in names if n != "prolific_id"]
+
+        ranges, targets = [], []
+        for name in wanted:
+            letter = column_letter(self.positions[name])
+            # Ogni colonna riparte dalla prima riga che non ha in memoria: una
+            # colonna non letta in un refresh recupera qui le righe saltate
+            first = self.header_rows + 1 + len(self._columns.get(name, ()))
+            ranges.append(f"{letter}{first}:{letter}")
+            targets.append((name, first))
+
+        results = self.sheet.batch_get(ranges)
+
+        new_pids = [r[0] if r else "" for r in results[0]]
+        last_row = max(self.watermark, targets[0][1] + len(new_pids) - 1)
+
+        for (name, first), values in zip(targets, results):
+            # Allinea alla lunghezza data dalla colonna A (le celle vuote in fondo non arrivano dall'API)
+            n = last_row - first + 1
+            cells = [r[0] if r else "" for r in values][:n]
+            cells += [""] * (n - len(cells))
+            self._columns.setdefault(name, []).extend(cells)
+
+        self._pid_index.update(v.strip().lower() for v in new_pids if v)
+        self.watermark = last_row
+
+    def _refresh(self, names):
+        if time.monotonic() - self._loaded_at > self.FULL_REFRESH_SECONDS:
+            self.reset()
+        self._fetch_new_rows(names)
+
+    def fetch(self, *names):
+        """
+        Colonne richieste, aggiornate alle ultime righe del foglio.
+
+        Returns:
+            dict: {nome colonna: lista di valori, una per riga dati}
+        """
+        with self._lock:
+            self._refresh(names)
+            return {name: list(self._columns[name]) for name in names}
+
+    def aggregate(self, key, names, update, initial):
+        """
+        Aggregato mantenuto in modo incrementale sulle colonne indicate.
+
+        Args:
+            key (str): Nome dell'aggregato
+            names (tuple): Colonne da cui dipende
+            update (callable): update(acc, {colonna: nuovi valori}) -> acc
+            initial (callable): Valore iniziale dell'aggregato
+
+        Returns:
+            Copia dell'aggregato aggiornato alle ultime righe
+        """
+        with self._lock:
+            self._refresh(names)
+            seen, acc = self._aggregates.get(key, (0, initial()))
+            total = len(self._columns[names[0]])
+            if total > seen:
+                acc = update(acc, {name: self._columns[name][seen:] for name in names})
+            self._aggregates[key] = (total, acc)
+            return copy.copy(acc)
+
+    def has_prolific_id(self, prolific_id):
+        """Ricerca case-insensitive del Prolific ID (indice in memoria sulla colonna A)."""
+        with self._lock:
+            self._refresh(["prolific_id"])
+            return prolific_id.strip().lower() in self._pid_index
+
+    @property
+    def row_count(self):
+        """Righe dati lette finora (senza intestazione)."""
+        return self.watermark - self.header_rows
+
+
+_views = {}
+_views_lock = threading.Lock()
+
+
+def results_view(sheet):
+    """ResultsSheet condiviso per il worksheet indicato."""
+    spreadsheet = getattr(sheet, "spreadsheet", None)
+    key = (getattr(spreadsheet, "id", None), getattr(sheet, "id", None))
+    if key == (None, None):
+        key = id(sheet)
+    with _views_lock:
+        view = _views.get(key)
+        if view is None:
+            view = _views[key] = ResultsSheet(sheet)
+        # Le app riaprono il worksheet a ogni rerun: si usa sempre l'ultimo oggetto
+        view.sheet = sheet
+        return view
+
+
+def check_prolific_id_exists(sheet, prolific_id):
+    """True se il Prolific ID compare già nella colonna A del foglio."""
+    return results_view(sheet).has_prolific_id(prolific_id)
+
+
+def _count_combinations(counts, columns):
+    counts.update(zip(columns["prompt_key"], columns["norm_key"]))
+    return counts
+
+
+def get_least_used_combination(sheet, prompts, norms):
+    """Sceglie a caso una delle combinazioni (prompt, norma) meno usate."""
+    used = results_view(sheet).aggregate("combinations", ("prompt_key", "norm_key"), _count_combinations, Counter)
+    counts = {(p, n): used.get((p, n), 0) for p in prompts for n in norms}
+    min_count = min(counts.values())
+    return random.choice([k for k, v in counts.items() if v == min_count])
+
+
+def save_to_google_sheets(sheet, row):
+    sheet.append_row(row, value_input_option="RAW")
+
+
+def build_session_row(state, messages, involvement_responses, threat_responses, source_responses, end_time,
+                      transcript=None):
+    """
+    Riga finale salvata da streamlit_app.py al termine dello studio.
+
+    Args:
+        state (Mapping): Stato della sessione (st.session_state o un dict)
+        messages (list): Messaggi della conversazione come dict
+        involvement_responses (dict): Risposte Likert "involvement"
+        threat_responses (dict): Risposte Likert "threat"
+        source_responses (dict): Risposte Likert "source"
+        end_time (float): time.time() al submit
+        transcript (str): Riferimento "sha256:..." della conversazione già
+            salvata in transcript_store; se assente il JSON va nella cella
+
+    Returns:
+        list: Valori della riga, nell'ordine delle colonne del foglio
+    """
+    user_messages = [m for m in messages if m["role"] == "user"]
+    user_word_count = sum(len(m["content"].split()) for m in user_messages)
+
+    return encode_row("study", {
+        "prolific_id": state["prolific_id"],
+        "prompt_key": state["prompt_key"],
+        "norm_key": state["norm_key"],
+        "initial_opinion": state["initial_opinion"],
+        "messages": transcript or messages,
+        "final_opinion": state["final_opinion"],
+        "opinions_others": state["opinions_others"],
+        "opinions_others_final": state["opinions_others_final"],
+        "att_check": state.get("att_check_response_saved", ""),
+        "involvement": involvement_responses,
+        "threat": threat_responses,
+        "source": source_responses,
+        "comp_response": state.get("comp_response_saved", ""),
+        "comp_correct": state["comp_correct"],
+
+        # Parallel
+        "parallel_comp_time": state["parallel_comp_time"],
+        "parallel_engagement_time": state["parallel_engagement_time"],
+
+        # Sequential
+        "sequential_comp_time": state["sequential_comp_time"],
+        "sequential_engagement_time": state["sequential_engagement_time"],
+
+        # Interaction
+        "interaction_comp_time": state["interaction_comp_time"],
+        "interaction_engagement_time": state["interaction_engagement_time"],
+
+        # Engagement content
+        "engagement_text": state.get("engagement_text_saved", ""),
+        "engagement_word_count": state["engagement_word_count"],
+
+        "user_messages": len(user_messages),
+        "user_word_count": user_word_count,
+        "total_duration": end_time - state["start_time"],
+        "timestamp": datetime.now().isoformat(),
+
+        # Raw browser timing batch for phase 1 (events + clock offset)
+        "client_timing": state.get("phase1_client_timing") or {},
+    })
+
+
+# ============================================================================
+# DATI USATI DA test_epistemia.py
+# ============================================================================
+def text_tracking_record(text_tracking):
+    """Snapshot del testo per secondo, indicizzati per ora leggibile (None se vuoto)."""
+    if not text_tracking:
+        return None
+    formatted_tracking = {}
+    for timestamp, text_data in sorted(text_tracking.items()):
+        readable_time = datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+        formatted_tracking[readable_time] = {
+            "timestamp": timestamp,
+            "text": text_data["text"],
+            "word_count": text_data["word_count"],
+            "char_count": text_data["char_count"]
+        }
+    return formatted_tracking
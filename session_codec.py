@@ -0,0 +1,259 @@
+import base64
+import json
+import re
+import threading
+import zlib
+
+
+# ============================================================================
+# CODIFICA DELLE RIGHE SALVATE DALLE APP
+# ============================================================================
+# Un solo punto dove è definito l'ordine delle colonne di ogni app. Ogni riga
+# nuova termina con un marcatore di schema ("study@1") così che le righe di
+# layout diversi possano convivere nello stesso foglio; le righe storiche
+# senza marcatore vengono riconosciute dal numero di colonne.
+#
+# Campi JSON: separatori compatti, e oltre COMPRESS_MIN_CHARS caratteri
+# zlib + base64 con prefisso "z:" (il JSON non può iniziare con "z:", quindi
+# la decodifica è senza ambiguità). I campi di testo libero non vengono mai
+# compressi.
+COMPRESS_MIN_CHARS = 1024
+COMPRESSED_PREFIX = "z:"
+SCHEMA_COLUMN = "schema"
+
+_TAG_RE = re.compile(r"^([a-z_]+)@(\d+)$")
+
+
+class Field:
+    """
+    Colonna di un layout.
+
+    kind: "text" (stringa così com'è), "json", "number", "bool",
+    "transcript" (riferimento "sha256:..." oppure JSON in linea).
+    """
+
+    __slots__ = ("name", "kind")
+
+    def __init__(self, name, kind="text"):
+        self.name = name
+        self.kind = kind
+
+
+class Layout:
+    """Ordine delle colonne di un'app a una certa versione (0 = storico, senza marcatore)."""
+
+    def __init__(self, app, version, fields):
+        self.app = app
+        self.version = version
+        self.fields = fields
+
+    @property
+    def columns(self):
+        return [f.name for f in self.fields]
+
+    @property
+    def tag(self):
+        return f"{self.app}@{self.version}" if self.version else None
+
+    @property
+    def width(self):
+        return len(self.fields) + (1 if self.version else 0)
+
+    def header(self):
+        return self.columns + ([SCHEMA_COLUMN] if self.version else [])
+
+
+def _fields(*specs):
+    return [Field(*spec) if isinstance(spec, tuple) else Field(spec) for spec in specs]
+
+
+_STUDY_FIELDS = _fields(
+    "prolific_id", "prompt_key", "norm_key",
+    ("initial_opinion", "json"), ("messages", "transcript"), ("final_opinion", "json"),
+    ("opinions_others", "json"), ("opinions_others_final", "json"),
+    "att_check", ("involvement", "json"), ("threat", "json"), ("source", "json"),
+    "comp_response", ("comp_correct", "bool"),
+    ("parallel_comp_time", "number"), ("parallel_engagement_time", "number"),
+    ("sequential_comp_time", "number"), ("sequential_engagement_time", "number"),
+    ("interaction_comp_time", "number"), ("interaction_engagement_time", "number"),
+    "engagement_text", ("engagement_word_count", "number"),
+    ("user_messages", "number"), ("user_word_count", "number"), ("total_duration", "number"),
+    "timestamp", ("client_timing", "json"),
+)
+
+_M_FIELDS = _fields(
+    "prolific_id", "prompt_key", "norm_key", ("initial_opinion", "number"),
+    ("conversation", "json"), ("final_opinion", "number"), "timestamp",
+)
+
+_PILOT_FIELDS = _fields(
+    "prolific_id", "prompt_key", "norm_key", ("conversation", "json"), "argumentation", "timestamp",
+)
+
+_EPISTEMIA_FIELDS = _fields(
+    "prolific_id", "prompt_key", "prompt_title", "argumentation",
+    ("text_tracking", "json"), ("final_chat", "json"), "timestamp",
+)
+
+# Per ogni app: layout corrente per primo, poi quelli storici
+LAYOUTS = {
+    "study": [
+        Layout("study", 1, _STUDY_FIELDS),
+        Layout("study", 0, _STUDY_FIELDS),
+        Layout("study", 0, _STUDY_FIELDS[:-1]),  # prima del timing lato browser
+    ],
+    "m": [Layout("m", 1, _M_FIELDS), Layout("m", 0, _M_FIELDS)],
+    "pilot": [Layout("pilot", 1, _PILOT_FIELDS), Layout("pilot", 0, _PILOT_FIELDS)],
+    "epistemia": [Layout("epistemia", 1, _EPISTEMIA_FIELDS), Layout("epistemia", 0, _EPISTEMIA_FIELDS)],
+}
+
+
+def current_layout(app):
+    return LAYOUTS[app][0]
+
+
+# ============================================================================
+# CELLE
+# ============================================================================
+def encode_json(value):
+    """JSON compatto, compresso se lungo."""
+    text = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    if len(text) < COMPRESS_MIN_CHARS:
+        return text
+    packed = COMPRESSED_PREFIX + base64.b64encode(zlib.compress(text.encode("utf-8"), 9)).decode("ascii")
+    return packed if len(packed) < len(text) else text
+
+
+def decode_json(cell, default=None):
+    """Inverso di encode_json; accetta anche il JSON indentato delle righe storiche."""
+    if not cell:
+        return default
+    try:
+        if cell.startswith(COMPRESSED_PREFIX):
+            cell = zlib.decompress(base64.b64decode(cell[len(COMPRESSED_PREFIX):])).decode("utf-8")
+        return json.loads(cell)
+    except (ValueError, zlib.error):
+        return default
+
+
+def encode_cell(value, kind):
+    if value is None:
+        return ""
+    if kind == "json":
+        return encode_json(value)
+    if kind == "transcript":
+        return value if isinstance(value, str) else encode_json(value)
+    return value if kind in ("number", "bool") else str(value)
+
+
+def decode_cell(cell, kind):
+    if kind == "json":
+        return decode_json(cell)
+    if kind == "transcript":
+        return cell if cell.startswith("sha256:") else decode_json(cell, default=[])
+    if kind == "number":
+        if cell in ("", None):
+            return None
+        if isinstance(cell, (int, float)):
+            return cell
+        try:
+            return int(cell)
+        except ValueError:
+            try:
+                return float(cell)
+            except ValueError:
+                return None
+    if kind == "bool":
+        return cell if isinstance(cell, bool) else str(cell).strip().lower() == "true"
+    return cell
+
+
+# ============================================================================
+# RIGHE
+# ============================================================================
+def encode_row(app, record):
+    """
+    Riga da salvare per l'app, nel layout corrente.
+
+    Args:
+        app (str): "study", "m", "pilot" o "epistemia"
+        record (dict): Valori per nome di colonna (quelli assenti restano vuoti)
+
+    Returns:
+        list: Celle della riga, con il marcatore di schema in fondo
+    """
+    layout = current_layout(app)
+    row = [encode_cell(record.get(f.name), f.kind) for f in layout.fields]
+    row.append(layout.tag)
+    return row
+
+
+def detect_layout(row, app):
+    """Layout di una riga: dal marcatore se presente, altrimenti dal numero di colonne."""
+    cells = list(row)
+    while cells and cells[-1] == "":
+        cells.pop()
+    if cells:
+        match = _TAG_RE.match(str(cells[-1]))
+        if match:
+            tagged_app, version = match.group(1), int(match.group(2))
+            for layout in LAYOUTS.get(tagged_app, []):
+                if layout.version == version:
+                    return layout
+    legacy = [layout for layout in LAYOUTS[app] if not layout.version]
+    # Celle vuote in fondo non arrivano dall'API: si sceglie il layout più
+    # corto che contiene tutte le celle presenti
+    for layout in sorted(legacy, key=lambda l: l.width):
+        if len(cells) <= layout.width:
+            return layout
+    return legacy[0]
+
+
+def decode_row(row, app):
+    """
+    Riga del foglio come dict {colonna: valore decodificato}.
+
+    La chiave "_schema" indica il layout riconosciuto ("study@1", "study@0", ...).
+    """
+    layout = detect_layout(row, app)
+    record = {}
+    for i, field in enumerate(layout.fields):
+        cell = row[i] if i < len(row) else ""
+        record[field.name] = decode_cell(cell, field.kind)
+    record["_schema"] = f"{layout.app}@{layout.version}"
+    return record
+
+
+def is_header(row):
+    """True per una riga di intestazione (di qualunque layout noto)."""
+    first = str(row[0]).strip().lower().replace(" ", "_") if row else ""
+    return first in ("prolific_id", "prolificid")
+
+
+def decode_rows(values, app):
+    """Decodifica tutte le righe (l'eventuale intestazione viene saltata)."""
+    return [decode_row(row, app) for row in values if row and not is_header(row)]
+
+
+# ============================================================================
+# INTESTAZIONE
+# ============================================================================
+_headers_checked = set()
+_headers_lock = threading.Lock()
+
+
+def ensure_header(sheet, app):
+    """
+    Scrive l'intestazione del layout corrente se il foglio è vuoto.
+
+    Controllato una sola volta per processo e per foglio; un'intestazione
+    già presente (anche di un layout storico) non viene toccata.
+    """
+    spreadsheet = getattr(sheet, "spreadsheet", None)
+    key = (getattr(spreadsheet, "id", None), getattr(sheet, "id", None), app)
+    with _headers_lock:
+        if key in _headers_checked:
+            return
+        if not sheet.row_values(1):
+            sheet.append_row(current_layout(app).header(), value_input_option="RAW")
+        _headers_checked.add(key)
@@ -0,0 +1,270 @@
+import sys
+import threading
+import time
+import weakref
+
+import streamlit as st
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from local_store import get_store
+from metrics import REGISTRY
+from study_logging import get_logger
+
+log = get_logger("session_footprint")
+
+
+# ============================================================================
+# MESSAGGI COMPATTI
+# ============================================================================
+class Message:
+    """
+    Messaggio della conversazione con __slots__ al posto di un dict.
+
+    Supporta l'accesso m["role"] / m.get("timestamp") usato dalle app, così
+    può sostituire i dict senza toccare il codice di rendering. I ruoli sono
+    internati: tutte le sessioni condividono la stessa stringa "user".
+    """
+    __slots__ = ("role", "content", "timestamp")
+
+    def __init__(self, role, content, timestamp=None):
+        self.role = sys.intern(role)
+        self.content = content
+        self.timestamp = timestamp
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def to_dict(self):
+        return {"role": self.role, "content": self.content, "timestamp": self.timestamp}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["role"], data["content"], data.get("timestamp"))
+
+    def __repr__(self):
+        return f"Message(role={self.role!r}, content={self.content[:30]!r}..., timestamp={self.timestamp!r})"
+
+
+def messages_to_dicts(messages):
+    """Converte una lista di Message (o dict) in dict serializzabili in JSON."""
+    return [m.to_dict() if isinstance(m, Message) else m for m in messages]
+
+
+# ============================================================================
+# MISURA DELLO STATO DI SESSIONE
+# ============================================================================
+def deep_sizeof(obj, _seen=None):
+    """
+    Dimensione in byte di un oggetto e di tutto ciò che contiene.
+
+    Gli oggetti condivisi (stessa identità) vengono contati una sola volta.
+    """
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, _seen) + deep_sizeof(v, _seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, _seen) for item in obj)
+    elif hasattr(obj, "__slots__"):
+        size += sum(deep_sizeof(getattr(obj, s), _seen) for s in obj.__slots__ if hasattr(obj, s))
+    elif hasattr(obj, "__dict__"):
+        size += deep_sizeof(vars(obj), _seen)
+    return size
+
+
+def state_footprint(state=None):
+    """
+    Byte occupati da ciascuna chiave dello stato di sessione.
+
+    Args:
+        state (Mapping): Stato da misurare (default: st.session_state)
+
+    Returns:
+        list: Coppie (chiave, byte) ordinate dalla più grande
+    """
+    if state is None:
+        state = st.session_state
+    sizes = [(str(k), deep_sizeof(state[k])) for k in list(state.keys())]
+    return sorted(sizes, key=lambda x: x[1], reverse=True)
+
+
+def render_footprint_panel():
+    """Mostra lo stato della sessione e del server (solo con ?debug_state=1)."""
+    if st.query_params.get("debug_state") != "1":
+        return
+    with st.expander("Session state footprint"):
+        footprint = state_footprint()
+        st.markdown(f"**Questa sessione:** {sum(s for _, s in footprint)} byte")
+        st.table([{"key": k, "bytes": s} for k, s in footprint])
+        st.markdown("**Sessioni attive sul server:**")
+        st.table(get_registry().report())
+
+
+# ============================================================================
+# REGISTRO DELLE SESSIONI ED EVICTION DELLE SESSIONI INATTIVE
+# ============================================================================
+EVICTED_NAMESPACE = "evicted_sessions"
+IDLE_TIMEOUT_SECONDS = 30 * 60
+SWEEP_INTERVAL_SECONDS = 60
+
+
+SESSION_EVICTIONS = REGISTRY.counter(
+    "study_session_evictions_total", "Sessioni inattive scaricate nello store, per esito", ("outcome",)
+)
+
+
+def _runtime_has_session(session_id):
+    """False se il runtime di Streamlit ha già chiuso la sessione (o l'ha dimenticata)."""
+    if not Runtime.exists():
+        # Modalità bare / AppTest: non c'è un session manager da interrogare
+        return True
+    return Runtime.instance().is_active_session(session_id)
+
+
+class SessionRegistry:
+    """
+    Tiene traccia delle sessioni attive nel processo e, periodicamente,
+    sposta nello store locale lo stato delle sessioni inattive da più di
+    IDLE_TIMEOUT_SECONDS, liberando la memoria. Se la sessione torna (stesso
+    session id, es. riconnessione del websocket) lo stato viene ripristinato.
+
+    Il registro non tiene in vita gli stati (li referenzia con weakref) e
+    dimentica le sessioni che il runtime non considera più attive: quelle le
+    libera già Streamlit.
+    """
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT_SECONDS, sweep_interval=SWEEP_INTERVAL_SECONDS):
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self._sessions = {}  # session_id -> [weakref a SafeSessionState, last_seen]
+        self._evicted = set()  # session_id con lo stato nello store
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+        REGISTRY.gauge(
+            "study_active_sessions", "Sessioni in memoria per fase", ("phase",), callback=self.phase_counts
+        )
+
+    def touch(self):
+        """Da chiamare all'inizio di ogni rerun."""
+        ctx = get_script_run_ctx()
+        if ctx is None:
+            return
+        now = time.time()
+
+        with self._lock:
+            self._sessions[ctx.session_id] = [weakref.ref(ctx.session_state), now]
+            evicted = ctx.session_id in self._evicted
+            self._evicted.discard(ctx.session_id)
+            sweep_due = now - self._last_sweep >= self.sweep_interval
+            if sweep_due:
+                self._last_sweep = now
+
+        # Lo store si legge solo per le sessioni scaricate da questo processo
+        if evicted:
+            self._restore(ctx.session_id)
+        if sweep_due:
+            self.evict_idle(now)
+
+    def _restore(self, session_id):
+        saved = get_store().pop(EVICTED_NAMESPACE, session_id)
+        if not saved:
+            return
+        for key, value in saved.items():
+            try:
+                st.session_state[key] = value
+            except Exception:
+                # Chiavi di widget non impostabili (es. bottoni): si ricreano da sole
+                pass
+
+    def _live_states(self):
+        """Coppie (session_id, [stato, last_seen]) delle sessioni ancora in memoria."""
+        with self._lock:
+            sessions = list(self._sessions.items())
+        live = []
+        for sid, (ref, last_seen) in sessions:
+            state = ref()
+            if state is not None:
+                live.append((sid, [state, last_seen]))
+        return live
+
+    def evict_idle(self, now=None):
+        """
+        Sposta nello store lo stato delle sessioni inattive.
+
+        Le sessioni chiuse dal runtime (o il cui stato è già stato raccolto)
+        vengono solo tolte dal registro.
+
+        Returns:
+            int: Numero di sessioni scaricate dalla memoria
+        """
+        now = now or time.time()
+        idle = []
+        with self._lock:
+            for sid, (ref, last_seen) in list(self._sessions.items()):
+                state = ref()
+                if state is None or not _runtime_has_session(sid):
+                    del self._sessions[sid]
+                elif now - last_seen > self.idle_timeout:
+                    del self._sessions[sid]
+                    idle.append((sid, state))
+
+        store = get_store()
+        evicted = 0
+        for sid, state in idle:
+            try:
+                snapshot = dict(state.filtered_state)
+                store.put(EVICTED_NAMESPACE, sid, snapshot)
+                for key in list(snapshot):
+                    del state[key]
+            except Exception:
+                SESSION_EVICTIONS.inc("failure")
+                log.exception("session_eviction_failed", extra={"fields": {"session": sid[:8]}})
+                continue
+            with self._lock:
+                self._evicted.add(sid)
+            SESSION_EVICTIONS.inc("success")
+            evicted += 1
+        # Le sessioni abbandonate da più di un giorno non torneranno più
+        store.purge_older_than(EVICTED_NAMESPACE, 24 * 3600)
+        return evicted
+
+    def phase_counts(self):
+        """Numero di sessioni in memoria per fase dello studio."""
+        counts = {}
+        for _, (state, _) in self._live_states():
+            try:
+                phase = state["phase"] if "phase" in state else None
+            except Exception:
+                phase = None
+            counts[(phase,)] = counts.get((phase,), 0) + 1
+        return counts
+
+    def report(self):
+        """Dimensione dello stato di ogni sessione registrata."""
+        now = time.time()
+        rows = []
+        for sid, (state, last_seen) in self._live_states():
+            try:
+                size = sum(s for _, s in state_footprint(state.filtered_state))
+            except Exception:
+                size = None
+            rows.append({"session": sid[:8], "bytes": size, "idle_s": int(now - last_seen)})
+        return sorted(rows, key=lambda r: r["bytes"] or 0, reverse=True)
+
+
+@st.cache_resource
+def get_registry():
+    """Registro unico per tutto il server."""
+    return SessionRegistry()
@@ -0,0 +1,246 @@
+import itertools
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from metrics import (
+    REGISTRY,
+    SHEETS_ERRORS,
+    SHEETS_RATE_LIMITED,
+    SHEETS_REQUEST_SECONDS,
+    SHEETS_REQUESTS,
+    SHEETS_THROTTLE_SECONDS,
+)
+from study_progress import record_latency
+
+
+# ============================================================================
+# SCHEDULER DELLE RICHIESTE A GOOGLE SHEETS
+# ============================================================================
+# Tutte le letture e scritture delle app passano da qui. Un token bucket per
+# tipo (lettura/scrittura) tiene il ritmo sotto la quota al minuto di Google,
+# le letture identiche già in coda vengono unite (single-flight) e le
+# scritture delle sessioni completate hanno la precedenza sulle letture.
+READ_QUOTA_PER_MINUTE = int(os.environ.get("SHEETS_READ_QUOTA_PER_MINUTE", 60))
+WRITE_QUOTA_PER_MINUTE = int(os.environ.get("SHEETS_WRITE_QUOTA_PER_MINUTE", 60))
+WORKERS = 4
+MAX_RETRIES = 5
+
+# Priorità (numero più basso = servito prima)
+PRIORITY_WRITE = 0
+PRIORITY_READ = 1
+PRIORITY_DIAGNOSTIC = 2
+
+
+class TokenBucket:
+    """Token bucket thread-safe: `rate` token al secondo, al massimo `capacity`."""
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or max(1, per_minute // 6)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Prende un token, attendendo se necessario.
+
+        Returns:
+            float: Secondi di attesa
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+def _is_rate_limited(error):
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None) == 429
+
+
+class SheetsScheduler:
+    """
+    Coda con priorità servita da un piccolo pool di worker.
+
+    Le metriche (richieste per metodo, attese per throttling, 429, letture
+    unite) sono disponibili con `metrics()`.
+    """
+
+    def __init__(self, read_quota=READ_QUOTA_PER_MINUTE, write_quota=WRITE_QUOTA_PER_MINUTE, workers=WORKERS):
+        self.buckets = {"read": TokenBucket(read_quota), "write": TokenBucket(write_quota)}
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._metrics = {
+            "requests": {},
+            "coalesced": 0,
+            "throttle_seconds": 0.0,
+            "rate_limited": 0,
+            "errors": 0,
+        }
+        REGISTRY.gauge(
+            "sheets_queue_depth", "Richieste in attesa nello scheduler Sheets",
+            callback=lambda: {(): self._queue.qsize()}
+        )
+        for i in range(workers):
+            threading.Thread(target=self._worker, name=f"sheets-scheduler-{i}", daemon=True).start()
+
+    def submit(self, fn, *args, kind="read", priority=None, key=None, label=None, **kwargs):
+        """
+        Accoda una chiamata.
+
+        Args:
+            fn (callable): Chiamata gspread da eseguire
+            kind (str): "read" o "write" (sceglie il token bucket)
+            priority (int): PRIORITY_*; di default scritture prima delle letture
+            key (hashable): Se indicata, letture con la stessa chiave già in
+                coda o in corso condividono lo stesso risultato
+            label (str): Nome per le metriche (es. "get_all_values")
+
+        Returns:
+            Future: Risultato della chiamata
+        """
+        if priority is None:
+            priority = PRIORITY_WRITE if kind == "write" else PRIORITY_READ
+
+        with self._lock:
+            if key is not None and key in self._inflight:
+                self._metrics["coalesced"] += 1
+                return self._inflight[key]
+            future = Future()
+            if key is not None:
+                self._inflight[key] = future
+
+        job = (fn, args, kwargs, kind, key, label or getattr(fn, "__name__", "call"), future)
+        self._queue.put((priority, next(self._seq), job))
+        return future
+
+    def _worker(self):
+        while True:
+            _, _, (fn, args, kwargs, kind, key, label, future) = self._queue.get()
+            try:
+                future.set_result(self._execute(fn, args, kwargs, kind, label))
+            except Exception as e:
+                with self._lock:
+                    self._metrics["errors"] += 1
+                future.set_exception(e)
+            finally:
+                if key is not None:
+                    with self._lock:
+                        self._inflight.pop(key, None)
+
+    def _execute(self, fn, args, kwargs, kind, label):
+        # Import differito: gspread si carica solo quando parte la prima chiamata
+        from gspread.exceptions import APIError
+
+        for attempt in range(MAX_RETRIES):
+            waited = self.buckets[kind].acquire()
+            with self._lock:
+                self._metrics["throttle_seconds"] += waited
+                self._metrics["requests"][label] = self._metrics["requests"].get(label, 0) + 1
+            SHEETS_REQUESTS.inc(label, kind)
+            if waited:
+                SHEETS_THROTTLE_SECONDS.inc(kind, amount=waited)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except APIError as e:
+                if not _is_rate_limited(e) or attempt == MAX_RETRIES - 1:
+                    SHEETS_ERRORS.inc(label)
+                    raise
+                with self._lock:
+                    self._metrics["rate_limited"] += 1
+                    self._metrics["throttle_seconds"] += 2 ** attempt
+                SHEETS_RATE_LIMITED.inc()
+                SHEETS_THROTTLE_SECONDS.inc(kind, amount=2 ** attempt)
+                time.sleep(2 ** attempt)
+            finally:
+                seconds = time.perf_counter() - start
+                SHEETS_REQUEST_SECONDS.observe(kind, value=seconds)
+                record_latency("sheets", seconds)
+
+    def metrics(self):
+        """Copia delle metriche correnti."""
+        with self._lock:
+            snapshot = dict(self._metrics)
+            snapshot["requests"] = dict(self._metrics["requests"])
+        snapshot["queue_depth"] = self._queue.qsize()
+        return snapshot
+
+
+class ScheduledSheet:
+    """
+    Worksheet gspread le cui chiamate passano dallo scheduler.
+
+    Espone gli stessi metodi usati dalle app; ognuno accetta in più
+    `priority=` per declassare le letture diagnostiche.
+    """
+
+    def __init__(self, worksheet, scheduler=None, timeout=120):
+        self.worksheet = worksheet
+        self.scheduler = scheduler or get_scheduler()
+        self.timeout = timeout
+
+    def _read(self, method, *args, priority=None, **kwargs):
+        key = (self.worksheet.spreadsheet.id, self.worksheet.id, method, args, tuple(sorted(kwargs.items())))
+        fn = getattr(self.worksheet, method)
+        return self.scheduler.submit(
+            fn, *args, kind="read", priority=priority, key=key, label=method, **kwargs
+        ).result(self.timeout)
+
+    def _write(self, method, *args, priority=None, **kwargs):
+        fn = getattr(self.worksheet, method)
+        return self.scheduler.submit(
+            fn, *args, kind="write", priority=priority, label=method, **kwargs
+        ).result(self.timeout)
+
+    def col_values(self, col, **kwargs):
+        return self._read("col_values", col, **kwargs)
+
+    def row_values(self, row, **kwargs):
+        return self._read("row_values", row, **kwargs)
+
+    def get_all_values(self, **kwargs):
+        return self._read("get_all_values", **kwargs)
+
+    def get_values(self, *args, **kwargs):
+        return self._read("get_values", *args, **kwargs)
+
+    def batch_get(self, ranges, **kwargs):
+        return self._read("batch_get", tuple(ranges), **kwargs)
+
+    def append_row(self, values, **kwargs):
+        return self._write("append_row", values, **kwargs)
+
+    def append_rows(self, values, **kwargs):
+        return self._write("append_rows", values, **kwargs)
+
+    def __getattr__(self, name):
+        # Attributi non di rete (title, id, ...) vanno direttamente al worksheet
+        return getattr(self.worksheet, name)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Scheduler unico per tutto il processo (quindi per tutte le sessioni)."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = SheetsScheduler()
+        return _scheduler
@@ -0,0 +1,157 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+
+
+# ============================================================================
+# LOGGING STRUTTURATO DELLE APP
+# ============================================================================
+# Sostituisce i print() delle app: i record vanno in una coda (QueueHandler,
+# non blocca il rerun) e un thread QueueListener li scrive su stderr come
+# JSON, una riga per evento. Gli eventi ad alta frequenza (autosave ogni
+# secondo, rerun della chat) passano da un filtro di campionamento.
+#
+# Configurazione da ambiente:
+#   STUDY_LOG_LEVEL   DEBUG / INFO (default) / WARNING ...
+#   STUDY_LOG_FORMAT  json (default) oppure text
+#
+# Uso:
+#   log = get_logger("m")
+#   log.info("combination_assigned", extra={"fields": {"prompt_key": "1"}})
+#   log.debug("autosave", extra={"fields": {...}, "sample": 0.05})
+LOG_LEVEL = os.environ.get("STUDY_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("STUDY_LOG_FORMAT", "json").lower()
+QUEUE_SIZE = 10_000
+ROOT_LOGGER = "study"
+
+
+class JsonFormatter(logging.Formatter):
+    """Una riga JSON per record: tempo, livello, logger, evento e campi extra."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if getattr(record, "sampled_every", 1) > 1:
+            entry["sampled_every"] = record.sampled_every
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Formato leggibile per lo sviluppo locale."""
+
+    def format(self, record):
+        line = f"{self.formatTime(record, '%H:%M:%S')} {record.levelname:7s} {record.name}: {record.getMessage()}"
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Tiene un record ogni N per evento quando il record ha `sample` (frazione
+    tra 0 e 1) tra gli extra; gli altri record passano sempre.
+
+    Il campionamento è deterministico (1 ogni round(1 / sample)), così che i
+    conteggi ricostruiti con `sampled_every` siano esatti.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        rate = getattr(record, "sample", None)
+        if rate is None or rate >= 1:
+            return True
+        every = max(1, round(1 / rate)) if rate > 0 else None
+        if every is None:
+            return False
+        key = (record.name, record.msg)
+        with self._lock:
+            n = self._counts.get(key, 0)
+            self._counts[key] = n + 1
+        record.sampled_every = every
+        return n % every == 0
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Con la coda piena il record viene scartato invece di bloccare il rerun."""
+
+    dropped = 0
+
+    def prepare(self, record):
+        # Come QueueHandler.prepare, ma il traceback resta separato dal messaggio
+        record = copy.copy(record)
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DroppingQueueHandler.dropped += 1
+
+
+_listener = None
+_configure_lock = threading.Lock()
+
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, stream=None):
+    """
+    Configura (una volta per processo) il logger "study".
+
+    Returns:
+        logging.Logger: Logger radice delle app
+    """
+    global _listener
+    root = logging.getLogger(ROOT_LOGGER)
+    with _configure_lock:
+        if _listener is not None:
+            return root
+
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+        log_queue = queue.Queue(QUEUE_SIZE)
+        handler = _DroppingQueueHandler(log_queue)
+        handler.addFilter(SamplingFilter())
+
+        root.handlers[:] = [handler]
+        root.setLevel(level)
+        root.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=False)
+        _listener.start()
+        atexit.register(_listener.stop)
+    return root
+
+
+def get_logger(name):
+    """Logger figlio di "study" (configura il logging al primo uso)."""
+    configure_logging()
+    short = name.rsplit(".", 1)[-1]
+    return logging.getLogger(f"{ROOT_LOGGER}.{short}")
@@ -0,0 +1,206 @@
+import bisect
+import os
+import threading
+import time
+
+from local_store import get_store
+
+
+# ============================================================================
+# AVANZAMENTO DEGLI STUDI (AGGREGATI INCREMENTALI)
+# ============================================================================
+# Contatori aggiornati dalle app a ogni cambio di fase, assegnazione di una
+# condizione e salvataggio, così che la dashboard degli sperimentatori
+# (dashboard.py) legga solo l'archivio locale e non il foglio Google, che
+# ha la quota condivisa con le sessioni in corso.
+#
+# In local_store:
+#   progress            <app> -> aggregato (vedi _empty_aggregate)
+#                       latency:<tipo> -> istogramma delle latenze ("llm", "sheets")
+#   progress_sessions   <app>:<prolific_id> -> fase, ingresso nella fase,
+#                       condizione, salvataggio avvenuto; le voci più
+#                       vecchie di SESSION_TTL_SECONDS vengono eliminate
+#
+# Gli aggregati vengono aggiornati in una transazione dell'archivio
+# (LocalStore.update): più processi sullo stesso file non perdono incrementi.
+#
+# Una sessione senza cambi di fase da più di DROP_OFF_SECONDS conta come
+# abbandonata nella fase in cui si trova.
+#
+# Le app che non usano il motore delle fasi (phases.json) passano a
+# record_progress il numero della fase come nei loro commenti "PHASE N";
+# i nomi per la dashboard sono in APP_PHASES. In m e pilot il Prolific ID
+# arriva dal form della fase 1, quindi le sessioni si contano dalla fase 2.
+APP_PHASES = {
+    "m": {2: "initial_opinion", 3: "conversation", 4: "final_opinion", 5: "thank_you"},
+    "pilot": {2: "topic_selection", 3: "norm_selection", 4: "conversation", 5: "final_argumentation"},
+    "epistemia": {1: "argumentation", 2: "submitted"},
+}
+
+NAMESPACE = "progress"
+SESSIONS_NAMESPACE = "progress_sessions"
+DROP_OFF_SECONDS = int(os.environ.get("PROGRESS_DROP_OFF_SECONDS", 3600))
+# Le sessioni abbandonate restano nel conteggio per una settimana
+# (i contatori di fase e condizione non scadono)
+SESSION_TTL_SECONDS = 7 * 24 * 3600
+
+# Limiti superiori dei bucket (secondi); l'ultimo bucket è +Inf
+DURATION_BUCKETS = (5, 10, 20, 30, 45, 60, 90, 120, 180, 300, 450, 600, 900, 1200, 1800, 2700, 3600)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 7.5, 10, 15, 30, 60)
+
+_lock = threading.Lock()
+_writes = 0
+
+
+def _empty_aggregate():
+    return {
+        "entered": {},          # fase -> sessioni che l'hanno raggiunta
+        "phase_seconds": {},    # fase -> istogramma del tempo passato nella fase
+        "assigned": {},         # (prompt_key, norm_key) -> sessioni assegnate
+        "completed": {},        # (prompt_key, norm_key) -> sessioni salvate
+        "total_seconds": [0] * (len(DURATION_BUCKETS) + 1),
+        "updated": None,
+    }
+
+
+def _observe(histogram, buckets, value):
+    histogram[bisect.bisect_left(buckets, value)] += 1
+
+
+def histogram_quantile(histogram, buckets, q):
+    """
+    Quantile stimato da un istogramma a bucket (interpolazione lineare nel bucket).
+
+    Returns:
+        float | None: None se l'istogramma è vuoto; l'ultimo limite se il
+            quantile cade nel bucket +Inf
+    """
+    total = sum(histogram)
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for i, count in enumerate(histogram):
+        if count and seen + count >= rank:
+            if i == len(buckets):
+                return float(buckets[-1])
+            lower = buckets[i - 1] if i else 0.0
+            return lower + (buckets[i] - lower) * (rank - seen) / count
+        seen += count
+    return float(buckets[-1])
+
+
+def _update(key, mutate, initial=_empty_aggregate, store=None):
+    """Legge, modifica e riscrive un aggregato in una transazione dell'archivio (sicuro tra processi)."""
+    (store or get_store()).update(NAMESPACE, key, mutate, initial)
+
+
+def record_progress(app, state, prolific_id, phase=None, condition=None, store=None):
+    """
+    Aggiorna gli aggregati se la sessione ha cambiato fase o ha appena
+    ricevuto una condizione; negli altri rerun non accede all'archivio.
+
+    Args:
+        app (str): Nome dell'app
+        state: st.session_state (usa "phase", "prompt_key", "norm_key")
+        prolific_id (str): Identifica la sessione anche dopo un ripristino
+        phase (int): Fase corrente (default: state["phase"])
+        condition (tuple): (prompt_key, norm_key) assegnati (default: dallo stato)
+    """
+    if phase is None:
+        phase = state.get("phase")
+    if condition is None:
+        condition = (state.get("prompt_key"), state.get("norm_key"))
+    condition = tuple(condition) if condition[0] is not None else None
+    if state.get("_progress_phase") == phase and state.get("_progress_condition") == condition:
+        return
+    state["_progress_phase"] = phase
+    state["_progress_condition"] = condition
+
+    store = store or get_store()
+    key = f"{app}:{prolific_id}"
+    now = time.time()
+    session = store.get(SESSIONS_NAMESPACE, key) or {
+        "reached": [], "phase": None, "entered_at": now, "condition": None, "completed": False,
+    }
+
+    def mutate(agg):
+        if phase != session["phase"]:
+            if session["phase"] is not None:
+                histogram = agg["phase_seconds"].setdefault(session["phase"], [0] * (len(DURATION_BUCKETS) + 1))
+                _observe(histogram, DURATION_BUCKETS, now - session["entered_at"])
+            # Ogni fase conta una volta per sessione, anche dopo un ripristino dal checkpoint
+            if phase not in session["reached"]:
+                agg["entered"][phase] = agg["entered"].get(phase, 0) + 1
+        if condition is not None and session["condition"] is None:
+            agg["assigned"][condition] = agg["assigned"].get(condition, 0) + 1
+        agg["updated"] = now
+
+    _update(app, mutate, store=store)
+    if phase != session["phase"]:
+        session.update(phase=phase, entered_at=now, reached=session["reached"] + [phase])
+    session.update(condition=session["condition"] or condition, updated=now)
+    store.put(SESSIONS_NAMESPACE, key, session)
+
+
+def record_completion(app, prolific_id, prompt_key, norm_key, total_seconds=None, store=None):
+    """Conta un salvataggio riuscito per la condizione e segna la sessione come conclusa."""
+    global _writes
+    store = store or get_store()
+    condition = (prompt_key, norm_key)
+
+    def mutate(agg):
+        agg["completed"][condition] = agg["completed"].get(condition, 0) + 1
+        if total_seconds is not None:
+            _observe(agg["total_seconds"], DURATION_BUCKETS, total_seconds)
+        agg["updated"] = time.time()
+
+    _update(app, mutate, store=store)
+    key = f"{app}:{prolific_id}"
+    session = store.get(SESSIONS_NAMESPACE, key)
+    if session is not None:
+        # La fase finale (ringraziamenti) arriva dopo il salvataggio: la voce
+        # resta, così che quel cambio di fase non conti una sessione nuova
+        session.update(completed=True, updated=time.time())
+        store.put(SESSIONS_NAMESPACE, key, session)
+    with _lock:
+        _writes += 1
+        sweep = _writes % 100 == 0
+    if sweep:
+        store.purge_older_than(SESSIONS_NAMESPACE, SESSION_TTL_SECONDS)
+
+
+def record_latency(kind, seconds, store=None):
+    """Latenza di una chiamata esterna ("llm" o "sheets")."""
+    _update(f"latency:{kind}", lambda h: _observe(h, LATENCY_BUCKETS, seconds),
+            initial=lambda: [0] * (len(LATENCY_BUCKETS) + 1), store=store)
+
+
+# ============================================================================
+# LETTURA (DASHBOARD)
+# ============================================================================
+def load_progress(app, store=None):
+    """Aggregato dell'app (vuoto se non ci sono ancora sessioni)."""
+    return (store or get_store()).get(NAMESPACE, app) or _empty_aggregate()
+
+
+def load_latency(kind, store=None):
+    return (store or get_store()).get(NAMESPACE, f"latency:{kind}") or [0] * (len(LATENCY_BUCKETS) + 1)
+
+
+def open_sessions(app, store=None, now=None):
+    """
+    Sessioni dell'app non ancora salvate, per fase.
+
+    Returns:
+        dict: fase -> {"active": n, "dropped": n}
+    """
+    now = now or time.time()
+    prefix = f"{app}:"
+    by_phase = {}
+    for key, session in (store or get_store()).items(SESSIONS_NAMESPACE):
+        if not key.startswith(prefix) or session.get("completed"):
+            continue
+        counts = by_phase.setdefault(session["phase"], {"active": 0, "dropped": 0})
+        counts["dropped" if now - session["updated"] > DROP_OFF_SECONDS else "active"] += 1
+    return by_phase
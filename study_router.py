@@ -0,0 +1,93 @@
+import os
+import threading
+
+import streamlit as st
+
+from clients import use_study, reset_study
+
+
+# ============================================================================
+# ROUTER MULTI-STUDIO (UN SOLO SERVER)
+# ============================================================================
+# Ospita tutti gli studi in un unico processo Streamlit:
+#   streamlit run study_router.py
+# Lo studio si sceglie dal percorso (/m, /pilot, ...) o con ?study=<nome>,
+# che ha la precedenza; senza indicazioni si apre DEFAULT_STUDY.
+#
+# Condivisi tra gli studi (una copia per processo): cataloghi JSON, client
+# gspread/OpenAI e connessioni, scheduler delle scritture Sheets, cache
+# delle risposte, archivio locale, CSS.
+# Separati per studio: il foglio dei risultati ([studies.<nome>] nei
+# secrets, altrimenti google_sheet_url), le metriche e i log (etichetta e
+# logger per app), i profili dei rerun e lo stato della sessione, che viene
+# azzerato se la stessa sessione passa a uno studio diverso.
+#
+# /dashboard è la pagina degli sperimentatori (dashboard.py), protetta da chiave.
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_STUDY = os.environ.get("DEFAULT_STUDY", "study")
+
+STUDIES = {
+    "study": "streamlit_app.py",
+    "m": "m.py",
+    "pilot": "pilot_study.py",
+    "epistemia": "test_epistemia.py",
+    "dashboard": "dashboard.py",
+}
+
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+
+def _code(script):
+    """Script compilato, ricompilato solo se il file cambia."""
+    path = os.path.join(ROOT, script)
+    mtime = os.path.getmtime(path)
+    with _compiled_lock:
+        entry = _compiled.get(path)
+        if entry is None or entry[0] != mtime:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = _compiled[path] = (mtime, compile(f.read(), path, "exec"))
+    return path, entry[1]
+
+
+def run_study(name):
+    """Esegue lo script dello studio `name` nel rerun corrente."""
+    if st.session_state.get("_router_study") not in (None, name):
+        # Gli studi usano chiavi con lo stesso nome ("messages", "phase", ...)
+        for key in list(st.session_state.keys()):
+            del st.session_state[key]
+    st.session_state["_router_study"] = name
+
+    path, code = _code(STUDIES[name])
+    token = use_study(name)
+    try:
+        exec(code, {"__name__": "__main__", "__file__": path})
+    finally:
+        reset_study(token)
+
+
+def _page(name):
+    def page():
+        run_study(name)
+    page.__name__ = f"study_{name}"
+    return page
+
+
+def main():
+    requested = st.query_params.get("study")
+    if requested is not None:
+        if requested not in STUDIES:
+            st.error(f"Unknown study: {requested}")
+            st.stop()
+        run_study(requested)
+        return
+
+    # Percorsi /<nome> con la navigazione nascosta
+    pages = [
+        st.Page(_page(name), title=name, url_path=name, default=(name == DEFAULT_STUDY))
+        for name in STUDIES
+    ]
+    st.navigation(pages, position="hidden").run()
+
+
+main()
@@ -1,10 +1,17 @@
 import streamlit as st
-import gspread
-from google.oauth2.service_account import Credentials
-import json
 from datetime import datetime
 import time
 
+from theme import apply_theme
+from study_logging import get_logger
+from metrics import start_metrics_server, record_rerun, STUDY_SAVES
+from study_progress import record_completion, record_progress
+from results import text_tracking_record
+from session_codec import encode_row, ensure_header
+from clients import get_sheet, start_warmup, study_secret
+
+log = get_logger("test_epistemia")
+
 # Page configuration
 st.set_page_config(
     page_title="Everyday Norm Experiment - Phase 4",
@@ -14,167 +21,58 @@ st.set_page_config(
 )
 
 # Custom CSS
-st.markdown("""
-<style>
-    * {
-        font-family: 'Segoe UI', Trebuchet MS, sans-serif;
-    }
-    
-    html, body, [data-testid="stAppViewContainer"] {
-        background: linear-gradient(135deg, #f5f7fa 0%, #f8f9fb 100%);
-    }
-    
-    [data-testid="stMainBlockContainer"] {
-        padding: 2rem 3rem;
-    }
-    
-    [data-testid="stForm"] {
-        background: white;
-        padding: 2.5rem;
-        border-radius: 12px;
-        box-shadow: 0 2px 8px rgba(0, 0, 0, 0.06);
-        border: 1px solid #e5e7eb;
-    }
-    
-    button[kind="primary"] {
-        background: linear-gradient(135deg, #003d82 0%, #004a9e 100%);
-        color: white !important;
-        border: none !important;
-        padding: 0.75rem 2rem !important;
-        border-radius: 8px !important;
-        font-weight: 600 !important;
-        font-size: 0.95rem !important;
-        transition: all 0.3s ease;
-        margin-top: 1.5rem;
-    }
-    
-    button[kind="primary"]:hover {
-        box-shadow: 0 4px 12px rgba(0, 61, 130, 0.3);
-        transform: translateY(-1px);
-    }
-    
-    .success-badge {
-        background: #f0fdf4;
-        color: #166534;
-        padding: 1rem 1.5rem;
-        border-radius: 8px;
-        border-left: 4px solid #22c55e;
-        margin-bottom: 2rem;
-        font-weight: 500;
-    }
-    
-    [data-testid="stTextArea"] textarea {
-        border: 1.5px solid #e5e7eb !important;
-        border-radius: 8px !important;
-        padding: 1rem !important;
-        font-size: 0.95rem !important;
-        font-family: 'Segoe UI', Trebuchet MS, sans-serif;
-    }
-    
-    [data-testid="stTextArea"] textarea:focus {
-        border-color: #003d82 !important;
-        box-shadow: 0 0 0 3px rgba(0, 61, 130, 0.1) !important;
-    }
-    
-    .error {
-        background: #fef2f2;
-        color: #991b1b;
-        padding: 1rem 1.5rem;
-        border-radius: 8px;
-        border-left: 4px solid #ef4444;
-        font-size: 0.95rem;
-    }
-    
-    .debug-info {
-        background: #f3f4f6;
-        padding: 1rem;
-        border-radius: 8px;
-        font-size: 0.85rem;
-        color: #666;
-        margin-top: 1rem;
-    }
-    
-    .timer-display {
-        background: #003d82;
-        color: white;
-        padding: 0.75rem 1.5rem;
-        border-radius: 8px;
-        font-size: 1.1rem;
-        font-weight: 600;
-        text-align: center;
-        margin-bottom: 1rem;
-    }
-</style>
-""", unsafe_allow_html=True)
+apply_theme("test_epistemia.css")
 
 # ============================================================================
 # CONFIGURAZIONE GOOGLE SHEETS
 # ============================================================================
 
-def init_google_sheets():
-    """Inizializza la connessione a Google Sheets"""
+def google_sheets_configured():
+    """True se nei secrets ci sono credenziali e URL del foglio (non apre la connessione)"""
     try:
-        creds_dict = st.secrets["gcp_service_account"]
-        sheet_url = st.secrets["google_sheet_url"]
-        
-        scopes = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
-        creds = Credentials.from_service_account_info(creds_dict, scopes=scopes)
-        client_sheets = gspread.authorize(creds)
-        
-        spreadsheet = client_sheets.open_by_url(sheet_url)
-        sheet = spreadsheet.sheet1
-        
-        return sheet, True
+        st.secrets["gcp_service_account"]
+        study_secret("google_sheet_url")
+        return True
     except KeyError:
-        return None, False
-    except Exception as e:
-        print(f"❌ Errore di connessione: {str(e)}")
-        return None, False
+        return False
 
 
-def save_to_google_sheets(sheet, user_info, prompt_key, prompt_data, argumentation, text_tracking, final_chat_messages):
+def save_to_google_sheets(user_info, prompt_key, norm_key, prompt_data, argumentation, text_tracking, final_chat_messages):
     """Salva i dati su Google Sheets"""
     try:
-        final_chat_json = json.dumps(final_chat_messages or [], ensure_ascii=False, indent=2)
-        
-        # Formatta il text tracking in JSON strutturato
-        text_tracking_json = ""
-        if text_tracking:
-            formatted_tracking = {}
-            for timestamp, text_data in sorted(text_tracking.items()):
-                readable_time = datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
-                formatted_tracking[readable_time] = {
-                    "timestamp": timestamp,
-                    "text": text_data["text"],
-                    "word_count": text_data["word_count"],
-                    "char_count": text_data["char_count"]
-                }
-            
-            text_tracking_json = json.dumps(formatted_tracking, ensure_ascii=False, indent=2)
-        
-        sheet.append_row([
-            user_info["prolific_id"],
-            prompt_key,
-            prompt_data["title"],
-            argumentation,
-            text_tracking_json,
-            final_chat_json,
-            datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        ])
-        return True
+        # Il foglio si apre qui al primo uso (il warmup di solito l'ha già fatto)
+        sheet = get_sheet()
+        ensure_header(sheet, "epistemia")
+        sheet.append_row(encode_row("epistemia", {
+            "prolific_id": user_info["prolific_id"],
+            "prompt_key": prompt_key,
+            "prompt_title": prompt_data["title"],
+            "argumentation": argumentation,
+            "text_tracking": text_tracking_record(text_tracking),
+            "final_chat": final_chat_messages or [],
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }), value_input_option="RAW")
     except Exception as e:
-        print(f"❌ Errore nel salvataggio: {str(e)}")
+        STUDY_SAVES.inc("epistemia", "failure")
+        log.exception("save_failed")
         return False
 
+    STUDY_SAVES.inc("epistemia", "success")
+    record_completion("epistemia", user_info["prolific_id"], prompt_key, norm_key)
+    return True
+
 
 # ============================================================================
 # INITIALIZE SESSION STATE
 # ============================================================================
 
+# Metriche (server avviato una volta per processo)
+start_metrics_server()
+
 # Inizializza il timer PRIMA di tutto
 if "start_time" not in st.session_state:
     st.session_state.start_time = time.time()
-    print(f"⏱️ Timer started at {datetime.now().strftime('%H:%M:%S')}")
+    log.info("timer_started")
 
 if "last_save_time" not in st.session_state:
     st.session_state.last_save_time = time.time()
@@ -194,14 +92,18 @@ if "sheet_connected" not in st.session_state:
     st.session_state.sheet_connected = False
 if "selected_prompt_key" not in st.session_state:
     st.session_state.selected_prompt_key = "norm_test"
+if "selected_norm_key" not in st.session_state:
+    # "Drinking during a job interview" in norms.json, la norma della domanda finale
+    st.session_state.selected_norm_key = "norm_2"
 if "is_submitted" not in st.session_state:
     st.session_state.is_submitted = False
 if "current_text" not in st.session_state:
     st.session_state.current_text = ""
 
-# Tentare la connessione a Google Sheets
-sheet, is_connected = init_google_sheets()
-st.session_state.sheet_connected = is_connected
+# Client gspread importato e autorizzato una volta per processo, in background:
+# qui si controllano solo i secrets, la connessione serve al salvataggio
+start_warmup(openai=False)
+st.session_state.sheet_connected = google_sheets_configured()
 
 # ============================================================================
 # TRACKING LOGIC - AUTOMATIC SAVE OGNI SECONDO
@@ -217,6 +119,13 @@ def auto_save_text():
         current_second = int(current_time)
         text_content = st.session_state.current_text
         
+        # Se il testo non è cambiato riusa la stringa dell'ultimo snapshot,
+        # così gli snapshot identici non occupano memoria aggiuntiva
+        if st.session_state.text_tracking:
+            last_snapshot = st.session_state.text_tracking[max(st.session_state.text_tracking)]
+            if last_snapshot["text"] == text_content:
+                text_content = last_snapshot["text"]
+        
         word_count = len(text_content.split()) if text_content.strip() else 0
         char_count = len(text_content)
         
@@ -229,8 +138,8 @@ def auto_save_text():
         
         st.session_state.last_save_time = current_time
         
-        readable_time = datetime.fromtimestamp(current_second).strftime("%H:%M:%S")
-        print(f"💾 [{readable_time}] Auto-saved: {word_count} words, {char_count} chars")
+        # Una volta al secondo per sessione: nei log ne finisce 1 su 30
+        log.debug("autosave", extra={"fields": {"words": word_count, "chars": char_count}, "sample": 1 / 30})
         
         return True
     return False
@@ -298,15 +207,12 @@ with col_form:
                 "char_count": len(argumentation)
             }
             
-            # Print final summary
-            print("\n" + "="*60)
-            print("📊 FINAL SUBMISSION:")
-            print("="*60)
-            print(f"User: {st.session_state.user_info['prolific_id']}")
-            print(f"Total words: {len(argumentation.split())}")
-            print(f"Total time: {elapsed_time}s")
-            print(f"Snapshots saved: {len(st.session_state.text_tracking)}")
-            print("="*60 + "\n")
+            log.info("final_submission", extra={"fields": {
+                "prolific_id": st.session_state.user_info["prolific_id"],
+                "words": len(argumentation.split()),
+                "elapsed_s": elapsed_time,
+                "snapshots": len(st.session_state.text_tracking),
+            }})
             
             # Save to Google Sheets
             if st.session_state.sheet_connected:
@@ -316,9 +222,9 @@ with col_form:
                 }
                 
                 success = save_to_google_sheets(
-                    sheet,
                     st.session_state.user_info,
                     st.session_state.selected_prompt_key,
+                    st.session_state.selected_norm_key,
                     mock_prompt_data,
                     argumentation,
                     st.session_state.text_tracking,
@@ -331,7 +237,7 @@ with col_form:
                             ✅ Thank you for your participation! Your responses have been recorded.
                         </div>
                     """, unsafe_allow_html=True)
-                    print("✅ Data saved to Google Sheets")
+                    log.info("data_saved")
                 else:
                     st.markdown("<div class='error'>❌ Error saving data. Please try again.</div>", unsafe_allow_html=True)
             else:
@@ -370,6 +276,18 @@ with col_debug:
             readable_time = datetime.fromtimestamp(timestamp).strftime("%H:%M:%S")
             st.markdown(f"`{readable_time}`: {data['word_count']} words, {data['char_count']} chars")
 
+# ============================================================================
+# FASE CORRENTE (METRICHE E DASHBOARD)
+# ============================================================================
+# Dopo la UI, così che l'invio conti già in questo rerun (dopo l'invio la
+# pagina non si riesegue più da sola): 1 scrittura, 2 inviato
+phase = 2 if st.session_state.is_submitted else 1
+record_rerun("epistemia", st.session_state, phase=phase)
+record_progress(
+    "epistemia", st.session_state, st.session_state.user_info["prolific_id"], phase=phase,
+    condition=(st.session_state.selected_prompt_key, st.session_state.selected_norm_key),
+)
+
 # ============================================================================
 # AUTO-SAVE MECHANISM - Esegui il salvataggio automatico
 # ============================================================================
@@ -411,8 +329,9 @@ if not st.session_state.is_submitted:
         """, unsafe_allow_html=True)
         
         # Create OpenAI client for final chat
-        openai_client = OpenAI(api_key=openai_api_key)
+        openai_client = get_openai_client()
         final_chat_system_prompt = f"You are a helpful assistant. Answer questions about the topic discussed: {norm_data['title']}. Be supportive and provide insights."
+        model, generation_params = generation_profile(prompt_data)
         
         # Create two columns: form on left, AI Assistant on right
         col_form, col_assistant = st.columns([2, 1])
@@ -454,10 +373,10 @@ if not st.session_state.is_submitted:
                     # Traccia finale
                     track_words_callback()
                     
-                    # Stampa il tracking (solo tu lo vedi nei log/debug)
-                    print("📊 WORD TRACKING PER SECONDO:")
-                    for second, word_count in sorted(st.session_state.word_tracking.items()):
-                        print(f"  Secondo {second}: {word_count} parole")
+                    # Tracking per secondo nei log (solo a livello DEBUG)
+                    log.debug("word_tracking", extra={"fields": {
+                        "words_per_second": dict(sorted(st.session_state.word_tracking.items())),
+                    }})
                     
                     # Salva tutto normalmente
                     save_conversation_to_json(user_info, prompt_data, norm_data, st.session_state.messages)
@@ -503,19 +422,16 @@ if not st.session_state.is_submitted:
                     "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 })
                 
-                # Generate response from OpenAI
-                messages_for_api = [{"role": "system", "content": final_chat_system_prompt}] + [
-                    {"role": m["role"], "content": m["content"]}
-                    for m in st.session_state.final_chat_messages
-                ]
-                
-                response = openai_client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=messages_for_api,
-                    stream=False,
+                # Stesso modello e parametri della conversazione (profilo del template)
+                reply = complete(
+                    openai_client,
+                    api_messages(final_chat_system_prompt, st.session_state.final_chat_messages),
+                    model,
+                    **generation_params,
                 )
+                record_generation(prompt_key, model, "final_chat", reply.latency, reply.completion_tokens)
                 
-                response_text = response.choices[0].message.content
+                response_text = reply.text
                 response_timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 
                 st.session_state.final_chat_messages.append({
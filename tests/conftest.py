@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# I moduli dell'app stanno nella radice del repository (nessun pacchetto installabile)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# L'archivio condiviso del processo (get_store) non deve toccare quello del server
+os.environ.setdefault("STUDY_LOCAL_STORE", os.path.join(tempfile.mkdtemp(prefix="study-tests-"), "store.sqlite3"))
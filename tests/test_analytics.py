@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from analytics import IncrementalAggregates, build_arrays, condition_summary, participant_deltas  # noqa: E402
+from session_codec import encode_json  # noqa: E402
+
+PROMPTS = {"1": {}, "2": {}}
+NORMS = {"a": {"title": "Norm A"}, "b": {"title": "Norm B"}, "c": {"title": "Norm C"}}
+
+
+def _row(pid, prompt_key, norm_key, initial, final, others=None, others_final=None, encode=json.dumps):
+    row = [pid, prompt_key, norm_key, encode(initial), "sha256:x", encode(final),
+           encode(others or {}), encode(others_final or {})]
+    return row + [""] * 4
+
+
+ROWS = [
+    _row("p1", "1", "a", {"Norm A": 40, "Norm B": 50}, {"Norm A": 60, "Norm B": 54},
+         {"Norm A": 30}, {"Norm A": 35}),
+    _row("p2", "1", "a", {"Norm A": 20, "Norm C": 10}, {"Norm A": 30, "Norm C": 10}),
+    _row("p3", "2", "b", {"Norm B": 70, "Norm A": 10, "Norm C": 0}, {"Norm B": 50, "Norm A": 20, "Norm C": 10},
+         encode=encode_json),
+]
+
+
+def test_build_arrays_places_opinions_by_norm_title():
+    arrays = build_arrays(ROWS + [_row("x", "9", "a", {}, {}), ["short"]], PROMPTS, NORMS)
+    assert list(arrays.prolific_ids) == ["p1", "p2", "p3"]
+    assert arrays.opinions.shape == (3, 3, 4)
+    assert arrays.opinions[0, 0, 0] == 40 and arrays.opinions[0, 1, 1] == 54
+    assert np.isnan(arrays.opinions[1, 1, 0])
+    assert arrays.condition_key(arrays.condition_idx[2]) == ("2", "b")
+
+
+def test_opinion_cells_may_be_compressed():
+    big = {f"Norm {i}": i for i in range(200)}
+    big["Norm A"] = 33
+    cell = encode_json(big)
+    assert cell.startswith("z:")
+    arrays = build_arrays([_row("p", "1", "a", big, big, encode=encode_json)], PROMPTS, NORMS)
+    assert arrays.opinions[0, 0, 0] == 33
+
+
+def test_participant_deltas():
+    deltas = participant_deltas(build_arrays(ROWS, PROMPTS, NORMS))
+    np.testing.assert_allclose(deltas["treatment"], [20, 10, -20])
+    np.testing.assert_allclose(deltas["others_treatment"][:1], [5])
+    assert np.isnan(deltas["others_treatment"][1])
+    # Controllo: media delle norme non discusse
+    np.testing.assert_allclose(deltas["control"], [4, 0, 10])
+
+
+def test_condition_summary_means_and_ci():
+    summary = {(s["prompt_key"], s["norm_key"]): s for s in condition_summary(build_arrays(ROWS, PROMPTS, NORMS), n_boot=200)}
+    assert len(summary) == 6
+    cell = summary[("1", "a")]
+    assert cell["treatment_n"] == 2 and cell["treatment_mean"] == pytest.approx(15)
+    assert 10 <= cell["treatment_ci_low"] <= cell["treatment_ci_high"] <= 20
+    # Un solo partecipante: niente IC
+    assert np.isnan(summary[("2", "b")]["treatment_ci_low"])
+    assert summary[("2", "c")]["treatment_n"] == 0
+
+
+def test_incremental_aggregates_match_batch_summary():
+    incremental = IncrementalAggregates(PROMPTS, NORMS)
+    assert incremental.update(ROWS[:2]) == 2
+    assert incremental.update(ROWS[:2]) == 0
+    assert incremental.update(ROWS) == 1
+    batch = condition_summary(build_arrays(ROWS, PROMPTS, NORMS), n_boot=10)
+    for inc, full in zip(incremental.summary(), batch):
+        assert (inc["prompt_key"], inc["norm_key"]) == (full["prompt_key"], full["norm_key"])
+        for metric in IncrementalAggregates.METRICS:
+            assert inc[f"{metric}_n"] == full[f"{metric}_n"]
+            if full[f"{metric}_n"]:
+                assert inc[f"{metric}_mean"] == pytest.approx(full[f"{metric}_mean"])
@@ -0,0 +1,49 @@
+import threading
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+import clients
+
+
+@pytest.fixture
+def warmups(monkeypatch):
+    seen = []
+    done = threading.Semaphore(0)
+
+    def fake_warmup(sheets, openai):
+        seen.append(clients.current_study())
+        done.release()
+
+    monkeypatch.setattr(clients, "_warmup", fake_warmup)
+    monkeypatch.setattr(clients, "_warmup_studies", set())
+
+    def wait(count):
+        for _ in range(count):
+            assert done.acquire(timeout=5)
+        return seen
+
+    return wait
+
+
+def test_warmup_thread_sees_current_study(warmups):
+    token = clients.use_study("pilot")
+    try:
+        clients.start_warmup()
+    finally:
+        clients.reset_study(token)
+    assert warmups(1) == ["pilot"]
+
+
+def test_warmup_runs_once_per_study(warmups):
+    clients.start_warmup()
+    clients.start_warmup()
+    for study in ("pilot", "m", "pilot"):
+        token = clients.use_study(study)
+        try:
+            clients.start_warmup()
+        finally:
+            clients.reset_study(token)
+    assert sorted(warmups(3), key=str) == sorted([None, "pilot", "m"], key=str)
+    assert clients._warmup_studies == {None, "pilot", "m"}
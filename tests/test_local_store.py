@@ -0,0 +1,55 @@
+import multiprocessing
+
+from local_store import LocalStore
+
+
+def _increment(path, times):
+    store = LocalStore(path)
+    for _ in range(times):
+        store.update("counters", "total", lambda value: value.update(n=value.get("n", 0) + 1))
+
+
+def test_put_get_pop(tmp_path):
+    store = LocalStore(str(tmp_path / "store.sqlite3"))
+    store.put("ns", "a", {"x": 1})
+    assert store.get("ns", "a") == {"x": 1}
+    assert store.get("ns", "missing", 0) == 0
+    assert store.pop("ns", "a") == {"x": 1}
+    assert store.keys("ns") == []
+
+
+def test_update_starts_from_initial(tmp_path):
+    store = LocalStore(str(tmp_path / "store.sqlite3"))
+    assert store.update("ns", "h", lambda h: h.append(1), initial=list) == [1]
+    assert store.update("ns", "h", lambda h: h.append(2), initial=list) == [1, 2]
+
+
+def test_update_rolls_back_on_error(tmp_path):
+    store = LocalStore(str(tmp_path / "store.sqlite3"))
+    store.put("ns", "v", {"n": 1})
+
+    def fail(value):
+        value["n"] = 2
+        raise RuntimeError
+
+    try:
+        store.update("ns", "v", fail)
+    except RuntimeError:
+        pass
+    assert store.get("ns", "v") == {"n": 1}
+    # La connessione resta utilizzabile dopo il rollback
+    store.update("ns", "v", lambda value: value.update(n=3))
+    assert store.get("ns", "v") == {"n": 3}
+
+
+def test_update_is_atomic_across_processes(tmp_path):
+    path = str(tmp_path / "store.sqlite3")
+    LocalStore(path)
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=_increment, args=(path, 50)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert all(worker.exitcode == 0 for worker in workers)
+    assert LocalStore(path).get("counters", "total") == {"n": 200}
@@ -0,0 +1,76 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from local_store import LocalStore  # noqa: E402
+from near_duplicates import LSHIndex, MinHasher, normalize, similarity  # noqa: E402
+
+BASE = ("I would change the way people treat each other online, because anonymity makes "
+        "it far too easy to be cruel without ever facing any consequences for it.")
+EDITED = ("I would change how people treat each other online, because anonymity makes "
+          "it far too easy to be cruel without ever facing any consequences for it!")
+OTHER = ("Honestly I would make public transport free in every city so that nobody has to "
+         "choose between paying rent and getting to work on time each morning.")
+
+
+@pytest.fixture
+def index():
+    return LSHIndex("engagement_text", store=LocalStore(":memory:"), threshold=0.7)
+
+
+def test_normalize():
+    assert normalize("  Hello,   WORLD!!\n ok ") == "hello world ok"
+
+
+def test_signature_is_deterministic_and_ignores_case_and_punctuation():
+    hasher = MinHasher()
+    sig = hasher.signature(BASE)
+    assert sig.dtype == np.uint32 and sig.shape == (128,)
+    assert np.array_equal(sig, MinHasher().signature(BASE))
+    assert similarity(sig, hasher.signature(BASE.upper().replace(",", " "))) == 1.0
+
+
+def test_short_texts_are_not_indexed(index):
+    assert MinHasher().signature("I agree.") is None
+    assert index.screen("a", "I agree.") == []
+    assert index.store.keys(index.signatures_ns) == []
+
+
+def test_similarity_estimates_jaccard():
+    hasher = MinHasher()
+    near = similarity(hasher.signature(BASE), hasher.signature(EDITED))
+    far = similarity(hasher.signature(BASE), hasher.signature(OTHER))
+    assert near > 0.7
+    assert far < 0.2
+
+
+def test_screen_finds_near_duplicates_from_other_groups(index):
+    assert index.screen("p1", BASE, group="p1") == []
+    assert index.screen("p2", OTHER, group="p2") == []
+    matches = index.screen("p3", EDITED, group="p3")
+    assert [m[0] for m in matches] == ["p1"]
+    assert matches[0][1] >= 0.7
+    assert index.pairs() == [("p3", "p1", matches[0][1])]
+
+
+def test_same_group_is_not_compared(index):
+    index.screen("p1:1", BASE, group="p1")
+    assert index.screen("p1:3", EDITED, group="p1") == []
+
+
+def test_repeated_add_does_not_duplicate_buckets(index):
+    sig = index.hasher.signature(BASE)
+    index.add("p1", sig)
+    index.add("p1", sig)
+    assert all(index.store.get(index.buckets_ns, key) == ["p1"] for key in index._bucket_keys(sig))
+
+
+def test_clusters_join_chains_of_pairs(index):
+    for pid, text in (("a", BASE), ("b", EDITED), ("c", BASE + " Really."), ("d", OTHER)):
+        index.screen(pid, text, group=pid)
+    assert index.clusters() == [["a", "b", "c"]]
+
+
+def test_bands_must_divide_permutations():
+    with pytest.raises(ValueError):
+        LSHIndex("chat", store=LocalStore(":memory:"), bands=5)
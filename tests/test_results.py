@@ -0,0 +1,96 @@
+from collections import Counter
+
+from benchmarks.synthetic import FakeSheet
+from results import ResultsSheet, column_letter, get_least_used_combination, results_view
+
+
+def _append(sheet, pid, prompt_key, norm_key="n1"):
+    sheet.append_row([pid, prompt_key, norm_key])
+
+
+def test_column_letter():
+    assert [column_letter(i) for i in (1, 26, 27, 52, 53, 702, 703)] == ["A", "Z", "AA", "AZ", "BA", "ZZ", "AAA"]
+
+
+def test_fetch_reads_only_new_rows():
+    sheet = FakeSheet([])
+    view = ResultsSheet(sheet)
+    _append(sheet, "a", "p1")
+    assert view.fetch("prompt_key") == {"prompt_key": ["p1"]}
+
+    before = sheet.bytes_read
+    assert view.fetch("prompt_key") == {"prompt_key": ["p1"]}
+    assert sheet.bytes_read == before
+
+    _append(sheet, "b", "p2")
+    assert view.fetch("prompt_key") == {"prompt_key": ["p1", "p2"]}
+    assert view.row_count == 2
+
+
+def test_interleaved_pid_check_and_fetch_keeps_every_row():
+    sheet = FakeSheet([])
+    view = ResultsSheet(sheet)
+    _append(sheet, "a", "p1")
+    view.fetch("prompt_key", "norm_key")
+    _append(sheet, "b", "p2")
+    assert view.has_prolific_id("B")
+    _append(sheet, "c", "p3")
+    assert view.fetch("prompt_key", "norm_key") == {
+        "prompt_key": ["p1", "p2", "p3"],
+        "norm_key": ["n1", "n1", "n1"],
+    }
+
+
+def test_combination_counts_survive_interleaved_pid_checks():
+    sheet = FakeSheet([])
+    view = ResultsSheet(sheet)
+
+    def counts():
+        return view.aggregate(
+            "combinations", ("prompt_key", "norm_key"),
+            lambda acc, cols: acc + Counter(zip(cols["prompt_key"], cols["norm_key"])), Counter,
+        )
+
+    _append(sheet, "a", "p1")
+    assert counts() == Counter({("p1", "n1"): 1})
+    _append(sheet, "b", "p2")
+    view.has_prolific_id("b")
+    _append(sheet, "c", "p1")
+    view.has_prolific_id("c")
+    assert counts() == Counter({("p1", "n1"): 2, ("p2", "n1"): 1})
+
+
+def test_column_first_read_after_others_starts_from_top():
+    sheet = FakeSheet([])
+    view = ResultsSheet(sheet)
+    _append(sheet, "a", "p1", "n1")
+    _append(sheet, "b", "p2", "n2")
+    view.fetch("prompt_key")
+    _append(sheet, "c", "p3", "n3")
+    assert view.fetch("norm_key", "prompt_key") == {
+        "norm_key": ["n1", "n2", "n3"],
+        "prompt_key": ["p1", "p2", "p3"],
+    }
+
+
+def test_trailing_empty_cells_are_padded():
+    sheet = FakeSheet([])
+    view = ResultsSheet(sheet)
+    _append(sheet, "a", "p1")
+    _append(sheet, "b", "")
+    assert view.fetch("prompt_key") == {"prompt_key": ["p1", ""]}
+    sheet.rows[-1][1] = "p2"
+    _append(sheet, "c", "p3")
+    # La cella vuota già letta resta tale fino al refresh completo
+    assert view.fetch("prompt_key") == {"prompt_key": ["p1", "", "p3"]}
+
+
+def test_least_used_combination_balances_after_pid_checks():
+    sheet = FakeSheet([])
+    prompts, norms = {"1": {}, "2": {}}, {"n1": {}}
+    _append(sheet, "a", "1")
+    assert get_least_used_combination(sheet, prompts, norms) == ("2", "n1")
+    _append(sheet, "b", "2")
+    results_view(sheet).has_prolific_id("b")
+    _append(sheet, "c", "2")
+    assert get_least_used_combination(sheet, prompts, norms) == ("1", "n1")
@@ -0,0 +1,92 @@
+import json
+
+from session_codec import (
+    COMPRESS_MIN_CHARS, COMPRESSED_PREFIX, LAYOUTS, current_layout, decode_json, decode_row, decode_rows,
+    detect_layout, encode_json, encode_row,
+)
+
+
+def _long_conversation():
+    return [{"role": "user" if i % 2 else "assistant", "content": "word " * 200} for i in range(6)]
+
+
+def test_short_json_is_compact_and_uncompressed():
+    cell = encode_json({"Norm A": 40, "Norm B": 60})
+    assert cell == '{"Norm A":40,"Norm B":60}'
+    assert decode_json(cell) == {"Norm A": 40, "Norm B": 60}
+
+
+def test_long_json_round_trips_through_z_prefix():
+    value = _long_conversation()
+    cell = encode_json(value)
+    assert len(json.dumps(value)) > COMPRESS_MIN_CHARS
+    assert cell.startswith(COMPRESSED_PREFIX)
+    assert len(cell) < len(json.dumps(value))
+    assert decode_json(cell) == value
+
+
+def test_decode_json_accepts_indented_legacy_cells_and_defaults():
+    assert decode_json(json.dumps({"a": [1, 2]}, indent=2)) == {"a": [1, 2]}
+    assert decode_json("", default={}) == {}
+    assert decode_json("not json", default=[]) == []
+    assert decode_json("z:not base64", default=None) is None
+
+
+def test_study_row_round_trip_with_compressed_fields():
+    messages = _long_conversation()
+    record = {
+        "prolific_id": "pid1", "prompt_key": "3", "norm_key": "n2",
+        "initial_opinion": {"Norm": 40}, "messages": messages, "final_opinion": {"Norm": 55},
+        "comp_correct": True, "parallel_comp_time": 12.5, "engagement_word_count": 42,
+        "engagement_text": '{"looks": "like json"}', "client_timing": {"submit": 1.0},
+    }
+    row = encode_row("study", record)
+    assert row[-1] == "study@1"
+    assert row[current_layout("study").columns.index("messages")].startswith(COMPRESSED_PREFIX)
+
+    decoded = decode_row(row, "study")
+    assert decoded["_schema"] == "study@1"
+    assert decoded["messages"] == messages
+    assert decoded["initial_opinion"] == {"Norm": 40}
+    assert decoded["comp_correct"] is True
+    assert decoded["parallel_comp_time"] == 12.5
+    assert decoded["engagement_word_count"] == 42
+    # Il testo libero non viene mai decodificato come JSON
+    assert decoded["engagement_text"] == '{"looks": "like json"}'
+    assert decoded["threat"] is None
+
+
+def test_transcript_ref_is_kept_as_is():
+    row = encode_row("study", {"prolific_id": "pid", "messages": "sha256:" + "0" * 64})
+    assert decode_row(row, "study")["messages"] == "sha256:" + "0" * 64
+
+
+def test_legacy_rows_are_recognised_by_width():
+    legacy, older = LAYOUTS["study"][1], LAYOUTS["study"][2]
+    full = ["pid", "1", "n1", json.dumps({"N": 10}, indent=2)] + [""] * (legacy.width - 4)
+    full[legacy.columns.index("client_timing")] = '{"submit": 2}'
+    assert detect_layout(full, "study") is legacy
+    assert decode_row(full, "study")["client_timing"] == {"submit": 2}
+
+    short = ["pid", "1", "n1", '{"N": 10}'] + [""] * (older.width - 5) + ["2024-01-01 10:00:00"]
+    decoded = decode_row(short, "study")
+    assert decoded["_schema"] == "study@0"
+    assert "client_timing" not in decoded
+    assert decoded["timestamp"] == "2024-01-01 10:00:00"
+    assert decoded["initial_opinion"] == {"N": 10}
+
+
+def test_trailing_empty_cells_pick_the_shortest_legacy_layout():
+    # L'API non restituisce le celle vuote in fondo
+    assert detect_layout(["pid", "1", "n1"], "study") is LAYOUTS["study"][2]
+
+
+def test_mixed_layouts_in_one_sheet():
+    header = current_layout("m").header()
+    new = encode_row("m", {"prolific_id": "b", "initial_opinion": 30, "conversation": [{"role": "user"}]})
+    old = ["a", "1", "n1", "20", '[{"role": "assistant"}]', "70", "2024-01-01"]
+    records = decode_rows([header, old, new], "m")
+    assert [r["_schema"] for r in records] == ["m@0", "m@1"]
+    assert [r["initial_opinion"] for r in records] == [20, 30]
+    assert records[0]["conversation"] == [{"role": "assistant"}]
+    assert records[1]["final_opinion"] is None
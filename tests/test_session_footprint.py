@@ -0,0 +1,117 @@
+import gc
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+import session_footprint
+from local_store import LocalStore
+from session_footprint import EVICTED_NAMESPACE, SESSION_EVICTIONS, SessionRegistry
+
+
+class FakeState(dict):
+    """Quanto basta di SafeSessionState: mapping con filtered_state."""
+
+    @property
+    def filtered_state(self):
+        return dict(self)
+
+
+class BrokenState(FakeState):
+    def __delitem__(self, key):
+        raise RuntimeError("stato bloccato")
+
+
+class SpyStore(LocalStore):
+    def __init__(self):
+        super().__init__(":memory:")
+        self.pops = 0
+
+    def pop(self, namespace, key, default=None):
+        self.pops += 1
+        return super().pop(namespace, key, default)
+
+
+@pytest.fixture
+def env(monkeypatch):
+    store = SpyStore()
+    current = SimpleNamespace(ctx=None)
+    fake_st = SimpleNamespace(session_state=None)
+    monkeypatch.setattr(session_footprint, "get_store", lambda: store)
+    monkeypatch.setattr(session_footprint, "get_script_run_ctx", lambda: current.ctx)
+    monkeypatch.setattr(session_footprint, "_runtime_has_session", lambda sid: True)
+    monkeypatch.setattr(session_footprint, "st", fake_st)
+
+    def switch(session_id, state):
+        current.ctx = SimpleNamespace(session_id=session_id, session_state=state)
+        fake_st.session_state = state
+
+    return SimpleNamespace(store=store, switch=switch)
+
+
+def test_touch_does_not_read_store_for_sessions_never_evicted(env):
+    registry = SessionRegistry(sweep_interval=3600)
+    env.switch("a", FakeState(phase=1))
+    for _ in range(3):
+        registry.touch()
+    assert env.store.pops == 0
+
+
+def test_idle_session_is_evicted_and_restored(env):
+    registry = SessionRegistry(idle_timeout=10, sweep_interval=3600)
+    state = FakeState(phase=2, messages=["ciao"])
+    env.switch("a", state)
+    registry.touch()
+
+    assert registry.evict_idle(now=registry._sessions["a"][1] + 60) == 1
+    assert state == {}
+    assert env.store.get(EVICTED_NAMESPACE, "a") == {"phase": 2, "messages": ["ciao"]}
+
+    registry.touch()
+    assert state == {"phase": 2, "messages": ["ciao"]}
+    assert env.store.get(EVICTED_NAMESPACE, "a") is None
+    # Ripristinata una volta sola
+    registry.touch()
+    assert env.store.pops == 1
+
+
+def test_registry_does_not_keep_states_alive(env):
+    registry = SessionRegistry(sweep_interval=3600)
+    kept, dropped = FakeState(phase=1), FakeState(phase=3)
+    env.switch("a", kept)
+    registry.touch()
+    env.switch("b", dropped)
+    registry.touch()
+    assert registry.phase_counts() == {(1,): 1, (3,): 1}
+
+    # Streamlit libera lo stato della sessione b: il registro non lo trattiene
+    env.switch("a", kept)
+    del dropped
+    gc.collect()
+    assert registry.phase_counts() == {(1,): 1}
+    registry.evict_idle()
+    assert set(registry._sessions) == {"a"}
+
+
+def test_sessions_closed_by_runtime_are_dropped_not_evicted(env, monkeypatch):
+    registry = SessionRegistry(idle_timeout=10, sweep_interval=3600)
+    state = FakeState(phase=1)
+    env.switch("a", state)
+    registry.touch()
+
+    monkeypatch.setattr(session_footprint, "_runtime_has_session", lambda sid: False)
+    assert registry.evict_idle(now=registry._sessions["a"][1] + 60) == 0
+    assert registry._sessions == {}
+    assert env.store.get(EVICTED_NAMESPACE, "a") is None
+    assert state == {"phase": 1}
+
+
+def test_eviction_failure_is_counted(env):
+    registry = SessionRegistry(idle_timeout=10, sweep_interval=3600)
+    env.switch("a", BrokenState(phase=1))
+    registry.touch()
+
+    failures = SESSION_EVICTIONS.value("failure")
+    assert registry.evict_idle(now=registry._sessions["a"][1] + 60) == 0
+    assert SESSION_EVICTIONS.value("failure") == failures + 1
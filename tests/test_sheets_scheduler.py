@@ -0,0 +1,97 @@
+import threading
+import time
+
+import pytest
+
+from benchmarks.synthetic import FakeSheet
+from sheets_scheduler import (
+    PRIORITY_DIAGNOSTIC, PRIORITY_READ, PRIORITY_WRITE, ScheduledSheet, SheetsScheduler, TokenBucket,
+)
+
+
+def test_bucket_serves_burst_without_waiting():
+    bucket = TokenBucket(per_minute=60, capacity=3)
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+
+
+def test_bucket_waits_for_refill_once_empty():
+    bucket = TokenBucket(per_minute=600, capacity=1)
+    bucket.acquire()
+    start = time.monotonic()
+    waited = bucket.acquire()
+    elapsed = time.monotonic() - start
+    # 600/min = un token ogni 0.1 s
+    assert 0.05 < waited <= 0.15
+    assert elapsed >= 0.05
+
+
+def test_bucket_default_capacity_is_ten_seconds_of_quota():
+    assert TokenBucket(per_minute=60).capacity == 10
+    assert TokenBucket(per_minute=3).capacity == 1
+
+
+@pytest.fixture
+def blocked_scheduler():
+    """Scheduler con un solo worker, fermo su una chiamata finché non si rilascia il gate."""
+    pytest.importorskip("gspread")
+    scheduler = SheetsScheduler(read_quota=6000, write_quota=6000, workers=1)
+    gate, started = threading.Event(), threading.Event()
+
+    def hold():
+        started.set()
+        gate.wait(5)
+
+    blocker = scheduler.submit(hold, kind="write", label="hold")
+    started.wait(5)
+    yield scheduler, gate
+    gate.set()
+    blocker.result(5)
+
+
+def test_writes_before_reads_before_diagnostics(blocked_scheduler):
+    scheduler, gate = blocked_scheduler
+    order = []
+    futures = [
+        scheduler.submit(order.append, "diagnostic", priority=PRIORITY_DIAGNOSTIC),
+        scheduler.submit(order.append, "read", kind="read"),
+        scheduler.submit(order.append, "write", kind="write"),
+        scheduler.submit(order.append, "read 2", priority=PRIORITY_READ),
+        scheduler.submit(order.append, "write 2", priority=PRIORITY_WRITE),
+    ]
+    gate.set()
+    for future in futures:
+        future.result(5)
+    assert order == ["write", "write 2", "read", "read 2", "diagnostic"]
+
+
+def test_identical_reads_are_coalesced(blocked_scheduler):
+    scheduler, gate = blocked_scheduler
+    calls = []
+
+    def read():
+        calls.append(1)
+        return ["a", "b"]
+
+    first = scheduler.submit(read, key=("sheet", "col_values", 1))
+    second = scheduler.submit(read, key=("sheet", "col_values", 1))
+    gate.set()
+    assert first is second
+    assert first.result(5) == ["a", "b"]
+    assert calls == [1]
+    assert scheduler.metrics()["coalesced"] == 1
+
+
+def test_scheduled_sheet_reads_and_appends_through_the_scheduler():
+    pytest.importorskip("gspread")
+
+    class Worksheet(FakeSheet):
+        id = 1
+        spreadsheet = type("Spreadsheet", (), {"id": "doc"})()
+
+    worksheet = Worksheet([["a", "1"]], header=["prolific_id", "prompt_key"])
+    scheduler = SheetsScheduler(read_quota=6000, write_quota=6000, workers=2)
+    sheet = ScheduledSheet(worksheet, scheduler)
+    sheet.append_row(["b", "2"])
+    assert sheet.col_values(1) == ["prolific_id", "a", "b"]
+    assert sheet.id == 1
+    assert scheduler.metrics()["requests"] == {"append_row": 1, "col_values": 1}
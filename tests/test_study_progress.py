@@ -0,0 +1,93 @@
+import pytest
+
+from local_store import LocalStore
+from study_progress import (
+    DURATION_BUCKETS, LATENCY_BUCKETS, histogram_quantile, load_latency, load_progress, open_sessions,
+    record_completion, record_latency, record_progress,
+)
+
+
+def test_quantile_of_empty_histogram_is_none():
+    assert histogram_quantile([0] * (len(LATENCY_BUCKETS) + 1), LATENCY_BUCKETS, 0.5) is None
+
+
+def test_quantile_interpolates_within_bucket():
+    buckets = (1, 2, 4)
+    # 4 osservazioni in (1, 2]
+    histogram = [0, 4, 0, 0]
+    assert histogram_quantile(histogram, buckets, 0.5) == pytest.approx(1.5)
+    assert histogram_quantile(histogram, buckets, 1.0) == pytest.approx(2.0)
+    # Il primo bucket parte da 0
+    assert histogram_quantile([2, 0, 0, 0], buckets, 0.5) == pytest.approx(0.5)
+
+
+def test_quantile_across_buckets():
+    buckets = (1, 2, 4)
+    histogram = [1, 1, 2, 0]
+    assert histogram_quantile(histogram, buckets, 0.25) == pytest.approx(1.0)
+    assert histogram_quantile(histogram, buckets, 0.75) == pytest.approx(3.0)
+
+
+def test_quantile_in_overflow_bucket_is_last_bound():
+    assert histogram_quantile([0, 0, 0, 3], (1, 2, 4), 0.9) == 4.0
+
+
+def test_latency_histogram():
+    store = LocalStore(":memory:")
+    for seconds in (0.2, 0.3, 0.4, 20):
+        record_latency("llm", seconds, store=store)
+    histogram = load_latency("llm", store=store)
+    assert sum(histogram) == 4
+    assert 0.1 < histogram_quantile(histogram, LATENCY_BUCKETS, 0.5) <= 0.5
+    assert sum(load_latency("sheets", store=store)) == 0
+
+
+def test_progress_counts_each_phase_once_per_session(monkeypatch):
+    store = LocalStore(":memory:")
+    clock = iter(range(1000, 2000, 10))
+    monkeypatch.setattr("study_progress.time.time", lambda: next(clock))
+
+    state = {"phase": 0}
+    record_progress("study", state, "pid", store=store)
+    record_progress("study", state, "pid", store=store)  # stesso rerun: nessuna scrittura
+    state.update(phase=1, prompt_key="3", norm_key="n1")
+    record_progress("study", state, "pid", store=store)
+    # Ripristino da checkpoint: nuovo state con la stessa fase
+    restored = {"phase": 1, "prompt_key": "3", "norm_key": "n1"}
+    record_progress("study", restored, "pid", store=store)
+
+    progress = load_progress("study", store=store)
+    assert progress["entered"] == {0: 1, 1: 1}
+    assert progress["assigned"] == {("3", "n1"): 1}
+    assert sum(progress["phase_seconds"][0]) == 1
+    assert open_sessions("study", store=store, now=1100) == {1: {"active": 1, "dropped": 0}}
+
+
+def test_progress_with_explicit_phase_and_condition():
+    # Le app senza motore delle fasi passano fase e condizione (chiavi selected_*)
+    store = LocalStore(":memory:")
+    state = {}
+    record_progress("pilot", state, "pid", phase=2, condition=(None, None), store=store)
+    record_progress("pilot", state, "pid", phase=3, condition=(None, None), store=store)
+    record_progress("pilot", state, "pid", phase=4, condition=("2", "norm_5"), store=store)
+    record_progress("pilot", state, "pid", phase=4, condition=("2", "norm_5"), store=store)
+
+    progress = load_progress("pilot", store=store)
+    assert progress["entered"] == {2: 1, 3: 1, 4: 1}
+    assert progress["assigned"] == {("2", "norm_5"): 1}
+    assert "phase" not in state
+
+
+def test_completion_closes_the_session():
+    store = LocalStore(":memory:")
+    state = {"phase": 9, "prompt_key": "1", "norm_key": "n2"}
+    record_progress("study", state, "pid", store=store)
+    record_completion("study", "pid", "1", "n2", total_seconds=700, store=store)
+    state["phase"] = 10
+    record_progress("study", state, "pid", store=store)
+
+    progress = load_progress("study", store=store)
+    assert progress["completed"] == {("1", "n2"): 1}
+    assert sum(progress["total_seconds"]) == 1
+    assert histogram_quantile(progress["total_seconds"], DURATION_BUCKETS, 0.5) <= 900
+    assert open_sessions("study", store=store) == {}
@@ -0,0 +1,121 @@
+import json
+
+import pytest
+
+from benchmarks.synthetic import FakeSheet
+from local_store import LocalStore
+from session_codec import encode_json
+from transcript_store import (
+    CHUNK_CHARS, TRANSCRIPT_HEADER, LazyTranscript, LocalTranscriptStore, SheetTranscriptStore,
+    canonical_json, is_transcript_ref, transcript_ref, with_transcripts,
+)
+
+
+class TranscriptSheet(FakeSheet):
+    """Worksheet "transcripts" in memoria, con append_rows come gspread."""
+
+    def __init__(self):
+        super().__init__([], header=TRANSCRIPT_HEADER)
+        self.appends = 0
+        self.reads = 0
+
+    def append_rows(self, rows, value_input_option=None):
+        self.appends += 1
+        for row in rows:
+            self.append_row(row)
+
+    def get_all_values(self):
+        self.reads += 1
+        return super().get_all_values()
+
+
+MESSAGES = [
+    {"role": "assistant", "content": "Hello, what do you think?", "timestamp": "2026-01-01T10:00:00"},
+    {"role": "user", "content": "I am not sure.", "timestamp": "2026-01-01T10:00:30"},
+]
+
+
+def test_ref_is_content_addressed():
+    reordered = [{k: m[k] for k in reversed(list(m))} for m in MESSAGES]
+    ref = transcript_ref(canonical_json(MESSAGES))
+    assert ref == transcript_ref(canonical_json(reordered))
+    assert is_transcript_ref(ref) and len(ref) == len("sha256:") + 64
+    assert not is_transcript_ref(json.dumps(MESSAGES))
+
+
+def test_local_store_round_trip():
+    store = LocalTranscriptStore(LocalStore(":memory:"))
+    ref = store.put(MESSAGES)
+    assert store.put(MESSAGES) == ref
+    assert store.get(ref) == MESSAGES
+    with pytest.raises(KeyError):
+        store.get("sha256:" + "0" * 64)
+
+
+def test_sheet_store_writes_each_transcript_once():
+    sheet = TranscriptSheet()
+    store = SheetTranscriptStore(sheet)
+    ref = store.put(MESSAGES)
+    assert store.put(MESSAGES) == ref
+    assert sheet.appends == 1
+    assert sheet.rows[1][:3] == [ref, "0", "1"]
+
+
+def test_sheet_store_splits_long_transcripts_into_parts():
+    long_messages = [{"role": "user", "content": "x" * CHUNK_CHARS}, {"role": "assistant", "content": "y" * 100}]
+    sheet = TranscriptSheet()
+    ref = SheetTranscriptStore(sheet).put(long_messages)
+    parts = [row for row in sheet.rows[1:] if row[0] == ref]
+    assert len(parts) == 2
+    assert all(len(row[3]) <= CHUNK_CHARS for row in parts)
+    # Un altro processo legge dal foglio, non dalla propria cache
+    assert SheetTranscriptStore(sheet).get(ref) == long_messages
+
+
+def test_sheet_store_reloads_index_only_for_unknown_refs():
+    sheet = TranscriptSheet()
+    writer, reader = SheetTranscriptStore(sheet), SheetTranscriptStore(sheet)
+    first = writer.put(MESSAGES)
+    assert reader.get(first) == MESSAGES
+    assert reader.get(first) == MESSAGES
+    assert sheet.reads == 1
+
+    second = writer.put(MESSAGES[:1])
+    assert reader.get(second) == MESSAGES[:1]
+    assert sheet.reads == 2
+    with pytest.raises(KeyError):
+        reader.get("sha256:" + "f" * 64)
+
+
+def test_incomplete_transcript_raises():
+    sheet = TranscriptSheet()
+    sheet.append_row(["sha256:abc", "0", "2", '[{"role":'])
+    with pytest.raises(ValueError):
+        SheetTranscriptStore(sheet).get("sha256:abc")
+
+
+def test_lazy_transcript_loads_on_first_access():
+    store = LocalTranscriptStore(LocalStore(":memory:"))
+    ref = store.put(MESSAGES)
+    lazy = LazyTranscript(ref, store)
+    assert not lazy.loaded
+    assert len(lazy) == 2 and lazy[1]["content"] == "I am not sure."
+    assert lazy.loaded
+
+
+def test_lazy_transcript_reads_inline_cells():
+    long_messages = MESSAGES * 40
+    compressed = encode_json(long_messages)
+    assert compressed.startswith("z:")
+    assert LazyTranscript(compressed, None).messages == long_messages
+    assert LazyTranscript(json.dumps(MESSAGES, indent=2), None).messages == MESSAGES
+    assert LazyTranscript("", None).messages == []
+
+
+def test_with_transcripts_wraps_only_the_transcript_column():
+    store = LocalTranscriptStore(LocalStore(":memory:"))
+    ref = store.put(MESSAGES)
+    rows = with_transcripts([["pid", "1", "n1", "{}", ref, "{}"], ["short"]], store)
+    assert isinstance(rows[0][4], LazyTranscript) and not rows[0][4].loaded
+    assert list(rows[0][4]) == MESSAGES
+    assert rows[1] == ["short"]
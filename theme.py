@@ -0,0 +1,105 @@
+import os
+import hashlib
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+
+# ============================================================================
+# TEMA GRAFICO CONDIVISO
+# ============================================================================
+# I fogli di stile vivono in static/ e vengono iniettati nell'<head> della
+# pagina una sola volta per sessione: i rerun successivi non inviano CSS.
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+BASE_STYLESHEET = "theme.css"
+
+
+@st.cache_data(show_spinner=False)
+def load_stylesheet(name):
+    """
+    Legge un foglio di stile da static/.
+
+    Args:
+        name (str): Nome del file CSS (es. "theme.css")
+
+    Returns:
+        str: Contenuto del file
+    """
+    with open(os.path.join(STATIC_DIR, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def stylesheet_version(name):
+    """Hash breve del contenuto: un foglio modificato viene iniettato di nuovo."""
+    return hashlib.sha1(load_stylesheet(name).encode("utf-8")).hexdigest()[:10]
+
+
+def inline_style(names):
+    """Blocco <style> equivalente, come veniva inviato prima ad ogni rerun."""
+    return "<style>\n" + "\n".join(load_stylesheet(name) for name in names) + "</style>"
+
+
+def injection_script(names):
+    """Script che inserisce il CSS nell'<head> della pagina padre (idempotente per id)."""
+    css = "\n".join(load_stylesheet(name) for name in names)
+    style_id = "study-theme-" + "-".join(stylesheet_version(name) for name in names)
+    return f"""
+        <script>
+        const doc = window.parent.document;
+        if (!doc.getElementById({style_id!r})) {{
+            const style = doc.createElement("style");
+            style.id = {style_id!r};
+            style.textContent = {css!r};
+            doc.head.appendChild(style);
+        }}
+        </script>
+        """
+
+
+def apply_theme(*stylesheets):
+    """
+    Applica il tema condiviso più eventuali fogli di stile specifici dell'app.
+
+    Da chiamare subito dopo st.set_page_config, al posto del vecchio
+    st.markdown("<style>...</style>").
+
+    Args:
+        *stylesheets (str): Fogli di stile aggiuntivi in static/ (es. "m.css")
+    """
+    names = (BASE_STYLESHEET,) + stylesheets
+    if st.session_state.get("_theme_injected") != names:
+        components.html(injection_script(names), height=0)
+        st.session_state["_theme_injected"] = names
+
+
+# ============================================================================
+# MISURA DEL PAYLOAD PER RERUN
+# ============================================================================
+APP_STYLESHEETS = {
+    "pilot_study.py": ("pilot_study.css",),
+    "m.py": ("m.css",),
+    "test_epistemia.py": ("test_epistemia.css",),
+}
+
+
+def payload_report():
+    """
+    Byte di stile inviati al browser: prima un blocco <style> inline ad ogni
+    rerun, ora lo script di iniezione una volta per sessione.
+
+    Returns:
+        dict: {app: {"inline_bytes": int, "session_bytes": int}}
+    """
+    report = {}
+    for app, extra in APP_STYLESHEETS.items():
+        names = (BASE_STYLESHEET,) + extra
+        report[app] = {
+            "inline_bytes": len(inline_style(names).encode("utf-8")),
+            "session_bytes": len(injection_script(names).encode("utf-8")),
+        }
+    return report
+
+
+if __name__ == "__main__":
+    for app, sizes in payload_report().items():
+        print(f"{app:20s} prima: {sizes['inline_bytes']:6d} B/rerun   dopo: {sizes['session_bytes']:6d} B/sessione, 0 B/rerun")
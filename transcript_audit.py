@@ -0,0 +1,392 @@
+import argparse
+import csv
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from replay import csv_transcripts, print_unresolved, sessions_from_csv, sessions_from_sheet, sessions_from_checkpoints
+
+
+# ============================================================================
+# VERIFICA DEI VINCOLI DEI TEMPLATE SULLE RISPOSTE DEL MODELLO
+# ============================================================================
+# Ogni template di prompts.json impone vincoli precisi (niente fatti o
+# statistiche nelle condizioni 1/2, niente riferimenti agli altri nelle 1-4,
+# una domanda in chiusura, ...). Qui ogni vincolo è una regola con una regex
+# compilata una volta; le risposte dell'assistente vengono unite in un unico
+# testo separato da SEPARATOR, ogni regola lo scorre una sola volta e le
+# posizioni dei match vengono riportate ai messaggi con np.searchsorted. I
+# blocchi di messaggi sono distribuiti su più processi.
+#
+# Le regole sono euristiche lessicali: segnalano i messaggi da rileggere,
+# non sostituiscono la codifica manuale.
+#
+# Uso:
+#   python transcript_audit.py --csv results.csv
+#   python transcript_audit.py --csv results.csv --transcripts-url URL --credentials service_account.json
+#   python transcript_audit.py --sheet-url URL --credentials service_account.json
+#   python transcript_audit.py --eval batch_eval.csv --out violations.csv
+#   python transcript_audit.py --checkpoints --by-norm
+SEPARATOR = "\x00"
+CHUNK_MESSAGES = 5000
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+
+def _trie(phrases):
+    """Alternativa regex a trie: a ogni posizione si prova un solo ramo per carattere."""
+    root = {}
+    for phrase in phrases:
+        node = root
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        optional = "" in node
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")" + ("?" if optional else "")
+
+    return build(root)
+
+
+def _lexicon(*phrases):
+    """Regex per un elenco di parole o frasi intere (in minuscolo)."""
+    return rf"\b{_trie(phrases)}\b"
+
+
+class Rule:
+    """
+    Vincolo su un singolo messaggio dell'assistente.
+
+    Args:
+        name (str): Nome della regola (colonna del report)
+        pattern (str): Regex sul testo in minuscolo; non deve attraversare SEPARATOR
+        require (bool): False = il match è una violazione; True = la
+            violazione è l'assenza di match
+    """
+
+    def __init__(self, name, pattern, require=False):
+        self.name = name
+        self.regex = re.compile(pattern)
+        self.require = require
+
+
+RULES = [
+    # Tutti i template: "Do NOT tell the user that your goal is to persuade them..."
+    Rule("no_disclosure", _lexicon(
+        "persuade you", "convince you", "change your mind", "change your opinion", "my goal",
+        "my objective", "my task", "this experiment", "this study", "opinion change",
+    )),
+    # 1-2: "Do NOT present facts, statistics, scientific evidence, or empirical claims."
+    Rule("no_facts", "|".join([
+        r"\b\d+(?:[.,]\d+)?\s*(?:%|percent\b|per cent\b)",
+        _lexicon(
+            "studies show", "studies suggest", "a study", "research shows", "research suggests",
+            "research", "researchers", "according to", "statistics", "statistically", "data",
+            "survey", "surveys", "scientists", "scientific", "evidence", "meta-analysis",
+        ),
+    ])),
+    # 1-4: "Do NOT refer to what other people do, think, approve of, or disapprove of"
+    # e "Do NOT mention social expectations, social approval, norms, or typical behaviors."
+    Rule("no_social_reference", _lexicon(
+        "most people", "many people", "other people", "others", "everyone", "everybody",
+        "society", "societal", "socially", "social norm", "social norms", "norms",
+        "social expectations", "majority", "peers", "community", "widely accepted",
+        "commonly accepted", "frowned upon", "people tend", "people usually", "people often",
+        "typical", "typically",
+    )),
+    # 5-6: "Do NOT introduce personal opinions or individual preferences as arguments."
+    Rule("no_personal_opinion", _lexicon(
+        "i think", "i believe", "in my opinion", "personally", "i feel", "my view",
+        "i would argue", "i'd argue", "if you ask me",
+    )),
+    # 5-6: "Do NOT appeal to utilitarian, moral, emotional, or psychological consequences"
+    Rule("no_consequence_appeal", _lexicon(
+        "health", "healthy", "well-being", "wellbeing", "harm", "harmful", "benefit", "benefits",
+        "beneficial", "moral", "morally", "ethical", "unethical", "consequences",
+    )),
+    # "End every message by asking the user a question": "?" seguito solo da
+    # spazi, virgolette, parentesi o emoji fino alla fine del messaggio
+    Rule("ends_with_question", rf"\?[^\w{SEPARATOR}]*{SEPARATOR}", require=True),
+]
+RULE_NAMES = [rule.name for rule in RULES]
+
+# Regole per template (chiave di prompts.json); i template non elencati
+# vengono verificati solo con DEFAULT_RULES
+CONDITION_RULES = {
+    "1": ("no_disclosure", "no_facts", "no_social_reference", "ends_with_question"),
+    "2": ("no_disclosure", "no_facts", "no_social_reference", "ends_with_question"),
+    "3": ("no_disclosure", "no_social_reference"),
+    "4": ("no_disclosure", "no_social_reference", "ends_with_question"),
+    "5": ("no_disclosure", "no_personal_opinion", "no_consequence_appeal", "ends_with_question"),
+    "6": ("no_disclosure", "no_personal_opinion", "no_consequence_appeal", "ends_with_question"),
+}
+DEFAULT_RULES = ("no_disclosure",)
+
+
+def applicable_rules(prompt_key):
+    """Maschera bool (len(RULES),) delle regole del template."""
+    names = CONDITION_RULES.get(str(prompt_key), DEFAULT_RULES)
+    return np.array([name in names for name in RULE_NAMES], dtype=bool)
+
+
+# ============================================================================
+# SCANSIONE
+# ============================================================================
+def scan(texts):
+    """
+    Match delle regole su un blocco di messaggi.
+
+    Args:
+        texts (list): Testi dei messaggi
+
+    Returns:
+        np.ndarray: bool, shape (len(RULES), len(texts)); True dove la
+            regola è violata (senza tener conto del template)
+    """
+    # lower() per messaggio: può cambiare la lunghezza del testo
+    texts = [t.replace(SEPARATOR, " ").lower() for t in texts]
+    joined = SEPARATOR.join(texts) + SEPARATOR
+    # ends[i] = posizione subito dopo il separatore del messaggio i
+    ends = np.cumsum(np.fromiter((len(t) + 1 for t in texts), dtype=np.int64, count=len(texts)))
+    hits = np.zeros((len(RULES), len(texts)), dtype=bool)
+    for r, rule in enumerate(RULES):
+        # Basta il primo match per messaggio: dopo un match si riparte dal messaggio successivo
+        starts, pos, search = [], 0, rule.regex.search
+        while True:
+            match = search(joined, pos)
+            if match is None:
+                break
+            starts.append(match.start())
+            pos = joined.index(SEPARATOR, match.start()) + 1
+        hits[r, np.searchsorted(ends, np.array(starts, dtype=np.int64), side="right")] = True
+        if rule.require:
+            hits[r] = ~hits[r]
+    return hits
+
+
+def scan_all(texts, workers=DEFAULT_WORKERS, chunk=CHUNK_MESSAGES):
+    """scan() a blocchi di `chunk` messaggi, su più processi se ce n'è più di uno."""
+    if not texts:
+        return np.zeros((len(RULES), 0), dtype=bool)
+    chunks = [texts[i:i + chunk] for i in range(0, len(texts), chunk)]
+    if workers <= 1 or len(chunks) == 1:
+        return np.concatenate([scan(c) for c in chunks], axis=1)
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        return np.concatenate(list(pool.map(scan, chunks)), axis=1)
+
+
+# ============================================================================
+# SORGENTI
+# ============================================================================
+def transcripts_from_eval(path):
+    """Conversazioni di batch_eval.py (csv o jsonl), una per cella, in ordine di turno."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        rows = [json.loads(line) for line in f if line.strip()] if path.endswith(".jsonl") else list(csv.DictReader(f))
+    cells = {}
+    for row in rows:
+        cell = (str(row["prompt_key"]), str(row["norm_key"]), str(row["initial_opinion"]))
+        cells.setdefault(cell, []).append((int(row["turn"]), row))
+    transcripts = []
+    for (prompt_key, norm_key, opinion), turns in cells.items():
+        messages = []
+        for _, row in sorted(turns, key=lambda t: t[0]):
+            if row["user"]:
+                messages.append({"role": "user", "content": row["user"]})
+            messages.append({"role": "assistant", "content": row["text"]})
+        transcripts.append({
+            "prolific_id": f"eval:{prompt_key}/{norm_key}/{opinion}",
+            "prompt_key": prompt_key,
+            "norm_key": norm_key,
+            "messages": messages,
+        })
+    return transcripts
+
+
+class AssistantMessages:
+    """
+    Risposte dell'assistente di tutte le conversazioni, in array paralleli.
+
+    Attributes:
+        texts (list): Testo dei messaggi, shape (M,)
+        transcript_idx (np.ndarray): Conversazione di provenienza, shape (M,)
+        turn (np.ndarray): Indice del messaggio nella conversazione, shape (M,)
+        applies (np.ndarray): bool, shape (len(RULES), M); regole del template
+        transcripts (list): Conversazioni di origine
+    """
+
+    def __init__(self, transcripts):
+        self.transcripts = transcripts
+        self.texts = []
+        transcript_idx, turn, masks = [], [], {}
+        for t, transcript in enumerate(transcripts):
+            for i, message in enumerate(transcript["messages"]):
+                if message.get("role") != "assistant":
+                    continue
+                self.texts.append(message.get("content") or "")
+                transcript_idx.append(t)
+                turn.append(i)
+        self.transcript_idx = np.array(transcript_idx, dtype=np.int64)
+        self.turn = np.array(turn, dtype=np.int64)
+
+        prompt_keys = [str(t["prompt_key"]) for t in transcripts]
+        for key in set(prompt_keys):
+            masks[key] = applicable_rules(key)
+        per_transcript = np.array([masks[k] for k in prompt_keys], dtype=bool).reshape(-1, len(RULES))
+        self.applies = per_transcript[self.transcript_idx].T if len(self.texts) else np.zeros((len(RULES), 0), bool)
+
+    def __len__(self):
+        return len(self.texts)
+
+
+# ============================================================================
+# REPORT
+# ============================================================================
+def audit(transcripts, workers=DEFAULT_WORKERS):
+    """
+    Returns:
+        tuple: (AssistantMessages, violazioni bool shape (len(RULES), M))
+    """
+    messages = AssistantMessages(transcripts)
+    violations = scan_all(messages.texts, workers) & messages.applies
+    return messages, violations
+
+
+def condition_rates(messages, violations, by_norm=False):
+    """
+    Tassi di violazione per condizione.
+
+    Args:
+        by_norm (bool): Condizione = (prompt_key, norm_key) invece del solo prompt_key
+
+    Returns:
+        list: Un dict per condizione con messaggi, conversazioni, tasso per
+            regola (sui messaggi a cui la regola si applica; None se non si
+            applica), quota di messaggi e di conversazioni con almeno una violazione
+    """
+    def condition(transcript):
+        key = str(transcript["prompt_key"])
+        return (key, str(transcript["norm_key"])) if by_norm else (key,)
+
+    conditions = sorted({condition(t) for t in messages.transcripts})
+    position = {c: i for i, c in enumerate(conditions)}
+    transcript_group = np.array([position[condition(t)] for t in messages.transcripts], dtype=np.int64)
+    groups = transcript_group[messages.transcript_idx]
+    n = len(conditions)
+
+    n_messages = np.bincount(groups, minlength=n)
+    applied = np.stack([np.bincount(groups, weights=row, minlength=n) for row in messages.applies]) \
+        if len(messages) else np.zeros((len(RULES), n))
+    violated = np.stack([np.bincount(groups, weights=row, minlength=n) for row in violations]) \
+        if len(messages) else np.zeros((len(RULES), n))
+    any_message = violations.any(axis=0)
+
+    flagged = np.zeros(len(messages.transcripts), dtype=bool)
+    flagged[messages.transcript_idx[any_message]] = True
+
+    rows = []
+    for g, key in enumerate(conditions):
+        entry = {"prompt_key": key[0]}
+        if by_norm:
+            entry["norm_key"] = key[1]
+        entry["messages"] = int(n_messages[g])
+        entry["transcripts"] = int(np.sum(transcript_group == g))
+        for r, name in enumerate(RULE_NAMES):
+            entry[name] = float(violated[r, g] / applied[r, g]) if applied[r, g] else None
+        entry["any_message"] = float(np.sum(any_message[groups == g]) / n_messages[g]) if n_messages[g] else None
+        entry["any_transcript"] = float(np.mean(flagged[transcript_group == g])) if entry["transcripts"] else None
+        rows.append(entry)
+    return rows
+
+
+def message_violations(messages, violations):
+    """Un dict per messaggio con almeno una violazione."""
+    rows = []
+    for m in np.flatnonzero(violations.any(axis=0)):
+        transcript = messages.transcripts[messages.transcript_idx[m]]
+        rows.append({
+            "prolific_id": transcript["prolific_id"],
+            "prompt_key": transcript["prompt_key"],
+            "norm_key": transcript["norm_key"],
+            "turn": int(messages.turn[m]),
+            "violations": ";".join(name for r, name in enumerate(RULE_NAMES) if violations[r, m]),
+            "text": messages.texts[m],
+        })
+    return rows
+
+
+def write_violations(rows, path):
+    """CSV o JSONL a seconda dell'estensione."""
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if path.endswith(".jsonl"):
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        else:
+            writer = csv.DictWriter(f, fieldnames=["prolific_id", "prompt_key", "norm_key", "turn", "violations", "text"])
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def print_report(rows, by_norm=False):
+    def pct(value):
+        return f"{value * 100:6.1f}%" if value is not None else "      -"
+
+    names = RULE_NAMES + ["any_message", "any_transcript"]
+    key_header = f"{'prompt':>6} {'norm':>8}" if by_norm else f"{'prompt':>6}"
+    print(f"{key_header} {'msg':>6} {'conv':>5} " + " ".join(f"{name[:14]:>14}" for name in names))
+    for row in rows:
+        key = f"{row['prompt_key']:>6} {row['norm_key']:>8}" if by_norm else f"{row['prompt_key']:>6}"
+        print(f"{key} {row['messages']:>6} {row['transcripts']:>5} " + " ".join(f"{pct(row[name]):>14}" for name in names))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica dei vincoli dei template sulle risposte del modello.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--csv", help="Export CSV del foglio risultati")
+    source.add_argument("--sheet-url", help="URL del foglio risultati")
+    source.add_argument("--checkpoints", action="store_true", help="Checkpoint in local_store")
+    source.add_argument("--eval", help="Risultati di batch_eval.py (csv o jsonl)")
+    parser.add_argument("--transcripts-url", help="Foglio da cui risolvere le conversazioni dell'export CSV")
+    parser.add_argument("--credentials", help="JSON del service account (con --sheet-url o --transcripts-url)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--by-norm", action="store_true", help="Una riga per (prompt, norma)")
+    parser.add_argument("--out", help="Messaggi con violazioni (.csv o .jsonl)")
+    args = parser.parse_args()
+
+    if (args.sheet_url or args.transcripts_url) and not args.credentials:
+        parser.error("--sheet-url e --transcripts-url richiedono --credentials")
+    start = time.perf_counter()
+    unresolved = []
+    if args.csv:
+        transcripts = sessions_from_csv(args.csv, csv_transcripts(args.transcripts_url, args.credentials), unresolved)
+    elif args.sheet_url:
+        transcripts = sessions_from_sheet(args.sheet_url, args.credentials, unresolved)
+    elif args.eval:
+        transcripts = transcripts_from_eval(args.eval)
+    else:
+        transcripts = sessions_from_checkpoints()
+    loaded = time.perf_counter()
+    print_unresolved(unresolved)
+
+    messages, violations = audit(transcripts, args.workers)
+    audited = time.perf_counter()
+
+    print_report(condition_rates(messages, violations, args.by_norm), args.by_norm)
+    print(f"\n{len(transcripts)} conversazioni, {len(messages)} risposte; "
+          f"caricamento {loaded - start:.2f} s, verifica {audited - loaded:.2f} s")
+    if args.out:
+        rows = message_violations(messages, violations)
+        write_violations(rows, args.out)
+        print(f"{len(rows)} messaggi con violazioni -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
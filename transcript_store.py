@@ -0,0 +1,253 @@
+import hashlib
+import json
+import os
+import threading
+import zlib
+
+from local_store import get_store
+from session_codec import decode_json
+
+
+# ============================================================================
+# ARCHIVIO DELLE CONVERSAZIONI (CONTENT-ADDRESSED)
+# ============================================================================
+# La riga di riepilogo nel foglio principale contiene solo un riferimento
+# "sha256:<hash>" alla conversazione; il testo completo sta in un archivio
+# separato indicizzato per hash:
+#   - "sheet": worksheet secondario "transcripts" (hash, parte, totale parti,
+#     testo), con la conversazione spezzata sotto il limite di 50k caratteri
+#     per cella di Google Sheets;
+#   - "local": blob zlib in local_store (sviluppo, benchmark, analisi offline).
+# Le righe vecchie con il JSON nella cella restano leggibili da LazyTranscript.
+TRANSCRIPT_BACKEND = os.environ.get("TRANSCRIPT_STORE", "sheet")
+TRANSCRIPT_WORKSHEET = "transcripts"
+TRANSCRIPT_HEADER = ["hash", "part", "parts", "content"]
+REF_PREFIX = "sha256:"
+
+# Margine sotto i 50.000 caratteri per cella
+CHUNK_CHARS = 45_000
+
+
+def canonical_json(messages):
+    """JSON compatto e deterministico della conversazione (base dell'hash)."""
+    return json.dumps(messages, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def transcript_ref(payload):
+    """Riferimento "sha256:<hex>" per il JSON canonico della conversazione."""
+    return REF_PREFIX + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def is_transcript_ref(cell):
+    return isinstance(cell, str) and cell.startswith(REF_PREFIX)
+
+
+class LocalTranscriptStore:
+    """Conversazioni come blob zlib in local_store (namespace "transcripts")."""
+
+    NAMESPACE = "transcripts"
+
+    def __init__(self, store=None):
+        self.store = store or get_store()
+
+    def put(self, messages):
+        payload = canonical_json(messages)
+        ref = transcript_ref(payload)
+        if self.store.get(self.NAMESPACE, ref) is None:
+            self.store.put(self.NAMESPACE, ref, zlib.compress(payload.encode("utf-8"), 6))
+        return ref
+
+    def get(self, ref):
+        blob = self.store.get(self.NAMESPACE, ref)
+        if blob is None:
+            raise KeyError(ref)
+        return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+class SheetTranscriptStore:
+    """
+    Conversazioni nel worksheet secondario, una o più righe per hash.
+
+    Le scritture avvengono prima della riga di riepilogo, così un
+    riferimento salvato punta sempre a una conversazione già presente.
+    L'indice hash -> righe viene costruito alla prima lettura (una sola
+    get_all_values) e riletto solo se un hash richiesto non c'è.
+    """
+
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+        self._lock = threading.Lock()
+        self._written = set()
+        self._index = None
+
+    @classmethod
+    def open(cls, spreadsheet, wrap=None, scheduler=None):
+        """
+        Apre (o crea) il worksheet delle conversazioni.
+
+        Args:
+            spreadsheet (gspread.Spreadsheet): Documento del foglio risultati
+            wrap (callable): Avvolge il worksheet (es. ScheduledSheet)
+            scheduler (SheetsScheduler): Se indicato, anche la ricerca e la
+                creazione del worksheet passano dallo scheduler
+        """
+        from gspread.exceptions import WorksheetNotFound
+
+        def call(fn, *args, kind="read", **kwargs):
+            if scheduler is None:
+                return fn(*args, **kwargs)
+            return scheduler.submit(fn, *args, kind=kind, label=fn.__name__, **kwargs).result()
+
+        try:
+            worksheet = call(spreadsheet.worksheet, TRANSCRIPT_WORKSHEET)
+            created = False
+        except WorksheetNotFound:
+            worksheet = call(spreadsheet.add_worksheet, TRANSCRIPT_WORKSHEET,
+                             rows=1, cols=len(TRANSCRIPT_HEADER), kind="write")
+            created = True
+        store = cls(wrap(worksheet) if wrap else worksheet)
+        if created:
+            store.worksheet.append_row(TRANSCRIPT_HEADER, value_input_option="RAW")
+        return store
+
+    def put(self, messages):
+        payload = canonical_json(messages)
+        ref = transcript_ref(payload)
+        with self._lock:
+            if ref in self._written:
+                return ref
+        chunks = [payload[i:i + CHUNK_CHARS] for i in range(0, len(payload), CHUNK_CHARS)] or [""]
+        self.worksheet.append_rows(
+            [[ref, i, len(chunks), chunk] for i, chunk in enumerate(chunks)],
+            value_input_option="RAW"
+        )
+        with self._lock:
+            self._written.add(ref)
+        return ref
+
+    def _load_index(self):
+        index = {}
+        for row in self.worksheet.get_all_values()[1:]:
+            if len(row) < 4:
+                continue
+            index.setdefault(row[0], {})[int(row[1])] = (int(row[2]), row[3])
+        return index
+
+    def get(self, ref):
+        with self._lock:
+            if self._index is None or ref not in self._index:
+                self._index = self._load_index()
+            parts = self._index.get(ref)
+        if not parts:
+            raise KeyError(ref)
+        total = next(iter(parts.values()))[0]
+        if len(parts) != total:
+            raise ValueError(f"Conversazione {ref} incompleta: {len(parts)}/{total} parti")
+        return json.loads("".join(parts[i][1] for i in range(total)))
+
+
+class LazyTranscript:
+    """
+    Conversazione di una riga, caricata solo al primo accesso.
+
+    Accetta sia un riferimento "sha256:..." sia il JSON in linea delle righe
+    salvate prima della separazione (anche compresso, "z:...").
+    """
+
+    __slots__ = ("cell", "store", "_messages")
+
+    def __init__(self, cell, store):
+        self.cell = cell
+        self.store = store
+        self._messages = None
+
+    @property
+    def messages(self):
+        if self._messages is None:
+            if is_transcript_ref(self.cell):
+                self._messages = self.store.get(self.cell)
+            else:
+                self._messages = decode_json(self.cell, [])
+        return self._messages
+
+    @property
+    def loaded(self):
+        return self._messages is not None
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __getitem__(self, index):
+        return self.messages[index]
+
+    def __repr__(self):
+        return f"LazyTranscript({self.cell[:20]!r}{'...' if len(self.cell) > 20 else ''})"
+
+
+def with_transcripts(rows, store, column=4):
+    """
+    Righe del foglio con la cella della conversazione sostituita da LazyTranscript.
+
+    Args:
+        rows (list): Righe dati (senza intestazione)
+        store: LocalTranscriptStore o SheetTranscriptStore
+        column (int): Indice (da 0) della colonna della conversazione
+
+    Returns:
+        list: Nuove righe; le conversazioni si leggono solo se usate
+    """
+    joined = []
+    for row in rows:
+        row = list(row)
+        if len(row) > column:
+            row[column] = LazyTranscript(row[column], store)
+        joined.append(row)
+    return joined
+
+
+def open_sheet_transcripts(sheet_url, credentials_path):
+    """
+    Worksheet delle conversazioni di un foglio risultati, in sola lettura,
+    per risolvere i riferimenti di un export CSV negli script offline.
+
+    Raises:
+        gspread.exceptions.WorksheetNotFound: Il foglio non ha il worksheet "transcripts"
+    """
+    import gspread
+
+    spreadsheet = gspread.service_account(filename=credentials_path).open_by_url(sheet_url)
+    return SheetTranscriptStore(spreadsheet.worksheet(TRANSCRIPT_WORKSHEET))
+
+
+def open_transcript_store(spreadsheet=None, wrap=None):
+    """Archivio configurato con TRANSCRIPT_STORE ("sheet" o "local")."""
+    if TRANSCRIPT_BACKEND == "local" or spreadsheet is None:
+        return LocalTranscriptStore()
+    return SheetTranscriptStore.open(spreadsheet, wrap=wrap)
+
+
+_sheet_stores = {}
+_sheet_stores_lock = threading.Lock()
+
+
+def get_transcript_store(spreadsheet):
+    """
+    Archivio condiviso da tutte le sessioni del processo per un foglio
+    risultati, come clients.get_sheet: il worksheet viene cercato (o creato)
+    una volta sola, e indice e hash già scritti restano validi tra un
+    salvataggio e l'altro. Tutte le chiamate passano dallo scheduler.
+    """
+    if TRANSCRIPT_BACKEND == "local":
+        return LocalTranscriptStore()
+    from sheets_scheduler import ScheduledSheet, get_scheduler
+
+    with _sheet_stores_lock:
+        store = _sheet_stores.get(spreadsheet.id)
+        if store is None:
+            store = _sheet_stores[spreadsheet.id] = SheetTranscriptStore.open(
+                spreadsheet, wrap=ScheduledSheet, scheduler=get_scheduler()
+            )
+        return store